@@ -0,0 +1,174 @@
+"""
+签到端到端基准测试
+
+启动本地 new-api 替身服务，生成 N 个合成账号，直接运行 checkin.main()，
+输出吞吐（账号/分钟）、各阶段耗时 p50/p95 以及峰值内存，便于离线对比每次改动的性能。
+
+用法:
+	python benchmarks/bench_checkin.py --accounts 50 --concurrency 8 --latency 0.05
+	python benchmarks/bench_checkin.py --accounts 10 --browser        # 走浏览器采集 WAF cookies 与 token（需要已安装 Chromium）
+	python benchmarks/bench_checkin.py --output bench.json            # 结果写入 JSON，便于跨提交对比
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.fake_newapi import FakeNewApiServer, FakeNewApiState
+
+
+def peak_rss_mb() -> dict[str, float] | None:
+	"""本进程与已回收子进程（浏览器）的峰值常驻内存 (MB)"""
+	try:
+		import resource
+	except ImportError:
+		return None
+	# Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+	scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+	return {
+		'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+		'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+	}
+
+
+def synthetic_accounts(count: int, provider: str = 'bench') -> list[dict]:
+	return [
+		{'name': f'bench-{i + 1}', 'provider': provider, 'api_user': str(10000 + i), 'cookies': {'session': f'session-{i + 1}'}}
+		for i in range(count)
+	]
+
+
+def run_benchmark(
+	accounts: int = 20,
+	concurrency: int = 4,
+	latency: float = 0.0,
+	browser: bool = False,
+	token_delay: float = 0.5,
+	max_in_flight: int = 0,
+	rate_limit: dict | None = None,
+	workers: int = 1,
+) -> dict:
+	"""
+	运行一次基准测试并返回结果
+
+	Args:
+		accounts: 合成账号数量
+		concurrency: 传给 main() 的并发数
+		latency: 替身服务每个请求的固定延迟 (秒)
+		browser: 是否启用 WAF 校验（需要浏览器采集 cookies 与 token）
+		token_delay: 假 Turnstile 组件生成 token 的延迟 (秒)
+		max_in_flight: 替身服务接口同时处理的请求数上限，超出返回 429（0 为不限）
+		rate_limit: provider 的 rate_limit 配置（见 utils.rate_limit）
+		workers: worker 进程数（见 utils.workers）
+	"""
+	state = FakeNewApiState(
+		latency=latency, token_delay=token_delay, require_waf=browser, require_token=browser, max_in_flight=max_in_flight
+	)
+	with FakeNewApiServer(state) as server, tempfile.TemporaryDirectory() as workdir:
+		env = {
+			'ANYROUTER_ACCOUNTS': json.dumps(synthetic_accounts(accounts)),
+			'PROVIDERS': json.dumps({'bench': server.provider_config(rate_limit=rate_limit)}),
+			'SKIP_NOTIFY': 'true',
+			# 求解服务、缓存与历史文件都不影响基准结果
+			'YESCAPTCHA_KEY': '',
+			'TURNSTILE_SOLVER_URL': 'http://127.0.0.1:9',
+			'TURNSTILE_HISTORY_FILE': '',
+			'WAF_COOKIE_CACHE_FILE': '',
+			'CHECKIN_PROFILE': '',
+		}
+		saved_env = {key: os.environ.get(key) for key in env}
+		saved_cwd = os.getcwd()
+		os.environ.update(env)
+		os.chdir(workdir)
+		try:
+			import checkin
+			from utils.trace import tracer
+
+			tracer.spans.clear()
+			started = time.perf_counter()
+			try:
+				asyncio.run(checkin.main(checkin.parse_args(['--concurrency', str(concurrency), '--workers', str(workers)])))
+			except SystemExit:
+				pass
+			elapsed = time.perf_counter() - started
+		finally:
+			os.chdir(saved_cwd)
+			for key, value in saved_env.items():
+				if value is None:
+					os.environ.pop(key, None)
+				else:
+					os.environ[key] = value
+
+		return {
+			'accounts': accounts,
+			'concurrency': concurrency,
+			'workers': workers,
+			'latency': latency,
+			'browser': browser,
+			'seconds': elapsed,
+			'accounts_per_minute': accounts / elapsed * 60 if elapsed else 0.0,
+			'signed_in': len(state.signed_in),
+			'requests': dict(state.requests),
+			'throttled': state.throttled,
+			'peak_in_flight': state.peak_in_flight,
+			'stages': tracer.summary(),
+			'peak_rss_mb': peak_rss_mb(),
+		}
+
+
+def print_report(result: dict):
+	print(f"\n[BENCH] {result['accounts']} 个账号, {result['workers']} 个 worker, 并发 {result['concurrency']}, 请求延迟 {result['latency'] * 1000:.0f}ms"
+		f"{', 浏览器采集' if result['browser'] else ''}")
+	print(
+		f"[BENCH] 总耗时 {result['seconds']:.2f}s, 吞吐 {result['accounts_per_minute']:.1f} 账号/分钟, "
+		f"成功签到 {result['signed_in']}/{result['accounts']}"
+	)
+	print(f"[BENCH] 请求数: {', '.join(f'{path} {n}' for path, n in sorted(result['requests'].items()))}")
+	print(f"[BENCH] 服务端并发峰值 {result['peak_in_flight']}, 被限流 (429) {result['throttled']} 次")
+	for stage, row in sorted(result['stages'].items(), key=lambda x: -x[1]['total']):
+		print(f"[BENCH] {stage:<20} 次数 {row['count']:>4}  p50 {row['p50']:.3f}s  p95 {row['p95']:.3f}s")
+	rss = result['peak_rss_mb']
+	if rss:
+		print(f"[BENCH] 峰值内存: 本进程 {rss['self']:.1f} MB, 子进程 {rss['children']:.1f} MB")
+
+
+def main(argv: list[str] | None = None):
+	parser = argparse.ArgumentParser(description='签到端到端基准测试')
+	parser.add_argument('--accounts', '-n', type=int, default=20, help='合成账号数量 (默认 20)')
+	parser.add_argument('--concurrency', '-c', type=int, default=4, help='并发数 (默认 4)')
+	parser.add_argument('--workers', '-w', type=int, default=1, help='worker 进程数 (默认 1)')
+	parser.add_argument('--latency', type=float, default=0.0, help='替身服务每个请求的延迟 (秒)')
+	parser.add_argument('--browser', action='store_true', help='启用 WAF 校验，走浏览器采集')
+	parser.add_argument('--token-delay', type=float, default=0.5, help='假 Turnstile 组件的出 token 延迟 (秒)')
+	parser.add_argument('--max-in-flight', type=int, default=0, help='替身服务接口并发上限，超出返回 429 (默认不限)')
+	parser.add_argument('--rate-limit', type=json.loads, help='provider 的 rate_limit 配置 (JSON)')
+	parser.add_argument('--output', '-o', help='把结果写入 JSON 文件')
+	args = parser.parse_args(argv)
+
+	result = run_benchmark(
+		accounts=args.accounts,
+		concurrency=args.concurrency,
+		latency=args.latency,
+		browser=args.browser,
+		token_delay=args.token_delay,
+		max_in_flight=args.max_in_flight,
+		rate_limit=args.rate_limit,
+		workers=args.workers,
+	)
+	print_report(result)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(result, f, ensure_ascii=False, indent=2)
+		print(f'[BENCH] 结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,210 @@
+"""
+Turnstile 求解基准测试
+
+在本地求解服务替身上运行 TurnstileService，用数字比较不同的求解配置：
+- time-to-token（p50/p95/最大）
+- 每次求解产生的请求数（创建任务 + 结果轮询）
+- 大量并发求解时的成功率与总耗时
+
+用法:
+	python benchmarks/bench_turnstile.py --backend yescaptcha --solves 40 --concurrency 10 --median 2 --sigma 0.4
+	python benchmarks/bench_turnstile.py --backend local_solver --fail-rate 0.1 --warmup 10   # 先学习耗时分布再测
+	python benchmarks/bench_turnstile.py --hedge-delay 3 --hedge-median 1.5                    # 主方式慢时对冲到本地 Solver
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.fake_newapi import FAKE_SITEKEY
+from benchmarks.fake_solvers import FakeSolverConfig, FakeSolverServer
+from utils.http_pool import http_clients
+from utils.solve_history import SolveTimeHistory
+from utils.trace import percentile
+from utils.turnstile import TurnstileService
+
+SITEURL = 'https://bench.example.com'
+
+
+def build_service(backend: str, primary_url: str, hedge_url: str | None, hedge_delay: float, deadline: float) -> TurnstileService:
+	"""创建指向替身服务的 TurnstileService（不读取历史文件，不预取）"""
+	service = TurnstileService()
+	service.history = SolveTimeHistory(path=None, deadline=deadline)
+	service.prefetch_limit = 0
+	service.hedge_delay = -1
+	service.hedge_backend = ''
+	service.backends = {}
+
+	if backend == 'yescaptcha':
+		service.yescaptcha_key = 'bench-key'
+		service.yescaptcha_api = primary_url
+		service.backends['yescaptcha'] = service._solve_with_yescaptcha
+		if hedge_url:
+			service.solver_url = hedge_url
+			service.backends['local_solver'] = service._solve_with_local_solver
+	else:
+		service.solver_url = primary_url
+		service.backends['local_solver'] = service._solve_with_local_solver
+		if hedge_url:
+			service.yescaptcha_key = 'bench-key'
+			service.yescaptcha_api = hedge_url
+			service.backends['yescaptcha'] = service._solve_with_yescaptcha
+	service.method = backend
+	if hedge_url:
+		service.hedge_delay = hedge_delay
+	return service
+
+
+async def _run_solves(service: TurnstileService, solves: int, concurrency: int) -> list[tuple[float, bool]]:
+	semaphore = asyncio.Semaphore(max(1, concurrency))
+
+	async def one(i: int) -> tuple[float, bool]:
+		async with semaphore:
+			start = time.monotonic()
+			token = await service.solve_turnstile(SITEURL, FAKE_SITEKEY, f'bench-{i + 1}')
+			return time.monotonic() - start, bool(token)
+
+	try:
+		return await asyncio.gather(*(one(i) for i in range(solves)))
+	finally:
+		await http_clients.close()
+
+
+def run_benchmark(
+	backend: str = 'yescaptcha',
+	solves: int = 20,
+	concurrency: int = 5,
+	warmup: int = 0,
+	config: FakeSolverConfig | None = None,
+	hedge_config: FakeSolverConfig | None = None,
+	hedge_delay: float = 3.0,
+	deadline: float = 65.0,
+) -> dict:
+	"""
+	运行一次求解基准测试并返回结果
+
+	Args:
+		backend: 主求解方式 yescaptcha / local_solver
+		solves: 计入结果的求解次数
+		concurrency: 同时进行的求解数
+		warmup: 正式测量前先完成的求解次数（用于让自适应轮询学到耗时分布，不计入结果）
+		config: 主求解服务的耗时分布与失败注入
+		hedge_config: 给定时启动另一种协议的替身作为对冲备用
+		hedge_delay: 对冲延迟 (秒)
+		deadline: 单次求解的轮询截止时间 (秒)
+	"""
+	config = config or FakeSolverConfig()
+	with ExitStack() as stack:
+		primary = stack.enter_context(FakeSolverServer(config))
+		hedge_server = stack.enter_context(FakeSolverServer(hedge_config)) if hedge_config else None
+		service = build_service(backend, primary.url, hedge_server.url if hedge_server else None, hedge_delay, deadline)
+
+		if warmup:
+			asyncio.run(_run_solves(service, warmup, concurrency))
+			service.stats.clear()
+			for server in (primary, hedge_server):
+				if server:
+					server.state.requests.clear()
+					server.state.peak_pending = 0
+
+		started = time.monotonic()
+		results = asyncio.run(_run_solves(service, solves, concurrency))
+		elapsed = time.monotonic() - started
+
+	latencies = sorted(seconds for seconds, ok in results if ok)
+	requests = sum(primary.state.requests.values()) + (sum(hedge_server.state.requests.values()) if hedge_server else 0)
+	return {
+		'backend': backend,
+		'solves': solves,
+		'concurrency': concurrency,
+		'warmup': warmup,
+		'hedge_delay': hedge_delay if hedge_config else None,
+		'seconds': elapsed,
+		'succeeded': len(latencies),
+		'time_to_token': {
+			'p50': percentile(latencies, 0.5),
+			'p95': percentile(latencies, 0.95),
+			'max': latencies[-1] if latencies else 0.0,
+		},
+		'requests_per_solve': requests / solves if solves else 0.0,
+		'requests': {
+			'primary': dict(primary.state.requests),
+			'hedge': dict(hedge_server.state.requests) if hedge_server else {},
+		},
+		'peak_pending_tasks': primary.state.peak_pending,
+		'backends': {
+			name: {k: v for k, v in stats.items() if k != 'latencies'} for name, stats in service.stats.items()
+		},
+	}
+
+
+def print_report(result: dict):
+	ttt = result['time_to_token']
+	title = f"{result['backend']}: {result['solves']} 次求解, 并发 {result['concurrency']}"
+	if result['warmup']:
+		title += f", 预热 {result['warmup']} 次"
+	if result['hedge_delay'] is not None:
+		title += f", 对冲延迟 {result['hedge_delay']}s"
+	print(f'\n[BENCH] {title}')
+	print(
+		f"[BENCH] 成功 {result['succeeded']}/{result['solves']}, 总耗时 {result['seconds']:.2f}s, "
+		f"time-to-token p50 {ttt['p50']:.2f}s / p95 {ttt['p95']:.2f}s / 最大 {ttt['max']:.2f}s"
+	)
+	print(f"[BENCH] 每次求解请求数 {result['requests_per_solve']:.1f}, 服务端同时处理中的任务峰值 {result['peak_pending_tasks']}")
+	for name, stats in result['backends'].items():
+		print(
+			f"[BENCH] {name}: 尝试 {stats['attempts']}, 胜出 {stats['wins']}, 失败 {stats['failures']}, "
+			f"被取消 {stats['cancelled']}, 轮询 {stats['polls']}"
+		)
+
+
+def main(argv: list[str] | None = None):
+	parser = argparse.ArgumentParser(description='Turnstile 求解基准测试')
+	parser.add_argument('--backend', choices=['yescaptcha', 'local_solver'], default='yescaptcha')
+	parser.add_argument('--solves', '-n', type=int, default=20, help='求解次数 (默认 20)')
+	parser.add_argument('--concurrency', '-c', type=int, default=5, help='并发求解数 (默认 5)')
+	parser.add_argument('--warmup', type=int, default=0, help='预热求解次数，让自适应轮询先学习耗时分布')
+	parser.add_argument('--median', type=float, default=8.0, help='求解耗时中位数 (秒, 默认 8)')
+	parser.add_argument('--sigma', type=float, default=0.3, help='求解耗时对数正态分布的 sigma (默认 0.3, 0 为固定耗时)')
+	parser.add_argument('--error-rate', type=float, default=0.0, help='创建任务失败的比例')
+	parser.add_argument('--fail-rate', type=float, default=0.0, help='求解失败 (CAPTCHA_FAIL) 的比例')
+	parser.add_argument('--hedge-delay', type=float, help='开启对冲，另一种协议的替身作为备用')
+	parser.add_argument('--hedge-median', type=float, default=8.0, help='备用求解服务的耗时中位数 (秒)')
+	parser.add_argument('--deadline', type=float, default=65.0, help='单次求解的轮询截止时间 (秒)')
+	parser.add_argument('--seed', type=int, help='随机种子，固定后结果可复现')
+	parser.add_argument('--output', '-o', help='把结果写入 JSON 文件')
+	args = parser.parse_args(argv)
+
+	config = FakeSolverConfig(
+		median=args.median, sigma=args.sigma, error_rate=args.error_rate, fail_rate=args.fail_rate, seed=args.seed
+	)
+	hedge_config = None
+	if args.hedge_delay is not None:
+		hedge_config = FakeSolverConfig(median=args.hedge_median, sigma=args.sigma, seed=args.seed)
+
+	result = run_benchmark(
+		backend=args.backend,
+		solves=args.solves,
+		concurrency=args.concurrency,
+		warmup=args.warmup,
+		config=config,
+		hedge_config=hedge_config,
+		hedge_delay=args.hedge_delay if args.hedge_delay is not None else 3.0,
+		deadline=args.deadline,
+	)
+	print_report(result)
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(result, f, ensure_ascii=False, indent=2)
+		print(f'[BENCH] 结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+	main()
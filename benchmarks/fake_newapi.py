@@ -0,0 +1,314 @@
+"""
+本地 new-api 替身服务
+
+模拟签到流程用到的三个接口，供基准测试与端到端测试离线使用：
+- GET  /console/personal: 下发 WAF 风格 cookies（acw_tc / cdn_sec_tc 响应头 + acw_sc__v2 由页面脚本写入），
+  并渲染一个假的 Turnstile 组件（/turnstile/v0/api.js，延迟后回调 token）
+- GET  /api/user/self: 校验 session cookie 与 new-api-user 请求头，返回余额；缺少 WAF cookies 时返回挑战页
+- POST /api/user/sign_in: 首次签到成功，同一账号当天重复调用返回「今日已签到」；token 与真实 Turnstile 一样只能使用一次
+
+所有请求都可以加上固定延迟，模拟真实站点的网络耗时；failures 可让某个接口接下来的若干次请求返回 502，
+max_in_flight 限制接口同时处理的请求数，超出时返回 429。
+"""
+
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FAKE_SITEKEY = '0x4AAAAAAAFakeSiteKeyForBench'
+FAKE_TOKEN_PREFIX = 'fake-turnstile-'
+WAF_COOKIE_NAMES = ['acw_tc', 'cdn_sec_tc', 'acw_sc__v2']
+
+PERSONAL_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>New API</title>
+<script>document.cookie = 'acw_sc__v2=' + '%(acw_sc)s' + '; path=/';</script>
+<script src="/turnstile/v0/api.js"></script>
+</head>
+<body>
+<div id="turnstile-container"></div>
+<script>
+window.addEventListener('DOMContentLoaded', () => {
+	turnstile.render('#turnstile-container', { sitekey: '%(sitekey)s', callback: (token) => { window.__token = token; } });
+});
+</script>
+</body>
+</html>
+"""
+
+# 假的 Turnstile 组件：render 后延迟 delay 毫秒回调 token，getResponse 返回同一个 token
+TURNSTILE_SCRIPT = """
+(() => {
+	let response = '';
+	window.turnstile = {
+		render(container, params) {
+			setTimeout(() => {
+				response = '%(prefix)s' + Math.random().toString(36).slice(2);
+				if (params && typeof params.callback === 'function') params.callback(response);
+			}, %(delay)d);
+			return 'widget-0';
+		},
+		getResponse() { return response; },
+		reset() { response = ''; },
+	};
+})();
+"""
+
+CHALLENGE_PAGE = """<html><script>var arg1='%(arg1)s';</script></html>"""
+
+
+@dataclass
+class FakeNewApiState:
+	"""替身服务的可配置行为与请求统计"""
+
+	latency: float = 0.0
+	token_delay: float = 0.5
+	require_waf: bool = True
+	require_token: bool = True
+	quota: int = 25_000_000
+	signed_in: set[str] = field(default_factory=set)
+	failures: dict[str, int] = field(default_factory=dict)  # 路径 -> 接下来返回 502 的次数
+	used_tokens: set[str] = field(default_factory=set)
+	max_in_flight: int = 0  # 接口同时处理的请求数上限，0 为不限
+	in_flight: int = 0
+	peak_in_flight: int = 0
+	throttled: int = 0
+	requests: dict[str, int] = field(default_factory=dict)
+	lock: threading.Lock = field(default_factory=threading.Lock)
+
+	def count(self, path: str):
+		with self.lock:
+			self.requests[path] = self.requests.get(path, 0) + 1
+
+	def enter(self) -> bool:
+		"""开始处理一个接口请求，超出并发上限时返回 False"""
+		with self.lock:
+			if self.max_in_flight and self.in_flight >= self.max_in_flight:
+				self.throttled += 1
+				return False
+			self.in_flight += 1
+			self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+			return True
+
+	def leave(self):
+		with self.lock:
+			self.in_flight -= 1
+
+	def should_fail(self, path: str) -> bool:
+		"""消耗一次注入的失败"""
+		with self.lock:
+			if self.failures.get(path, 0) <= 0:
+				return False
+			self.failures[path] -= 1
+			return True
+
+	def use_token(self, token: str) -> bool:
+		"""校验并作废 token，返回是否有效"""
+		with self.lock:
+			if not token.startswith(FAKE_TOKEN_PREFIX) or token in self.used_tokens:
+				return False
+			self.used_tokens.add(token)
+			return True
+
+	def sign_in(self, api_user: str) -> bool:
+		"""登记签到，返回是否为当天首次"""
+		with self.lock:
+			if api_user in self.signed_in:
+				return False
+			self.signed_in.add(api_user)
+			return True
+
+	def reset_day(self):
+		with self.lock:
+			self.signed_in.clear()
+
+
+class FakeNewApiHandler(BaseHTTPRequestHandler):
+	server: 'FakeNewApiServer'
+	protocol_version = 'HTTP/1.1'
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	@property
+	def state(self) -> FakeNewApiState:
+		return self.server.state
+
+	def _cookies(self) -> dict[str, str]:
+		jar = SimpleCookie()
+		try:
+			jar.load(self.headers.get('Cookie', ''))
+		except Exception:
+			return {}
+		return {name: morsel.value for name, morsel in jar.items()}
+
+	def _send(self, status: int, body: str, content_type: str, headers: list[tuple[str, str]] | None = None):
+		data = body.encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(data)))
+		for name, value in headers or []:
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(data)
+
+	def _json(self, data: dict, status: int = 200):
+		self._send(status, json.dumps(data, ensure_ascii=False), 'application/json; charset=utf-8')
+
+	def _throttled(self) -> bool:
+		if self.state.enter():
+			return False
+		self._send(429, json.dumps({'success': False, 'message': '请求过于频繁'}), 'application/json', [('Retry-After', '0')])
+		return True
+
+	def _check_api(self) -> str | None:
+		"""校验 WAF cookies 与登录态，通过时返回 api_user，否则直接写出错误响应"""
+		cookies = self._cookies()
+		if self.state.require_waf and not all(name in cookies for name in WAF_COOKIE_NAMES):
+			self._send(200, CHALLENGE_PAGE % {'arg1': uuid.uuid4().hex}, 'text/html; charset=utf-8')
+			return None
+		api_user = self.headers.get('new-api-user')
+		if not cookies.get('session') or not api_user:
+			self._json({'success': False, 'message': '无权进行此操作，未登录且未提供 access token'}, status=401)
+			return None
+		return api_user
+
+	def do_GET(self):
+		path = urlsplit(self.path).path
+		self._serve(path, lambda: self._get(path))
+
+	def do_POST(self):
+		path = urlsplit(self.path).path
+		length = int(self.headers.get('Content-Length') or 0)
+		raw = self.rfile.read(length) if length else b''
+		self._serve(path, lambda: self._post(path, raw))
+
+	def _serve(self, path: str, handle):
+		"""统计请求、限制接口并发并加上固定延迟"""
+		self.state.count(path)
+		api = path.startswith('/api/')
+		if api and self._throttled():
+			return
+		try:
+			time.sleep(self.state.latency)
+			handle()
+		finally:
+			if api:
+				self.state.leave()
+
+	def _get(self, path: str):
+		if path in ('/console/personal', '/login'):
+			page = PERSONAL_PAGE % {'acw_sc': uuid.uuid4().hex, 'sitekey': FAKE_SITEKEY}
+			headers = [
+				('Set-Cookie', f'acw_tc={uuid.uuid4().hex}; Path=/; Max-Age=1800; HttpOnly'),
+				('Set-Cookie', f'cdn_sec_tc={uuid.uuid4().hex}; Path=/; Max-Age=1800; HttpOnly'),
+			]
+			self._send(200, page, 'text/html; charset=utf-8', headers)
+		elif path == '/turnstile/v0/api.js':
+			script = TURNSTILE_SCRIPT % {'prefix': FAKE_TOKEN_PREFIX, 'delay': int(self.state.token_delay * 1000)}
+			self._send(200, script, 'application/javascript')
+		elif path == '/api/user/self':
+			if self._check_api() is None:
+				return
+			if self.state.should_fail(path):
+				self._json({'success': False, 'message': 'Bad Gateway'}, status=502)
+				return
+			self._json({'success': True, 'data': {'quota': self.state.quota, 'used_quota': 0}})
+		else:
+			self._json({'success': False, 'message': 'not found'}, status=404)
+
+	def _post(self, path: str, raw: bytes):
+		if path != '/api/user/sign_in':
+			self._json({'success': False, 'message': 'not found'}, status=404)
+			return
+
+		api_user = self._check_api()
+		if api_user is None:
+			return
+		try:
+			payload = json.loads(raw or b'{}')
+		except ValueError:
+			payload = {}
+		if self.state.require_token and not self.state.use_token(str(payload.get('token', ''))):
+			self._json({'success': False, 'message': 'Turnstile token 为空或无效'})
+			return
+		# 在 token 被消耗之后失败，重试时必须换新 token
+		if self.state.should_fail(path):
+			self._json({'success': False, 'message': 'Bad Gateway'}, status=502)
+			return
+
+		if self.state.sign_in(api_user):
+			self._json({'success': True, 'message': '签到成功'})
+		else:
+			self._json({'success': False, 'message': '今日已签到'})
+
+
+class FakeNewApiServer(ThreadingHTTPServer):
+	"""在后台线程运行的替身服务"""
+
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, state: FakeNewApiState | None = None, host: str = '127.0.0.1', port: int = 0):
+		super().__init__((host, port), FakeNewApiHandler)
+		self.state = state or FakeNewApiState()
+		self._thread: threading.Thread | None = None
+
+	@property
+	def url(self) -> str:
+		host, port = self.server_address[:2]
+		return f'http://{host}:{port}'
+
+	def provider_config(self, **overrides) -> dict:
+		"""生成 PROVIDERS 环境变量中对应本服务的 provider 配置"""
+		config = {
+			'domain': self.url,
+			'bypass_method': 'waf_cookies' if self.state.require_waf else None,
+			'waf_cookie_names': WAF_COOKIE_NAMES if self.state.require_waf else None,
+		}
+		config.update(overrides)
+		return config
+
+	def __enter__(self):
+		self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.shutdown()
+		self.server_close()
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description='本地 new-api 替身服务')
+	parser.add_argument('--port', type=int, default=8787)
+	parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟 (秒)')
+	parser.add_argument('--token-delay', type=float, default=0.5, help='假 Turnstile 组件生成 token 的延迟 (秒)')
+	parser.add_argument('--no-waf', action='store_true', help='接口不校验 WAF cookies')
+	parser.add_argument('--no-token', action='store_true', help='签到接口不校验 Turnstile token')
+	parser.add_argument('--max-in-flight', type=int, default=0, help='接口同时处理的请求数上限，超出返回 429')
+	args = parser.parse_args()
+
+	state = FakeNewApiState(
+		latency=args.latency,
+		token_delay=args.token_delay,
+		require_waf=not args.no_waf,
+		require_token=not args.no_token,
+		max_in_flight=args.max_in_flight,
+	)
+	with FakeNewApiServer(state, port=args.port) as server:
+		print(f'[FakeNewApi] 监听 {server.url}')
+		try:
+			threading.Event().wait()
+		except KeyboardInterrupt:
+			pass
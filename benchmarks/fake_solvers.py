@@ -0,0 +1,192 @@
+"""
+本地 Turnstile 求解服务替身
+
+同一个服务同时实现两套协议，供 TurnstileService 离线测试与基准测试使用：
+- YesCaptcha: POST /createTask、POST /getTaskResult
+- 本地 Solver: GET /health、GET /turnstile?url=&sitekey=、GET /result?id=
+
+每个任务的求解耗时从可配置的对数正态分布中抽样，并可按比例注入：
+- 创建任务失败（error_rate，YesCaptcha 返回 errorId，本地 Solver 返回 HTTP 500）
+- 求解失败（fail_rate，YesCaptcha 返回 ERROR_CAPTCHA_UNSOLVABLE，本地 Solver 返回 CAPTCHA_FAIL）
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.fake_newapi import FAKE_TOKEN_PREFIX
+
+
+@dataclass
+class FakeSolverConfig:
+	"""求解耗时分布与失败注入"""
+
+	median: float = 8.0
+	sigma: float = 0.3
+	error_rate: float = 0.0
+	fail_rate: float = 0.0
+	seed: int | None = None
+
+	def sample(self, rng: random.Random) -> float:
+		"""抽样一次求解耗时（sigma 为 0 时固定为 median）"""
+		if self.sigma <= 0:
+			return self.median
+		return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+@dataclass
+class FakeTask:
+	ready_at: float
+	failed: bool
+	token: str
+
+
+@dataclass
+class FakeSolverState:
+	config: FakeSolverConfig = field(default_factory=FakeSolverConfig)
+	tasks: dict[str, FakeTask] = field(default_factory=dict)
+	requests: dict[str, int] = field(default_factory=dict)
+	created: int = 0
+	peak_pending: int = 0
+	lock: threading.Lock = field(default_factory=threading.Lock)
+
+	def __post_init__(self):
+		self.rng = random.Random(self.config.seed)
+
+	def count(self, path: str):
+		with self.lock:
+			self.requests[path] = self.requests.get(path, 0) + 1
+
+	def create_task(self) -> str | None:
+		"""创建任务，按 error_rate 注入创建失败时返回 None"""
+		with self.lock:
+			if self.rng.random() < self.config.error_rate:
+				return None
+			task_id = uuid.uuid4().hex
+			now = time.monotonic()
+			self.tasks[task_id] = FakeTask(
+				ready_at=now + self.config.sample(self.rng),
+				failed=self.rng.random() < self.config.fail_rate,
+				token=FAKE_TOKEN_PREFIX + uuid.uuid4().hex,
+			)
+			self.created += 1
+			pending = sum(1 for task in self.tasks.values() if task.ready_at > now)
+			self.peak_pending = max(self.peak_pending, pending)
+			return task_id
+
+	def result(self, task_id: str) -> FakeTask | None:
+		with self.lock:
+			return self.tasks.get(task_id)
+
+
+class FakeSolverHandler(BaseHTTPRequestHandler):
+	server: 'FakeSolverServer'
+	protocol_version = 'HTTP/1.1'
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	@property
+	def state(self) -> FakeSolverState:
+		return self.server.state
+
+	def _json(self, data: dict, status: int = 200):
+		body = json.dumps(data).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		parts = urlsplit(self.path)
+		query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+		self.state.count(parts.path)
+
+		if parts.path == '/health':
+			self._json({'status': 'ok'})
+		elif parts.path == '/turnstile':
+			if not query.get('url') or not query.get('sitekey'):
+				self._json({'status': 'error', 'error': 'url and sitekey are required'}, status=400)
+				return
+			task_id = self.state.create_task()
+			if task_id is None:
+				self._json({'status': 'error', 'error': 'injected failure'}, status=500)
+			else:
+				self._json({'taskId': task_id}, status=202)
+		elif parts.path == '/result':
+			task = self.state.result(query.get('id', ''))
+			if task is None:
+				self._json({'status': 'error', 'error': 'invalid task id'}, status=400)
+			elif time.monotonic() < task.ready_at:
+				self._json({'status': 'processing'})
+			else:
+				token = 'CAPTCHA_FAIL' if task.failed else task.token
+				self._json({'status': 'ready', 'solution': {'token': token}})
+		else:
+			self._json({'status': 'error', 'error': 'not found'}, status=404)
+
+	def do_POST(self):
+		path = urlsplit(self.path).path
+		self.state.count(path)
+		length = int(self.headers.get('Content-Length') or 0)
+		try:
+			payload = json.loads(self.rfile.read(length) or b'{}')
+		except ValueError:
+			payload = {}
+
+		if not payload.get('clientKey'):
+			self._json({'errorId': 1, 'errorCode': 'ERROR_KEY_DOES_NOT_EXIST', 'errorDescription': 'clientKey missing'})
+			return
+
+		if path == '/createTask':
+			task_id = self.state.create_task()
+			if task_id is None:
+				self._json({'errorId': 1, 'errorCode': 'ERROR_SERVICE_UNAVAILABLE', 'errorDescription': 'injected failure'})
+			else:
+				self._json({'errorId': 0, 'taskId': task_id})
+		elif path == '/getTaskResult':
+			task = self.state.result(payload.get('taskId', ''))
+			if task is None:
+				self._json({'errorId': 1, 'errorCode': 'ERROR_NO_SUCH_CAPCHA_ID', 'errorDescription': 'task not found'})
+			elif time.monotonic() < task.ready_at:
+				self._json({'errorId': 0, 'status': 'processing'})
+			elif task.failed:
+				self._json({'errorId': 1, 'errorCode': 'ERROR_CAPTCHA_UNSOLVABLE', 'errorDescription': 'captcha unsolvable'})
+			else:
+				self._json({'errorId': 0, 'status': 'ready', 'solution': {'token': task.token}})
+		else:
+			self._json({'errorId': 1, 'errorDescription': 'not found'}, status=404)
+
+
+class FakeSolverServer(ThreadingHTTPServer):
+	"""在后台线程运行的求解服务替身"""
+
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, config: FakeSolverConfig | None = None, host: str = '127.0.0.1', port: int = 0):
+		super().__init__((host, port), FakeSolverHandler)
+		self.state = FakeSolverState(config=config or FakeSolverConfig())
+		self._thread: threading.Thread | None = None
+
+	@property
+	def url(self) -> str:
+		host, port = self.server_address[:2]
+		return f'http://{host}:{port}'
+
+	def __enter__(self):
+		self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.shutdown()
+		self.server_close()
@@ -13,210 +13,318 @@ AnyRouter 自动签到脚本 V5
 - 混合求解策略
 """
 
+import time
+
+_STARTUP_T0 = time.perf_counter()
+
+import argparse
 import asyncio
-import hashlib
-import json
 import os
 import sys
 import re
+from contextlib import nullcontext
+from dataclasses import asdict
 from datetime import datetime
 
-import httpx
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
 
-from utils.config_v2 import AccountConfig, AppConfig, load_accounts_config
+from utils.browser import PageSignals, ResourceRules, browser_manager
+from utils.circuit import CLOSED, circuit_breakers
+from utils.classify import (
+    AUTH,
+    BUSINESS,
+    CIRCUIT_OPEN,
+    NETWORK,
+    OK,
+    SERVER_ERROR,
+    WAF_CHALLENGE,
+    Classification,
+    classify_exception,
+    classify_response,
+    session_fingerprint,
+    wording,
+)
+from utils.config_v2 import AccountConfig, AccountSource, AppConfig, ProviderConfig
+from utils.history import AccountResult, account_key, run_history
+from utils.http_pool import http_clients
 from utils.notify import notify
-from utils.turnstile import turnstile_service
+from utils.output import grouped
+from utils.rate_limit import rate_limiters
+from utils.retry import retry_engine
+from utils.shard import default_output, load_partials, parse_shard, shard_of, write_partial
+from utils.trace import Span, tracer
+from utils.turnstile import SOLVER_METHODS, turnstile_service
+from utils.waf_cache import WafCacheEntry, WafHarvest, looks_like_waf_challenge, waf_cookie_cache
+from utils.workers import JobError, WorkerPool, serve
 
 load_dotenv()
 
+_IMPORT_SECONDS = time.perf_counter() - _STARTUP_T0
+
 # 常量配置
-BALANCE_HASH_FILE = 'balance_hash.txt'
+COOKIE_WAIT = 5  # 等待 WAF cookies 出现的上限（秒）
 COMMON_UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/144.0.0.0 Safari/537.36 Edg/144.0.0.0'
 
-def load_balance_hash():
-    try:
-        if os.path.exists(BALANCE_HASH_FILE):
-            with open(BALANCE_HASH_FILE, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-    except Exception: pass
-    return None
-
-def save_balance_hash(balance_hash):
-    try:
-        with open(BALANCE_HASH_FILE, 'w', encoding='utf-8') as f:
-            f.write(balance_hash)
-    except Exception as e:
-        print(f'[WARN] 余额hash保存失败: {e}')
-
-def generate_balance_hash(balances):
-    simple_balances = {k: v['quota'] for k, v in balances.items()} if balances else {}
-    balance_json = json.dumps(simple_balances, sort_keys=True, separators=(',', ':'))
-    return hashlib.sha256(balance_json.encode('utf-8')).hexdigest()[:16]
+SITEKEY_JS = """
+    () => {
+        // 方法1: 从 iframe src 中提取
+        const iframe = document.querySelector('iframe[src*="challenges.cloudflare.com"]');
+        if (iframe) {
+            const match = iframe.src.match(/sitekey=([^&]+)/);
+            if (match) return match[1];
+        }
+
+        // 方法2: 从 turnstile.render 调用中提取
+        const scripts = document.querySelectorAll('script');
+        for (const script of scripts) {
+            const match = script.textContent.match(/sitekey['":\\s]+['"]([^'"]+)['"]/);
+            if (match) return match[1];
+        }
+        return null;
+    }
+"""
 
-async def extract_turnstile_sitekey(page) -> str:
-    """从页面中提取 Turnstile sitekey"""
-    try:
-        # 方法1: 从 iframe src 中提取
-        sitekey = await page.evaluate("""
-            () => {
-                const iframe = document.querySelector('iframe[src*="challenges.cloudflare.com"]');
-                if (iframe) {
-                    const match = iframe.src.match(/sitekey=([^&]+)/);
-                    return match ? match[1] : null;
-                }
-                return null;
-            }
-        """)
-
-        if sitekey:
-            return sitekey
-
-        # 方法2: 从 turnstile.render 调用中提取
-        sitekey = await page.evaluate("""
-            () => {
-                const scripts = document.querySelectorAll('script');
-                for (const script of scripts) {
-                    const match = script.textContent.match(/sitekey['":\\s]+['"]([^'"]+)['"]/);
-                    if (match) return match[1];
-                }
-                return null;
-            }
-        """)
-
-        return sitekey
+def filter_waf_cookies(cookies_list: list[dict], required: list[str]) -> list[dict]:
+    """只保留 provider 声明的 WAF cookies（未声明时全部保留）"""
+    if not required:
+        return cookies_list
+    return [c for c in cookies_list if c['name'] in required]
 
-    except Exception as e:
-        print(f'[WARN] 提取 sitekey 失败: {e}')
-        return None
+async def wait_for_harvest(page, context, signals: PageSignals, required: list[str], extra_check=None, timeout: float = COOKIE_WAIT):
+    """
+    等待采集完成：所需 cookies 全部出现（未声明时等页面 DOM 就绪），且 extra_check 满足
 
-async def get_waf_bypass_data_browser(account_name: str, domain: str, max_wait: int = 20):
+    Returns:
+        (cookies 列表, 是否在超时前完成)
+    """
+    async def check():
+        cookies_list = await context.cookies()
+        names = {c['name'] for c in cookies_list}
+        if required:
+            if not all(name in names for name in required):
+                return None
+        elif not await page.evaluate("document.readyState !== 'loading'"):
+            return None
+        if extra_check and not await extra_check():
+            return None
+        return cookies_list
+
+    cookies_list = await signals.wait_until(check, timeout=timeout)
+    if cookies_list:
+        return cookies_list, True
+    return await context.cookies(), False
+
+async def get_waf_bypass_data_browser(account_name: str, provider_config, max_wait: int = 20):
     """
     使用浏览器自动化获取 WAF 数据（降级方案）
+
+    以 provider 的 waf_cookie_names（签到需要时再加上 token）作为完成条件，
+    条件满足立即关闭页面，只返回所需的 cookies；固定时长仅作为上限。
     """
-    print(f'[Browser] {account_name}: 启动浏览器...')
+    domain = provider_config.domain
+    required = provider_config.waf_cookie_names or []
+    need_token = bool(provider_config.sign_in_path)
+    print(f'[Browser] {account_name}: 创建浏览器上下文...')
 
     try:
-        async with async_playwright() as p:
-            import tempfile
-            with tempfile.TemporaryDirectory() as temp_dir:
-                context = await p.chromium.launch_persistent_context(
-                    user_data_dir=temp_dir,
-                    headless=True,
-                    user_agent=COMMON_UA,
-                    args=['--disable-blink-features=AutomationControlled', '--no-sandbox']
-                )
-                page = await context.new_page()
-
-                try:
-                    # 访问页面
-                    print(f'[Browser] {account_name}: 访问 {domain}/console/personal')
-                    await page.goto(f"{domain}/console/personal", wait_until='domcontentloaded', timeout=10000)
-                    await asyncio.sleep(2)
-
-                    # 检查 Turnstile 是否存在
-                    turnstile_exists = await page.evaluate("typeof turnstile !== 'undefined'")
-
-                    token = ""
+        async with browser_manager.new_context(rules=ResourceRules.for_provider(provider_config), user_agent=COMMON_UA) as context:
+            page = await context.new_page()
+            signals = PageSignals(page)
+
+            try:
+                await signals.install()
+
+                # 访问页面（收到响应即返回，后续由页面信号驱动）
+                print(f'[Browser] {account_name}: 访问 {domain}/console/personal')
+                started = time.monotonic()
+                with tracer.span('browser.goto'):
+                    await page.goto(f"{domain}/console/personal", wait_until='commit', timeout=10000)
+
+                turnstile_exists = False
+                if need_token:
+                    # DOM 就绪后最多再等 2 秒确认 Turnstile 是否存在
+                    await signals.wait_until(lambda: page.evaluate("document.readyState !== 'loading'"), timeout=10)
+                    with tracer.span('browser.turnstile'):
+                        turnstile_exists = await signals.wait_until(
+                            lambda: page.evaluate("typeof turnstile !== 'undefined'"), timeout=2
+                        )
                     if turnstile_exists:
                         print(f'[Browser] {account_name}: 检测到 Turnstile，尝试获取 token...')
-
-                        # 简单等待（不做复杂交互）
-                        for i in range(max_wait // 2):
-                            await asyncio.sleep(2)
-                            try:
-                                token = await page.evaluate("turnstile.getResponse()")
-                                if token:
-                                    print(f'[Browser] {account_name}: ✅ 获取到 token (耗时 {(i+1)*2}s)')
-                                    break
-                            except:
-                                pass
-
-                        if not token:
-                            print(f'[Browser] {account_name}: ⚠️ 未获取到 token')
                     else:
                         print(f'[Browser] {account_name}: 未检测到 Turnstile')
 
-                    # 获取 cookies
-                    cookies_list = await page.context.cookies()
-                    waf_cookies = {c['name']: c['value'] for c in cookies_list}
+                token = ""
 
-                    await context.close()
+                async def check_token():
+                    nonlocal token
+                    # 优先使用回调推送的 token，隐式渲染的组件则读取 getResponse()
+                    token = signals.token or await page.evaluate("turnstile.getResponse()") or ""
+                    return token
 
-                    print(f'[Browser] {account_name}: 获取到 {len(waf_cookies)} 个 cookies')
-                    return {'cookies': waf_cookies, 'token': token}
+                with tracer.span('browser.harvest'):
+                    cookies_list, complete = await wait_for_harvest(
+                        page, context, signals, required,
+                        extra_check=check_token if turnstile_exists else None,
+                        timeout=max_wait if turnstile_exists else COOKIE_WAIT,
+                    )
 
-                except Exception as e:
-                    print(f'[Browser] {account_name}: 页面操作失败: {e}')
-                    await context.close()
-                    return None
+                if turnstile_exists:
+                    if token:
+                        print(f'[Browser] {account_name}: ✅ 获取到 token (耗时 {time.monotonic() - started:.1f}s)')
+                    else:
+                        print(f'[Browser] {account_name}: ⚠️ 未获取到 token')
+
+                cookies_list = filter_waf_cookies(cookies_list, required)
+                waf_cookies = {c['name']: c['value'] for c in cookies_list}
+                missing = [name for name in required if name not in waf_cookies]
+                if missing:
+                    print(f'[Browser] {account_name}: ⚠️ 缺少 cookies: {", ".join(missing)}')
+
+                print(f'[Browser] {account_name}: 获取到 {len(waf_cookies)} 个 cookies (耗时 {time.monotonic() - started:.1f}s)')
+                return {'cookies': waf_cookies, 'token': token, 'raw_cookies': cookies_list}
+
+            except Exception as e:
+                print(f'[Browser] {account_name}: 页面操作失败: {e}')
+                return None
 
     except Exception as e:
         print(f'[Browser] {account_name}: 浏览器启动失败: {e}')
         return None
 
-async def get_waf_bypass_data(account_name: str, domain: str):
-    """
-    获取 WAF 绕过数据（智能选择求解方式）
-    """
-    print(f'[WAF] {account_name}: 开始获取 WAF 数据 (域名: {domain})')
+async def harvest_waf_entry(account_name: str, provider_config, need_sitekey: bool) -> WafHarvest | None:
+    """访问页面采集域名级别的 WAF cookies（需要时连同 sitekey），不求解 token"""
+    domain = provider_config.domain
+    required = provider_config.waf_cookie_names or []
+    try:
+        async with browser_manager.new_context(rules=ResourceRules.for_provider(provider_config), user_agent=COMMON_UA) as context:
+            page = await context.new_page()
+            signals = PageSignals(page)
 
-    # 如果配置了 YesCaptcha 或本地 Solver，优先使用
-    if turnstile_service.get_method() in ['yescaptcha', 'local_solver']:
-        # 先用浏览器获取 cookies 和 sitekey
-        print(f'[WAF] {account_name}: 使用 {turnstile_service.get_method()} 求解')
-
-        try:
-            async with async_playwright() as p:
-                import tempfile
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    context = await p.chromium.launch_persistent_context(
-                        user_data_dir=temp_dir,
-                        headless=True,
-                        user_agent=COMMON_UA,
-                        args=['--disable-blink-features=AutomationControlled', '--no-sandbox']
-                    )
-                    page = await context.new_page()
+            print(f'[WAF] {account_name}: 访问页面获取 cookies{" 和 sitekey" if need_sitekey else ""}...')
+            started = time.monotonic()
+            with tracer.span('browser.goto'):
+                await page.goto(f"{domain}/console/personal", wait_until='commit', timeout=10000)
 
-                    try:
-                        print(f'[WAF] {account_name}: 访问页面获取 cookies 和 sitekey...')
-                        await page.goto(f"{domain}/console/personal", wait_until='domcontentloaded', timeout=10000)
-                        await asyncio.sleep(2)
+            sitekey = None
 
-                        # 提取 sitekey
-                        sitekey = await extract_turnstile_sitekey(page)
+            async def check_sitekey():
+                nonlocal sitekey
+                sitekey = sitekey or await page.evaluate(SITEKEY_JS)
+                return sitekey
 
-                        # 获取 cookies
-                        cookies_list = await page.context.cookies()
-                        waf_cookies = {c['name']: c['value'] for c in cookies_list}
+            with tracer.span('browser.sitekey'):
+                cookies_list, complete = await wait_for_harvest(
+                    page, context, signals, required, extra_check=check_sitekey if need_sitekey else None
+                )
+            cookies_list = filter_waf_cookies(cookies_list, required)
+            print(
+                f'[WAF] {account_name}: 采集{"完成" if complete else "超时"}, '
+                f'{len(cookies_list)} 个 cookies (耗时 {time.monotonic() - started:.1f}s)'
+            )
+            return WafHarvest(cookies=cookies_list, sitekey=sitekey)
 
-                        await context.close()
+    except Exception as e:
+        print(f'[WAF] {account_name}: 页面访问失败: {e}')
+        return None
 
-                        if sitekey:
-                            print(f'[WAF] {account_name}: 提取到 sitekey: {sitekey[:20]}...')
+async def probe_waf_entry(provider_config, entry: WafCacheEntry) -> bool:
+    """用一次轻量请求验证缓存的 WAF cookies 是否仍能通过 WAF"""
+    url = f"{provider_config.domain}{provider_config.user_info_path}"
+    cookie_header = "; ".join(f"{k}={v}" for k, v in entry.cookies.items())
+    try:
+        client = http_clients.get(provider_config.domain)
+        res = await client.get(url, headers={'user-agent': COMMON_UA, 'cookie': cookie_header}, timeout=10.0)
+        return not looks_like_waf_challenge(res.status_code, res.headers.get('content-type', ''), res.text)
+    except Exception:
+        return False
+
+async def solve_turnstile_in_browser(siteurl: str, sitekey: str, account_name: str) -> str | None:
+    """浏览器求解方式，注册给 TurnstileService 作为对冲备用"""
+    data = await get_waf_bypass_data_browser(account_name, ProviderConfig(name=siteurl, domain=siteurl))
+    return data.get('token') if data else None
+
+async def get_waf_bypass_data(account_name: str, provider_config, need_token: bool | None = None):
+    """
+    获取 WAF 绕过数据（智能选择求解方式）
 
-                            # 使用第三方服务求解
-                            token = await turnstile_service.solve_turnstile(domain, sitekey, account_name)
+    WAF cookies 按域名缓存，同一 provider 的账号共用一次页面访问；
+    只有签到需要 token 且没有可用的求解服务时，才为每个账号单独打开页面。
+    need_token 为 False 时（例如仅刷新余额）只取 cookies。
+    """
+    domain = provider_config.domain
+    if need_token is None:
+        need_token = bool(provider_config.sign_in_path)
+    method = await turnstile_service.resolve_method() if need_token else None
+    print(f'[WAF] {account_name}: 开始获取 WAF 数据 (域名: {domain})')
 
-                            if token:
-                                return {'cookies': waf_cookies, 'token': token}
-                            else:
-                                print(f'[WAF] {account_name}: ⚠️ 第三方求解失败，降级到浏览器方式')
-                        else:
-                            print(f'[WAF] {account_name}: ⚠️ 未找到 sitekey，降级到浏览器方式')
+    if not need_token or method in SOLVER_METHODS:
+        entry = await waf_cookie_cache.get_or_harvest(
+            domain,
+            lambda: harvest_waf_entry(account_name, provider_config, need_sitekey=need_token),
+            lambda e: probe_waf_entry(provider_config, e),
+        )
 
-                    except Exception as e:
-                        print(f'[WAF] {account_name}: 页面访问失败: {e}')
-                        await context.close()
+        if entry:
+            print(f'[WAF] {account_name}: 使用 {len(entry.cookies)} 个域名级 cookies')
+            if not need_token:
+                return {'cookies': entry.cookies, 'token': ''}
 
-        except Exception as e:
-            print(f'[WAF] {account_name}: 浏览器启动失败: {e}')
+            if entry.sitekey:
+                print(f'[WAF] {account_name}: 使用 {method} 求解 (sitekey: {entry.sitekey[:20]}...)')
+                token = await turnstile_service.solve_turnstile(domain, entry.sitekey, account_name)
 
-    # 降级到浏览器自动化
-    return await get_waf_bypass_data_browser(account_name, domain)
+                if token:
+                    return {'cookies': entry.cookies, 'token': token}
+                else:
+                    print(f'[WAF] {account_name}: ⚠️ 第三方求解失败，降级到浏览器方式')
+            else:
+                print(f'[WAF] {account_name}: ⚠️ 未找到 sitekey，降级到浏览器方式')
+
+    # 降级到浏览器自动化（复用同一个浏览器进程），顺便刷新域名缓存
+    data = await get_waf_bypass_data_browser(account_name, provider_config)
+    if data and data.get('raw_cookies'):
+        waf_cookie_cache.put(domain, WafHarvest(cookies=data.pop('raw_cookies')))
+    return data
+
+# 逐级升级：只有响应被判定为 WAF 挑战页（或签到被拒）时才进入下一级
+TIER_DIRECT = 1    # 只带账号自己的 cookies 直接请求
+TIER_CACHED = 2    # 带上缓存的域名级 WAF cookies
+TIER_BROWSER = 3   # 浏览器采集新的 WAF cookies
+TIER_SOLVER = 4    # 求解 Turnstile token 后签到
+TIER_NAMES = {TIER_DIRECT: 'direct', TIER_CACHED: 'cached_waf', TIER_BROWSER: 'browser', TIER_SOLVER: 'solver'}
+
+# 本次运行中已确认签到需要 Turnstile token 的域名，后续账号直接求解，不再先试无 token 签到
+_token_required_domains: set[str] = set()
+
+def expects_token(provider_config: ProviderConfig | None) -> bool:
+    """签到可能需要 Turnstile token 的账号（为其登记预取需求）"""
+    return bool(provider_config and provider_config.needs_waf_cookies() and provider_config.sign_in_path)
+
+def parse_account_cookies(cookies_data) -> dict:
+    """把账号配置中的 cookies（dict 或 "k=v; k2=v2" 字符串）转为字典"""
+    cookies = {}
+    if isinstance(cookies_data, dict):
+        cookies.update(cookies_data)
+    elif isinstance(cookies_data, str):
+        for part in cookies_data.split(';'):
+            if '=' in part:
+                k, v = part.strip().split('=', 1)
+                cookies[k] = v
+            elif part.strip():
+                cookies['session'] = part.strip()
+    return cookies
+
+async def check_in_account(account: AccountConfig, account_index: int, app_config: AppConfig, balance_only: bool = False):
+    """
+    处理单个账号：查询余额、签到
 
-async def check_in_account(account: AccountConfig, account_index: int, app_config: AppConfig):
+    按需逐级升级：先直接请求，遇到 WAF 挑战页再依次使用缓存的 WAF cookies、浏览器采集，
+    签到被拒时才求解 Turnstile token。返回的 info 中 tier 为该账号最终到达的层级。
+
+    balance_only 为 True 时（当天已签到的账号）只查询余额，不求解 token、不调用签到接口。
+
+    各阶段（采集、求解、查询、签到）失败时按 utils.retry 的策略只重试该阶段，整个账号共用一个截止时间。
+    """
     account_name = account.get_display_name(account_index)
     provider_config = app_config.get_provider(account.provider)
 
@@ -224,138 +332,600 @@ async def check_in_account(account: AccountConfig, account_index: int, app_confi
         print(f"[ERROR] {account_name}: 未找到 provider 配置: {account.provider}")
         return False, None
 
-    print(f"\n{'-'*30}\n[账号] {account_name}\n[站点] {account.provider}\n[域名] {provider_config.domain}\n{'-'*30}")
+    domain = provider_config.domain
+    print(f"\n{'-'*30}\n[账号] {account_name}\n[站点] {account.provider}\n[域名] {domain}\n{'-'*30}")
 
-    # 判断是否需要 WAF 绕过
     needs_waf = provider_config.bypass_method == 'waf_cookies'
-    user_cookies_data = account.cookies
-    waf_data = None
-
-    if needs_waf:
-        waf_data = await get_waf_bypass_data(account_name, provider_config.domain)
-        if not waf_data:
-            print(f"   ❌ WAF 绕过失败")
-            return False, {'success': False, 'error': 'WAF bypass failed'}
-
-    # 构造 cookies
-    final_cookies_dict = {}
-    if isinstance(user_cookies_data, dict):
-        final_cookies_dict.update(user_cookies_data)
-    elif isinstance(user_cookies_data, str):
-        for part in user_cookies_data.split(';'):
-            if '=' in part:
-                k, v = part.strip().split('=', 1)
-                final_cookies_dict[k] = v
-            elif part.strip():
-                final_cookies_dict['session'] = part.strip()
-
-    if waf_data and waf_data.get('cookies'):
-        final_cookies_dict.update(waf_data['cookies'])
-
-    cookie_header = "; ".join([f"{k}={v}" for k, v in final_cookies_dict.items()])
-
-    headers = {
-        'accept': 'application/json, text/plain, */*',
-        'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'new-api-user': str(account.api_user),
-        'referer': f'{provider_config.domain}/console/personal',
-        'sec-ch-ua': '"Not(A:Brand";v="8", "Chromium";v="144", "Microsoft Edge";v="144"',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-origin',
-        'user-agent': COMMON_UA,
-        'cookie': cookie_header
-    }
-
-    async with httpx.AsyncClient(http2=True, timeout=30.0) as client:
-        # 获取用户信息
-        info_url = f"{provider_config.domain}{provider_config.user_info_path}"
-        try:
-            res_info = await client.get(info_url, headers=headers)
-            if res_info.status_code == 200:
-                data = res_info.json()
-                if data.get('success'):
-                    u = data.get('data', {})
-                    q = round(u.get('quota', 0)/500000, 2)
-                    user_info = {'success': True, 'quota': q, 'used_quota': round(u.get('used_quota', 0)/500000, 2), 'display': f'💰 余额: ${q}'}
-                    print(f"   ✅ {user_info['display']}")
-                else:
-                    error_msg = data.get('message', '未知错误')
-                    print(f"   ❌ 获取用户信息失败: {error_msg}")
-                    return False, {'success': False, 'error': error_msg}
-            else:
-                error_msg = f'HTTP {res_info.status_code}'
-                print(f"   ❌ 请求失败: {error_msg}")
-                return False, {'success': False, 'error': error_msg}
-        except Exception as e:
-            error_msg = str(e)
-            print(f"   ❌ 请求异常: {error_msg}")
-            return False, {'success': False, 'error': error_msg}
-
-        # 执行签到
-        if not provider_config.sign_in_path:
-            print(f"   ✅ 签到成功 (无需调用签到接口)")
-            return True, user_info
-
-        payload = {}
-        if waf_data and waf_data.get('token'):
-            payload['token'] = waf_data['token']
-            print(f"   🔑 使用 Turnstile Token: {waf_data['token'][:30]}...")
-
-        try:
-            checkin_url = f"{provider_config.domain}{provider_config.sign_in_path}"
-            checkin_headers = headers.copy()
-            checkin_headers['Content-Type'] = 'application/json'
-
-            res_chk = await client.post(checkin_url, headers=checkin_headers, json=payload)
-            res_json = res_chk.json()
-            msg = res_json.get('message', '') or res_json.get('msg', '')
-            is_done = any(k in msg for k in ["今日已签到", "重复签到", "已经签到"])
-
-            if res_json.get('success') or is_done:
-                if is_done:
-                    print(f"   ℹ️ 重复签到 (成功)")
-                else:
-                    print(f"   ✅ 签到成功")
-                return True, user_info
+    account_cookies = parse_account_cookies(account.cookies)
+    waf_cookies = {}
+    tier = TIER_DIRECT
+    deadline = retry_engine.deadline()
+
+    def build_headers() -> dict:
+        final_cookies_dict = {**account_cookies, **waf_cookies}
+        return {
+            'accept': 'application/json, text/plain, */*',
+            'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8',
+            'new-api-user': str(account.api_user),
+            'referer': f'{domain}/console/personal',
+            'sec-ch-ua': '"Not(A:Brand";v="8", "Chromium";v="144", "Microsoft Edge";v="144"',
+            'sec-fetch-dest': 'empty',
+            'sec-fetch-mode': 'cors',
+            'sec-fetch-site': 'same-origin',
+            'user-agent': COMMON_UA,
+            'cookie': "; ".join([f"{k}={v}" for k, v in final_cookies_dict.items()])
+        }
+
+    def failed(result: Classification, info: dict | None = None):
+        base = info or {'success': False}
+        return False, {**base, 'error': result.message, 'error_class': result.kind, 'tier': TIER_NAMES[tier]}
+
+    limiter = rate_limiters.get(provider_config)
+
+    async def send(stage: str, request) -> Classification:
+        """经站点限速器发送一次请求并分类响应"""
+        async with limiter.slot() as sent_at:
+            try:
+                with tracer.span(stage, tier=tier):
+                    result = classify_response(await request())
+            except Exception as e:
+                result = classify_exception(e)
+            limiter.record(sent_at, result, challenge_expected=needs_waf and not waf_cookies)
+        return result
+
+    async def harvest() -> WafHarvest | None:
+        """浏览器采集 WAF cookies，页面访问失败时按 harvest 阶段策略重新打开页面"""
+        entry = None
+
+        async def attempt() -> Classification:
+            nonlocal entry
+            entry = await harvest_waf_entry(account_name, provider_config, need_sitekey=bool(provider_config.sign_in_path))
+            return Classification(OK) if entry else Classification(NETWORK, 'WAF cookies 采集失败')
+
+        await retry_engine.run('harvest', attempt, deadline)
+        return entry
+
+    async def escalate_waf() -> bool:
+        """升级到下一级 WAF cookies 来源，没有更高层级可用时返回 False"""
+        nonlocal tier, waf_cookies
+        if not needs_waf:
+            return False
+        with tracer.span('waf') as tags:
+            if tier < TIER_CACHED:
+                entry = waf_cookie_cache.get(domain)
+                if entry and entry.cookies != waf_cookies:
+                    tier = tags['tier'] = TIER_CACHED
+                    waf_cookies = dict(entry.cookies)
+                    print(f"   🔁 遇到 WAF 挑战，使用缓存的 {len(waf_cookies)} 个 WAF cookies")
+                    return True
+            if tier < TIER_BROWSER:
+                tier = tags['tier'] = TIER_BROWSER
+                stale = waf_cookie_cache.get(domain)
+                if stale and stale.cookies == waf_cookies:
+                    waf_cookie_cache.invalidate(domain)
+                print("   🔁 遇到 WAF 挑战，使用浏览器采集 WAF cookies")
+                entry = await waf_cookie_cache.get_or_harvest(domain, harvest)
+                if entry:
+                    waf_cookies = dict(entry.cookies)
+                    return True
+            return False
+
+    client = http_clients.get(domain)
+
+    # 获取用户信息（session 失效时在任何浏览器或求解工作之前立即失败）
+    info_url = f"{domain}{provider_config.user_info_path}"
+    while True:
+        result = await retry_engine.run(
+            'user_info', lambda: send('http.user_info', lambda: client.get(info_url, headers=build_headers())), deadline
+        )
+        if result.kind != WAF_CHALLENGE:
+            break
+        if not await escalate_waf():
+            print("   ❌ WAF 绕过失败")
+            return failed(result)
+
+    if not result.ok:
+        print(f"   ❌ 获取用户信息失败: {result.message} ({wording(result.kind)})")
+        return failed(result)
+
+    u = result.data.get('data', {})
+    q = round(u.get('quota', 0)/500000, 2)
+    user_info = {'success': True, 'quota': q, 'used_quota': round(u.get('used_quota', 0)/500000, 2), 'display': f'💰 余额: ${q}'}
+    print(f"   ✅ {user_info['display']}")
+
+    if balance_only:
+        print("   ℹ️ 今日已签到，仅刷新余额")
+        return True, {**user_info, 'tier': TIER_NAMES[tier]}
+
+    # 执行签到
+    if not provider_config.sign_in_path:
+        print("   ✅ 签到成功 (无需调用签到接口)")
+        return True, {**user_info, 'tier': TIER_NAMES[tier]}
+
+    checkin_url = f"{domain}{provider_config.sign_in_path}"
+    token = ''
+
+    async def solve_token() -> bool:
+        """升级到求解层级：取得 Turnstile token（连同最新的 WAF cookies）"""
+        nonlocal tier, token, waf_cookies
+        tier = TIER_SOLVER
+        waf_data = None
+
+        async def attempt() -> Classification:
+            nonlocal waf_data
+            with tracer.span('waf', tier=tier):
+                waf_data = await get_waf_bypass_data(account_name, provider_config, need_token=True)
+            if waf_data and waf_data.get('token'):
+                return Classification(OK)
+            return Classification(SERVER_ERROR, '获取 Turnstile token 失败')
+
+        if not (await retry_engine.run('solve', attempt, deadline)).ok:
+            return False
+        token = waf_data['token']
+        waf_cookies = {**waf_cookies, **(waf_data.get('cookies') or {})}
+        print(f"   🔑 使用 Turnstile Token: {token[:30]}...")
+        return True
+
+    if needs_waf and domain in _token_required_domains:
+        await solve_token()
+
+    def post_sign_in():
+        checkin_headers = build_headers()
+        checkin_headers['Content-Type'] = 'application/json'
+        return client.post(checkin_url, headers=checkin_headers, json={'token': token} if token else {})
+
+    def already_signed(result: Classification) -> bool:
+        return any(k in result.message for k in ["今日已签到", "重复签到", "已经签到"])
+
+    async def sign_in_once() -> Classification:
+        result = await send('http.sign_in', post_sign_in)
+        if already_signed(result):
+            return Classification(OK, result.message, result.status_code, data=result.data)
+        return result
+
+    async def refresh_token(result: Classification) -> bool:
+        """签到重试前：用过的 token 不能再用，沿用已采集的 WAF cookies 重新求解"""
+        if not token:
+            # 无 token 被拒由下面升级到求解层级处理
+            return result.kind != BUSINESS
+        print("   🔁 重新求解 Turnstile token 后重试签到")
+        return await solve_token()
+
+    while True:
+        result = await retry_engine.run('sign_in', sign_in_once, deadline, before_retry=refresh_token)
+
+        if result.kind == WAF_CHALLENGE:
+            if tier < TIER_BROWSER and await escalate_waf():
+                continue
+            print("   ❌ 签到请求被 WAF 拦截")
+            return failed(result, user_info)
+
+        if result.ok:
+            if already_signed(result):
+                print("   ℹ️ 重复签到 (成功)")
             else:
-                print(f"   ❌ 签到失败: {msg}")
-                return False, user_info
-        except Exception as e:
-            print(f"   ❌ 签到请求异常: {str(e)}")
-            return False, user_info
+                print("   ✅ 签到成功")
+            return True, {**user_info, 'tier': TIER_NAMES[tier]}
+
+        # 无 token 签到被业务拒绝：求解 Turnstile 后重试一次
+        if result.kind == BUSINESS and needs_waf and not token:
+            print(f"   🔁 无 token 签到被拒 ({result.message})，求解 Turnstile 后重试")
+            _token_required_domains.add(domain)
+            if await solve_token():
+                continue
+            print("   ❌ 获取 Turnstile token 失败")
+            return failed(result, user_info)
+
+        print(f"   ❌ 签到失败: {result.message} ({wording(result.kind)})")
+        return failed(result, user_info)
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='AnyRouter 自动签到')
+    parser.add_argument(
+        '--concurrency', '-c',
+        type=int,
+        default=int(os.getenv('CHECKIN_CONCURRENCY', '1') or 1),
+        help='同时处理的账号数量 (默认读取 CHECKIN_CONCURRENCY，未设置时为 1)',
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        default=os.getenv('CHECKIN_FORCE', 'false').lower() in ('true', '1', 'yes'),
+        help='忽略当天的签到记录，所有账号重新签到 (也可设置 CHECKIN_FORCE)',
+    )
+    parser.add_argument(
+        '--refresh-balance',
+        action='store_true',
+        default=os.getenv('CHECKIN_REFRESH_BALANCE', 'false').lower() in ('true', '1', 'yes'),
+        help='当天已签到的账号仍查询一次余额 (也可设置 CHECKIN_REFRESH_BALANCE)',
+    )
+    parser.add_argument(
+        '--accounts-file',
+        default=None,
+        help='从 JSON 数组或 JSONL 文件读取账号 (也可设置 ANYROUTER_ACCOUNTS_FILE，优先于 ANYROUTER_ACCOUNTS)',
+    )
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=int(os.getenv('CHECKIN_WORKERS', '1') or 1),
+        help='worker 进程数，每个进程有自己的浏览器，每个进程内同时处理 --concurrency 个账号 (也可设置 CHECKIN_WORKERS)',
+    )
+    parser.add_argument(
+        '--shard',
+        type=parse_shard,
+        default=parse_shard(os.environ['CHECKIN_SHARD']) if os.getenv('CHECKIN_SHARD') else None,
+        metavar='I/N',
+        help='只处理第 I 个分片 (共 N 个) 的账号，结果写入部分结果文件而不发送通知 (也可设置 CHECKIN_SHARD)',
+    )
+    parser.add_argument(
+        '--shard-output',
+        default=os.getenv('CHECKIN_SHARD_OUTPUT'),
+        help='部分结果文件路径 (默认 checkin_shard_<I>of<N>.json)',
+    )
+    parser.add_argument(
+        '--merge',
+        nargs='+',
+        metavar='FILE',
+        help='合并各分片的部分结果文件，统一发送通知并写入运行历史',
+    )
+    return parser.parse_args(argv)
+
+async def run_accounts(
+    accounts: list[AccountConfig],
+    app_config: AppConfig,
+    concurrency: int,
+    completed: set[int] = frozenset(),
+    refresh_balance: bool = False,
+    dead: set[int] = frozenset(),
+) -> list[tuple]:
+    """
+    按并发上限执行所有账号
 
-async def main():
-    print(f'[SYSTEM] AnyRouter 自动签到启动 V5 (混合求解)')
-    print(f'[SYSTEM] Turnstile 求解方式: {turnstile_service.get_method()}')
+    结果按账号原始顺序返回；并发大于 1 时每个账号的日志在其完成后整段输出。
+    completed 中的账号（序号）当天已签到：直接跳过，refresh_balance 时只查询余额。
+    dead 中的账号上次已确认 session 失效且 cookies 未更新：不发任何请求直接失败。
+    站点熔断期间该站点的账号推迟到最后，等半开探测有结果后再处理或直接跳过。
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(i: int, acc: AccountConfig, deferred: bool = False):
+        if i in completed and not refresh_balance:
+            print(f"[SKIP] {acc.get_display_name(i)}: 今日已签到，跳过")
+            return True, {'success': False, 'skipped': True}
+        if i in dead:
+            print(f"[SKIP] {acc.get_display_name(i)}: session 已失效且 cookies 未更新，跳过")
+            return False, {'success': False, 'error': 'session 已失效（cookies 未更新）', 'error_class': AUTH}
+
+        provider_config = app_config.get_provider(acc.provider)
+        breaker = circuit_breakers.get(provider_config.domain) if provider_config else None
+        # main() 为该账号登记了预取 token 的需求，账号没用到 token 就结束时要退还
+        claimed = i not in completed and expects_token(provider_config)
+
+        async with semaphore:
+            if breaker and not breaker.allow():
+                if not deferred:
+                    return None
+                breaker.rejected += 1
+                if claimed:
+                    turnstile_service.release(provider_config.domain)
+                print(f"[SKIP] {acc.get_display_name(i)}: {breaker.domain} 熔断中，跳过")
+                return False, {'success': False, 'error': f'{breaker.domain} 连续失败', 'error_class': CIRCUIT_OPEN}
+            try:
+                with (
+                    turnstile_service.claim(provider_config.domain) if claimed else nullcontext(),
+                    tracer.tagged(account=i, provider=acc.provider),
+                    tracer.span('account'),
+                ):
+                    if i in completed:
+                        # 刷新失败不影响当天已完成的签到
+                        _, info = await check_in_account(acc, i, app_config, balance_only=True)
+                        ok, info = True, {**(info or {}), 'skipped': True}
+                    else:
+                        ok, info = await check_in_account(acc, i, app_config)
+            except Exception as e:
+                print(f"   ❌ {acc.get_display_name(i)}: 未处理的异常: {e}")
+                return False, {'success': False, 'error': str(e)}
+            if breaker:
+                breaker.record((info or {}).get('error_class'))
+            return ok, info
+
+    def run_all(indices: list[int], deferred: bool = False):
+        if concurrency <= 1:
+            async def sequential():
+                return [await run_one(i, accounts[i], deferred) for i in indices]
+            return sequential()
+        return asyncio.gather(*(grouped(run_one(i, accounts[i], deferred)) for i in indices))
+
+    results = list(await run_all(list(range(len(accounts)))))
+
+    # 熔断期间推迟的账号：等到半开探测时间，每个站点先放行一个探测，其余账号随探测结果处理或跳过
+    postponed = {}
+    for i, result in enumerate(results):
+        if result is None:
+            postponed.setdefault(app_config.get_provider(accounts[i].provider).domain, []).append(i)
+
+    async def resume(domain: str, indices: list[int]):
+        breaker = circuit_breakers.get(domain)
+        if breaker.state == CLOSED:
+            # 熔断期间仍在进行的账号成功后熔断已恢复，不必等到探测时间
+            batches = [indices]
+        else:
+            await asyncio.sleep(breaker.probe_wait())
+            batches = [indices[:1], indices[1:]]
+        for batch in batches:
+            for i, result in zip(batch, await run_all(batch, deferred=True)):
+                results[i] = result
+
+    await asyncio.gather(*(resume(domain, indices) for domain, indices in postponed.items()))
+    return results
+
+def account_worker(worker_id: int, inbox, outbox, concurrency: int):
+    """worker 进程入口：用自己的事件循环与浏览器处理协调者分来的账号"""
+    asyncio.run(_serve_accounts(worker_id, inbox, outbox, concurrency))
 
+async def _serve_accounts(worker_id: int, inbox, outbox, concurrency: int):
     app_config = AppConfig.load_from_env()
-    accounts = load_accounts_config()
-    if not accounts: sys.exit(1)
+    turnstile_service.register_backend('browser', solve_turnstile_in_browser)
+    waf_cookie_cache.load()
+
+    async def handle(job: dict):
+        acc = AccountConfig(**job['account'])
+        i = job['index']
+        provider_config = app_config.get_provider(acc.provider)
+        if not job['completed'] and not job['dead'] and expects_token(provider_config):
+            # 按分到的账号登记预取需求，账号结束时由 run_accounts 退还未用到的部分
+            turnstile_service.add_demand(provider_config.domain)
+        with tracer.tagged(job=i):
+            # 账号日志整段输出，避免与其他 worker 的输出交错
+            [(ok, info)] = await grouped(run_accounts(
+                [acc], app_config, 1,
+                completed={0} if job['completed'] else frozenset(),
+                refresh_balance=job['refresh_balance'],
+                dead={0} if job['dead'] else frozenset(),
+            ))
+        # 本任务的 span 交回协调者，account 标签换成账号标识
+        spans = [span for span in tracer.spans if span.tags.get('job') == i]
+        tracer.spans = [span for span in tracer.spans if span.tags.get('job') != i]
+        for span in spans:
+            span.tags.pop('job')
+            span.tags['account'] = job['key']
+        return ok, info, [asdict(span) for span in spans]
+
+    try:
+        await serve(worker_id, inbox, outbox, handle, concurrency)
+    finally:
+        await turnstile_service.close()
+        await browser_manager.close()
+        await http_clients.close()
+        waf_cookie_cache.save()
+
+async def run_in_workers(
+    accounts: list[AccountConfig],
+    keys: list[str],
+    workers: int,
+    concurrency: int,
+    completed: set[int] = frozenset(),
+    refresh_balance: bool = False,
+    dead: set[int] = frozenset(),
+) -> list[tuple]:
+    """把账号分给 worker 进程处理，结果按账号原始顺序返回（与 run_accounts 相同）"""
+    jobs = {
+        i: {
+            'account': asdict(acc), 'index': i, 'key': keys[i],
+            'completed': i in completed, 'refresh_balance': refresh_balance, 'dead': i in dead,
+        }
+        for i, acc in enumerate(accounts)
+    }
+    pool = WorkerPool(workers, account_worker, args=(concurrency,), concurrency=concurrency)
+    done = await pool.run(jobs)
+    if pool.stats['restarts']:
+        print(f"[WORKER] 重启 worker {pool.stats['restarts']} 次，{pool.stats['crashed_jobs']} 个账号因 worker 崩溃失败")
+
+    results = []
+    for i in range(len(accounts)):
+        if done.get(i) is None:
+            results.append((False, {'success': False, 'error': 'worker 进程崩溃', 'error_class': SERVER_ERROR}))
+            continue
+        if isinstance(done[i], JobError):
+            results.append((False, {'success': False, 'error': f'worker 内处理异常: {done[i].message}'}))
+            continue
+        ok, info, spans = done[i]
+        tracer.spans.extend(Span(**row) for row in spans)
+        results.append((ok, info))
+    return results
+
+async def finish_run(
+    started_at: float,
+    history_results: list[AccountResult],
+    notify_list: list[str],
+    last_balances: dict,
+    config_errors: list[tuple[str, str]] = (),
+):
+    """输出升级层级与余额变化，有失败（或无效的账号配置）时发送通知，并把结果与阶段耗时写入运行历史"""
+    if config_errors:
+        lines = '\n'.join(f'{label}: {reason}' for label, reason in config_errors)
+        notify_list = [f'[CONFIG] {len(config_errors)} 条账号配置无效，已跳过\n{lines}', *notify_list]
+
+    tiers = {}
+    for record in history_results:
+        if record.tier:
+            tiers[record.tier] = tiers.get(record.tier, 0) + 1
+    if tiers:
+        print(f"[SYSTEM] 升级层级: {', '.join(f'{TIER_NAMES[t]} {tiers[TIER_NAMES[t]]}' for t in sorted(TIER_NAMES) if TIER_NAMES[t] in tiers)}")
+
+    for record, previous in run_history.changed_accounts(last_balances, history_results):
+        change = f'${previous} -> ${record.quota}' if previous is not None else f'首次记录 ${record.quota}'
+        print(f'[HISTORY] {record.name}: 余额变化 {change}')
+
+    need_push = bool(config_errors) or any(not record.ok for record in history_results)
+    skip_notify = os.getenv('SKIP_NOTIFY', 'false').lower() in ('true', '1', 'yes')
+    if need_push and not skip_notify:
+        with tracer.span('notify'):
+            await notify.apush_message('AnyRouter 签到结果报告', "\n\n".join(notify_list))
+
+    # 一次事务写入本次运行的结果与阶段耗时
+    run_history.record_run(started_at, history_results, tracer.spans)
+    tracer.report()
+    tracer.write()
+
+async def merge_shards(paths: list[str]):
+    """合并各分片的部分结果文件：一次通知、一次运行历史写入"""
+    print(f'[SYSTEM] 合并 {len(paths)} 个分片的结果')
+    last_balances = run_history.last_balances()
+    started_at, history_results, notify_list, spans, config_errors = load_partials(paths)
+    tracer.spans.extend(spans)
+    await finish_run(started_at or time.time(), history_results, notify_list, last_balances, config_errors)
+
+    success_count = sum(1 for record in history_results if record.ok)
+    print(f'\n[SYSTEM] 签到完成: {success_count}/{len(history_results)} 成功')
+    sys.exit(0)
+
+async def main(args: argparse.Namespace | None = None):
+    args = args or parse_args()
 
-    last_hash = load_balance_hash()
+    if args.merge:
+        await merge_shards(args.merge)
+
+    print('[SYSTEM] AnyRouter 自动签到启动 V5 (混合求解)')
+    started_at = time.time()
+
+    config_start = time.perf_counter()
+    app_config = AppConfig.load_from_env()
+    source = AccountSource.from_env(args.accounts_file)
+    if source is None:
+        print('ERROR: ANYROUTER_ACCOUNTS environment variable not found')
+        sys.exit(1)
+    # 逐条解析与校验，分片时只保留本分片的账号；账号名按原始序号生成，分片后保持不变
+    accounts, positions, total = [], [], 0
+    try:
+        for position, acc in enumerate(source):
+            total += 1
+            if args.shard and shard_of(account_key(acc.provider, acc.api_user), args.shard[1]) != args.shard[0]:
+                continue
+            accounts.append(acc)
+            positions.append(position)
+    except OSError as e:
+        print(f'ERROR: Failed to read account file: {e}')
+        sys.exit(1)
+    if source.errors:
+        print(f'[SYSTEM] {len(source.errors)} 条账号配置无效，已跳过')
+    if not total:
+        print('ERROR: No valid account configuration found')
+        sys.exit(1)
+    if args.shard:
+        print(f'[SYSTEM] 分片 {args.shard[0]}/{args.shard[1]}: 处理 {len(accounts)} 个账号')
+    print(
+        f'[SYSTEM] 启动耗时: 模块导入 {_IMPORT_SECONDS * 1000:.0f}ms, '
+        f'配置加载 {(time.perf_counter() - config_start) * 1000:.0f}ms '
+        f'(Turnstile 求解方式与浏览器在首次需要时才初始化)'
+    )
+
+    if args.workers > 1:
+        print(f'[SYSTEM] 多进程执行: {args.workers} 个 worker，每个同时处理 {args.concurrency} 个账号')
+    elif args.concurrency > 1:
+        print(f'[SYSTEM] 并发执行: {args.concurrency} 个账号同时处理')
+
+    last_balances = run_history.last_balances()
+
+    # 按站点时区的日期查询当天已签到的账号
+    keys = [account_key(acc.provider, acc.api_user) for acc in accounts]
+    days = {}
+    for key, acc in zip(keys, accounts):
+        provider_config = app_config.get_provider(acc.provider)
+        if provider_config:
+            days[key] = provider_config.checkin_day()
+    done_keys = set() if args.force else run_history.completed(days)
+    completed = {i for i, key in enumerate(keys) if key in done_keys}
+    if completed:
+        action = '仅刷新余额' if args.refresh_balance else '跳过 (使用 --force 强制签到)'
+        print(f'[SYSTEM] {len(completed)} 个账号今日已签到，{action}')
+
+    # 上次已确认 session 失效、且 cookies 仍是同一个 session 的账号不再请求
+    fingerprints = [session_fingerprint(parse_account_cookies(acc.cookies)) for acc in accounts]
+    dead_fps = {} if args.force else run_history.dead_sessions()
+    dead = {i for i, key in enumerate(keys) if fingerprints[i] and dead_fps.get(key) == fingerprints[i]} - completed
+    if dead:
+        print(f'[SYSTEM] {len(dead)} 个账号的 session 已失效且 cookies 未更新，跳过请求')
     success_count, total_count = 0, len(accounts)
-    notify_list, current_balances = [], {}
-    need_push = False
+    notify_list, history_results = [], []
 
+    # 登记每个站点需要的 token 数量，供求解服务预取（多进程时由各 worker 按分到的账号登记）
+    token_demand = {}
     for i, acc in enumerate(accounts):
-        ok, info = await check_in_account(acc, i, app_config)
+        if i in completed or i in dead or args.workers > 1:
+            continue
+        provider_config = app_config.get_provider(acc.provider)
+        if expects_token(provider_config):
+            token_demand[provider_config.domain] = token_demand.get(provider_config.domain, 0) + 1
+    for domain, count in token_demand.items():
+        turnstile_service.expect(domain, count)
+    turnstile_service.register_backend('browser', solve_turnstile_in_browser)
+
+    # 多进程时各 worker 自己加载与保存 WAF cookie 缓存
+    if args.workers <= 1:
+        waf_cookie_cache.load()
+    circuit_breakers.reset()
+    try:
+        if args.workers > 1:
+            results = await run_in_workers(accounts, keys, args.workers, args.concurrency, completed, args.refresh_balance, dead)
+        else:
+            results = await run_accounts(accounts, app_config, args.concurrency, completed, args.refresh_balance, dead)
+    finally:
+        await turnstile_service.close()
+        await browser_manager.close()
+        await http_clients.close()
+        if args.workers <= 1:
+            waf_cookie_cache.save()
+
+    turnstile_service.report_stats()
+    http_clients.report()
+    rate_limiters.report()
+    browser_manager.resource_stats.report()
+    circuit_breakers.report()
+    stats = waf_cookie_cache.stats
+    if stats['hits'] or stats['harvests']:
+        print(f"[WAF Cache] 命中 {stats['hits']} 次, 浏览器采集 {stats['harvests']} 次")
+
+    for i, (acc, (ok, info)) in enumerate(zip(accounts, results)):
         if ok: success_count += 1
-        else: need_push = True
 
-        status = "[SUCCESS]" if ok else "[FAIL]"
+        skipped = bool(info and info.get('skipped'))
+        circuit_open = (info or {}).get('error_class') == CIRCUIT_OPEN
+        status = "[SKIPPED]" if (skipped and ok) or circuit_open else "[SUCCESS]" if ok else "[FAIL]"
+        error = (info or {}).get('error') or (None if ok else '签到失败')
+        record = AccountResult(
+            account=keys[i],
+            name=acc.get_display_name(i),
+            provider=acc.provider,
+            ok=ok,
+            error=error,
+            error_class=(info or {}).get('error_class'),
+            day=days.get(keys[i]),
+            skipped=skipped,
+            tier=(info or {}).get('tier'),
+            session_fp=fingerprints[i],
+        )
         if info and info.get('success'):
-            current_balances[f'acc_{i}'] = {'quota': info['quota']}
+            record.quota, record.used_quota = info['quota'], info.get('used_quota')
             notify_list.append(f"{status} {acc.get_display_name(i)}\n{info['display']}")
+        elif not ok and (info or {}).get('error_class'):
+            notify_list.append(f"{status} {acc.get_display_name(i)}\n{wording(info['error_class'])}: {error}")
         else:
             notify_list.append(f"{status} {acc.get_display_name(i)}")
-
-    curr_hash = generate_balance_hash(current_balances)
-    if curr_hash != last_hash: save_balance_hash(curr_hash)
-
-    skip_notify = os.getenv('SKIP_NOTIFY', 'false').lower() in ('true', '1', 'yes')
-    if need_push and not skip_notify:
-        notify.push_message('AnyRouter 签到结果报告', "\n\n".join(notify_list))
+        history_results.append(record)
+
+    if args.shard:
+        # 通知与运行历史由 --merge 统一处理
+        output = args.shard_output or default_output(args.shard)
+        write_partial(
+            output, args.shard, started_at, list(zip(positions, history_results, notify_list)), tracer.spans, source.errors
+        )
+        tracer.report()
+        tracer.write()
+        print(f'[SYSTEM] 分片结果已写入 {output}')
+    else:
+        await finish_run(started_at, history_results, notify_list, last_balances, source.errors)
 
     print(f'\n[SYSTEM] 签到完成: {success_count}/{total_count} 成功')
     # sys.exit(0 if success_count == total_count else 1)
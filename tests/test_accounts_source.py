@@ -0,0 +1,72 @@
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import utils.config_v2 as config_v2
+from utils.config_v2 import AccountSource, _iter_json_array, load_accounts_config
+
+
+def _account(i: int) -> dict:
+	return {'provider': 'anyrouter', 'api_user': str(i), 'cookies': {'session': f's{i}'}}
+
+
+def test_json_array_is_parsed_across_chunk_boundaries():
+	text = json.dumps([_account(i) for i in range(20)], indent=2)
+	chunks = [text[i : i + 7] for i in range(0, len(text), 7)]
+	assert [record['api_user'] for record in _iter_json_array(iter(chunks))] == [str(i) for i in range(20)]
+
+
+def test_invalid_records_are_skipped_and_reported(capsys):
+	records = [_account(0), {'api_user': '1'}, 'oops', _account(3)]
+	source = AccountSource(text=json.dumps(records))
+	accounts = list(source)
+	assert [acc.api_user for acc in accounts] == ['0', '3']
+	# 名称按原始序号生成，跳过的条目不影响后面的账号
+	assert [acc.name for acc in accounts] == ['Account 1', 'Account 4']
+	assert [label for label, _ in source.errors] == ['Account 2', 'Account 3']
+	assert 'Account 2 skipped' in capsys.readouterr().out
+
+
+def test_jsonl_file_skips_bad_lines(tmp_path):
+	path = tmp_path / 'accounts.jsonl'
+	lines = [json.dumps(_account(0)), '', '# comment', '{"provider": ', json.dumps(_account(2))]
+	path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+	source = AccountSource(path=str(path))
+	assert [acc.api_user for acc in source] == ['0', '2']
+	assert [label for label, _ in source.errors] == ['line 4']
+
+
+def test_array_file_is_read_lazily(tmp_path, monkeypatch):
+	monkeypatch.setattr(config_v2, 'READ_CHUNK_CHARS', 64)
+	path = tmp_path / 'accounts.json'
+	path.write_text(json.dumps([_account(i) for i in range(1000)]), encoding='utf-8')
+	source = AccountSource(path=str(path))
+	read = []
+	chunks = source._chunks
+	source._chunks = lambda: (read.append(len(chunk)) or chunk for chunk in chunks())
+	accounts = iter(source)
+	assert next(accounts).api_user == '0'
+	assert next(accounts).api_user == '1'
+	# 只取前几个账号时不需要读完整个文件
+	assert sum(read) < path.stat().st_size / 10
+
+
+def test_array_syntax_error_skips_the_rest(capsys):
+	source = AccountSource(text='[' + json.dumps(_account(0)) + ', {"provider": }, ' + json.dumps(_account(2)) + ']')
+	assert [acc.api_user for acc in source] == ['0']
+	assert source.errors[0][0] == 'Account 2'
+
+
+def test_file_takes_precedence_over_env(tmp_path, monkeypatch):
+	path = tmp_path / 'accounts.jsonl'
+	path.write_text(json.dumps(_account(5)) + '\n', encoding='utf-8')
+	monkeypatch.setenv('ANYROUTER_ACCOUNTS', json.dumps([_account(1)]))
+	monkeypatch.setenv('ANYROUTER_ACCOUNTS_FILE', str(path))
+	assert [acc.api_user for acc in load_accounts_config()] == ['5']
+	monkeypatch.delenv('ANYROUTER_ACCOUNTS_FILE')
+	assert [acc.api_user for acc in load_accounts_config()] == ['1']
+	monkeypatch.delenv('ANYROUTER_ACCOUNTS')
+	assert load_accounts_config() is None
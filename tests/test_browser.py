@@ -0,0 +1,81 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.browser import PageSignals, ResourceRules
+
+
+class FakePage:
+	def __init__(self):
+		self.handlers = {}
+
+	def on(self, event, handler):
+		self.handlers.setdefault(event, []).append(handler)
+
+	def emit(self, event, *args):
+		for handler in self.handlers.get(event, []):
+			handler(*args)
+
+
+def test_wait_until_returns_on_page_signal_before_tick():
+	page = FakePage()
+	signals = PageSignals(page)
+	state = {}
+
+	async def check():
+		return state.get('token')
+
+	async def run():
+		async def produce():
+			await asyncio.sleep(0.05)
+			signals._on_token('tok')
+			state['token'] = 'tok'
+			page.emit('response', None)
+
+		asyncio.create_task(produce())
+		start = time.monotonic()
+		result = await signals.wait_until(check, timeout=5, tick=10)
+		return result, time.monotonic() - start
+
+	result, elapsed = asyncio.run(run())
+
+	assert result == 'tok'
+	assert elapsed < 1
+
+
+def test_wait_until_times_out_and_tolerates_errors():
+	signals = PageSignals(FakePage())
+
+	async def check():
+		raise RuntimeError('Execution context was destroyed')
+
+	assert asyncio.run(signals.wait_until(check, timeout=0.1, tick=0.02)) is None
+
+
+def test_resource_rules_block_heavy_and_third_party_requests():
+	from utils.config_v2 import ProviderConfig
+
+	rules = ResourceRules.for_provider(
+		ProviderConfig(name='anyrouter', domain='https://anyrouter.top', allow_hosts=['cdn.anyrouter.top.example'])
+	)
+
+	assert not rules.should_block('https://anyrouter.top/console/personal', 'document')
+	assert not rules.should_block('https://anyrouter.top/assets/index.js', 'script')
+	assert not rules.should_block('https://challenges.cloudflare.com/turnstile/v0/api.js', 'script')
+	assert not rules.should_block('https://challenges.cloudflare.com/cdn-cgi/challenge-platform/logo.png', 'image')
+	assert not rules.should_block('https://cdn.anyrouter.top.example/app.js', 'script')
+	assert rules.should_block('https://anyrouter.top/logo.png', 'image')
+	assert rules.should_block('https://anyrouter.top/fonts/inter.woff2', 'font')
+	assert rules.should_block('https://www.googletagmanager.com/gtag/js', 'script')
+
+
+def test_resource_rules_can_be_disabled(monkeypatch):
+	from utils.config_v2 import ProviderConfig
+
+	monkeypatch.setenv('BROWSER_BLOCK_RESOURCES', 'false')
+
+	assert ResourceRules.for_provider(ProviderConfig(name='x', domain='https://x.example')) is None
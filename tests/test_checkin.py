@@ -0,0 +1,128 @@
+import asyncio
+import json
+import queue
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import checkin
+from utils.browser import PageSignals
+from utils.config_v2 import ProviderConfig
+from utils.waf_cache import WafCookieCache, WafHarvest
+
+
+class FakePage:
+	def __init__(self):
+		self.handlers = {}
+
+	def on(self, event, handler):
+		self.handlers.setdefault(event, []).append(handler)
+
+	def emit(self, event):
+		for handler in self.handlers.get(event, []):
+			handler(None)
+
+	async def evaluate(self, script):
+		return True
+
+
+class FakeContext:
+	def __init__(self):
+		self.jar = [{'name': 'tracking', 'value': 'x'}]
+
+	async def cookies(self):
+		return list(self.jar)
+
+
+def test_harvest_finishes_as_soon_as_required_cookies_exist():
+	page, context = FakePage(), FakeContext()
+	signals = PageSignals(page)
+
+	async def run():
+		async def set_cookie():
+			await asyncio.sleep(0.05)
+			context.jar.append({'name': 'acw_tc', 'value': 'abc'})
+			page.emit('response')
+
+		asyncio.create_task(set_cookie())
+		start = time.monotonic()
+		cookies, complete = await checkin.wait_for_harvest(page, context, signals, ['acw_tc'], timeout=5)
+		return cookies, complete, time.monotonic() - start
+
+	cookies, complete, elapsed = asyncio.run(run())
+
+	assert complete
+	assert elapsed < 1
+	assert checkin.filter_waf_cookies(cookies, ['acw_tc']) == [{'name': 'acw_tc', 'value': 'abc'}]
+
+
+def test_harvest_times_out_with_partial_cookies():
+	page, context = FakePage(), FakeContext()
+
+	cookies, complete = asyncio.run(
+		checkin.wait_for_harvest(page, context, PageSignals(page), ['acw_tc', 'cdn_sec_tc'], timeout=0.1)
+	)
+
+	assert not complete
+	assert checkin.filter_waf_cookies(cookies, ['acw_tc', 'cdn_sec_tc']) == []
+
+
+def test_solver_is_still_used_after_another_account_fell_back_to_the_browser(monkeypatch):
+	cache = WafCookieCache()
+	monkeypatch.setattr(checkin, 'waf_cookie_cache', cache)
+	monkeypatch.setattr(checkin.turnstile_service, 'method', 'yescaptcha')
+	solves = []
+
+	async def harvest(account_name, provider_config, need_sitekey):
+		return WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'v'}], sitekey='0xKEY')
+
+	async def solve(siteurl, sitekey, account_name):
+		solves.append((account_name, sitekey))
+		return None if account_name == 'A' else 'token'
+
+	async def browser(account_name, provider_config):
+		return {'cookies': {'acw_tc': 'b'}, 'token': 'browser-token', 'raw_cookies': [{'name': 'acw_tc', 'value': 'b'}]}
+
+	monkeypatch.setattr(checkin, 'harvest_waf_entry', harvest)
+	monkeypatch.setattr(checkin.turnstile_service, 'solve_turnstile', solve)
+	monkeypatch.setattr(checkin, 'get_waf_bypass_data_browser', browser)
+	provider = ProviderConfig(name='bench', domain='https://bench.example.com')
+
+	async def run():
+		first = await checkin.get_waf_bypass_data('A', provider, need_token=True)
+		second = await checkin.get_waf_bypass_data('B', provider, need_token=True)
+		return first, second
+
+	first, second = asyncio.run(run())
+
+	# A 求解失败后降级到浏览器并刷新了 cookies，B 仍然先使用求解服务
+	assert first['token'] == 'browser-token'
+	assert second == {'cookies': {'acw_tc': 'b'}, 'token': 'token'}
+	assert solves == [('A', '0xKEY'), ('B', '0xKEY')]
+
+
+def test_worker_registers_token_demand_per_dispatched_account(monkeypatch):
+	domain = 'https://bench.example.com'
+	monkeypatch.setenv('PROVIDERS', json.dumps({'bench': {'domain': domain, 'bypass_method': 'waf_cookies'}}))
+	seen = []
+
+	async def check_in(account, index, app_config, balance_only=False):
+		seen.append(checkin.turnstile_service._demand.get(domain))
+		return True, {'success': True}
+
+	monkeypatch.setattr(checkin, 'check_in_account', check_in)
+	inbox, outbox = queue.Queue(), queue.Queue()
+	for i in range(3):
+		account = {'cookies': {'session': 's'}, 'api_user': str(i), 'provider': 'bench', 'name': None}
+		job = {'account': account, 'index': i, 'key': f'bench:{i}', 'completed': False, 'refresh_balance': False, 'dead': False}
+		inbox.put((i, job))
+	inbox.put(None)
+
+	asyncio.run(checkin._serve_accounts(0, inbox, outbox, 1))
+
+	# 只为正在处理的账号登记需求，没用到 token 的账号结束时退还，不会为未分到的账号预取
+	assert seen == [1, 1, 1]
+	assert [outbox.get_nowait()[2][0] for _ in range(3)] == [True, True, True]
@@ -0,0 +1,52 @@
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+
+
+def test_opens_after_consecutive_site_failures():
+	breaker = CircuitBreaker('https://a.example', threshold=3, probe_interval=60)
+	breaker.record('network')
+	breaker.record('server_error')
+	# auth 说明站点仍在响应，重新计数
+	breaker.record('auth')
+	breaker.record('waf_challenge')
+	breaker.record('network')
+	assert breaker.state == CLOSED and breaker.allow()
+
+	breaker.record('server_error')
+	assert breaker.state == OPEN and not breaker.allow()
+
+
+def test_half_open_probe_closes_or_reopens():
+	breaker = CircuitBreaker('https://a.example', threshold=1, probe_interval=0.05)
+	breaker.record('network')
+	assert not breaker.allow()
+
+	time.sleep(0.06)
+	assert breaker.allow() and breaker.state == HALF_OPEN
+	# 探测进行中，其他账号不放行
+	assert not breaker.allow()
+	breaker.record('network')
+	assert breaker.state == OPEN and breaker.trips == 2
+
+	time.sleep(0.06)
+	assert breaker.allow()
+	breaker.record(None)
+	assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_breakers_are_per_domain_and_can_be_disabled():
+	breakers = CircuitBreakers(threshold=1, probe_interval=60)
+	breakers.get('https://a.example').record('network')
+	assert not breakers.get('https://a.example').allow()
+	assert breakers.get('https://b.example').allow()
+
+	disabled = CircuitBreaker('https://a.example', threshold=0, probe_interval=60)
+	for _ in range(5):
+		disabled.record('network')
+	assert disabled.allow()
@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.classify import (
+	AUTH,
+	BUSINESS,
+	NETWORK,
+	OK,
+	RATE_LIMIT,
+	SERVER_ERROR,
+	WAF_CHALLENGE,
+	classify,
+	classify_exception,
+	session_fingerprint,
+	wording,
+)
+
+JSON = {'content-type': 'application/json'}
+
+
+def test_waf_challenge_page():
+	body = '<html><script>var arg1="ABC";</script></html>'
+	assert classify(200, {'content-type': 'text/html'}, body).kind == WAF_CHALLENGE
+
+
+def test_expired_session_is_auth():
+	result = classify(401, JSON, '{"success": false, "message": "无权进行此操作，未登录且未提供 access token"}')
+	assert result.kind == AUTH
+	assert 'cookies' in wording(result.kind)
+
+	# 有的站点用 200 + 业务失败表示未登录
+	assert classify(200, JSON, '{"success": false, "message": "用户未登录"}').kind == AUTH
+
+
+def test_rate_limit_reads_retry_after():
+	result = classify(429, {**JSON, 'retry-after': '3'}, '{"success": false, "message": "请求过于频繁"}')
+	assert result.kind == RATE_LIMIT and result.retry_after == 3.0
+
+
+def test_server_errors_and_unparseable_bodies():
+	assert classify(502, {'content-type': 'text/plain'}, 'Bad Gateway').kind == SERVER_ERROR
+	assert classify(200, {'content-type': 'text/plain'}, 'not json').kind == SERVER_ERROR
+
+
+def test_business_failure_and_success():
+	assert classify(200, JSON, '{"success": false, "message": "今日已签到"}').kind == BUSINESS
+	result = classify(200, JSON, '{"success": true, "data": {"quota": 1}}')
+	assert result.kind == OK and result.ok and result.data['data']['quota'] == 1
+
+
+def test_network_exceptions():
+	assert classify_exception(httpx.ConnectError('refused')).kind == NETWORK
+	assert classify_exception(httpx.ReadTimeout('timeout')).kind == NETWORK
+	assert classify_exception(ValueError('boom')).kind == SERVER_ERROR
+
+
+def test_session_fingerprint_hides_the_cookie():
+	fp = session_fingerprint({'session': 'secret'})
+	assert fp and 'secret' not in fp and fp == session_fingerprint({'session': 'secret'})
+	assert session_fingerprint({}) is None
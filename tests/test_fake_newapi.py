@@ -0,0 +1,383 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import checkin
+from benchmarks.bench_checkin import run_benchmark
+from benchmarks.fake_newapi import FAKE_TOKEN_PREFIX, WAF_COOKIE_NAMES, FakeNewApiServer, FakeNewApiState
+from utils.circuit import CircuitBreakers
+from utils.config_v2 import AccountConfig, AppConfig, ProviderConfig
+from utils.history import RunHistory
+from utils.rate_limit import RateLimiters
+from utils.retry import RetryEngine, StagePolicy
+from utils.waf_cache import WafCookieCache, WafHarvest, looks_like_waf_challenge
+
+
+def test_check_in_account_against_fake_server():
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	with FakeNewApiServer(state) as server:
+		app_config = AppConfig(providers={'bench': ProviderConfig.from_dict('bench', server.provider_config())})
+		account = AccountConfig(cookies={'session': 's1'}, api_user='42', provider='bench')
+
+		async def run():
+			first = await checkin.check_in_account(account, 0, app_config)
+			second = await checkin.check_in_account(account, 0, app_config)
+			await checkin.http_clients.close()
+			return first, second
+
+		(ok1, info1), (ok2, _) = asyncio.run(run())
+
+	assert ok1 and ok2
+	assert info1['quota'] == 50.0 and info1['tier'] == 'direct'
+	assert state.signed_in == {'42'}
+	assert state.requests == {'/api/user/self': 2, '/api/user/sign_in': 2}
+
+
+def test_fake_server_challenges_requests_without_waf_cookies():
+	with FakeNewApiServer(FakeNewApiState()) as server:
+		res = httpx.get(f'{server.url}/api/user/self', headers={'new-api-user': '1', 'cookie': 'session=s'})
+		assert looks_like_waf_challenge(res.status_code, res.headers['content-type'], res.text)
+
+		page = httpx.get(f'{server.url}/console/personal')
+		assert {'acw_tc', 'cdn_sec_tc'} <= set(page.cookies.keys())
+
+		cookies = 'session=s; acw_tc=a; cdn_sec_tc=b; acw_sc__v2=c'
+		res = httpx.post(f'{server.url}/api/user/sign_in', json={}, headers={'new-api-user': '1', 'cookie': cookies})
+		assert res.json()['success'] is False
+
+
+def test_benchmark_runs_main_with_synthetic_accounts():
+	result = run_benchmark(accounts=5, concurrency=3)
+
+	assert result['signed_in'] == 5
+	assert result['stages']['account']['count'] == 5
+	assert result['accounts_per_minute'] > 0
+
+
+def _run_main(argv: list[str]):
+	try:
+		asyncio.run(checkin.main(checkin.parse_args(argv)))
+	except SystemExit:
+		pass
+
+
+def _main_env(monkeypatch, tmp_path, server, accounts: list[dict] | None) -> RunHistory:
+	"""让 main() 使用替身站点与临时的运行历史（accounts 为 None 时不设置 ANYROUTER_ACCOUNTS）"""
+	if accounts is None:
+		monkeypatch.delenv('ANYROUTER_ACCOUNTS', raising=False)
+	else:
+		monkeypatch.setenv('ANYROUTER_ACCOUNTS', json.dumps(accounts))
+	monkeypatch.setenv('PROVIDERS', json.dumps({'bench': {'domain': server.url}}))
+	monkeypatch.setenv('SKIP_NOTIFY', 'true')
+	history = RunHistory(path=str(tmp_path / 'history.db'))
+	monkeypatch.setattr(checkin, 'run_history', history)
+	# 之前的测试留下的 span 会混入本次运行的耗时记录
+	checkin.tracer.spans.clear()
+	return history
+
+
+def test_accounts_signed_in_today_are_skipped(monkeypatch, tmp_path):
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	with FakeNewApiServer(state) as server:
+		_main_env(monkeypatch, tmp_path, server, [{'provider': 'bench', 'api_user': '7', 'cookies': {'session': 's'}}])
+
+		_run_main([])
+		assert state.requests == {'/api/user/self': 1, '/api/user/sign_in': 1}
+
+		# 当天再次运行：不发任何请求
+		_run_main([])
+		assert state.requests == {'/api/user/self': 1, '/api/user/sign_in': 1}
+
+		# 仅刷新余额：只查询用户信息
+		_run_main(['--refresh-balance'])
+		assert state.requests == {'/api/user/self': 2, '/api/user/sign_in': 1}
+
+		# 强制签到
+		_run_main(['--force'])
+		assert state.requests == {'/api/user/self': 3, '/api/user/sign_in': 2}
+
+
+def _waf_provider(server) -> AppConfig:
+	return AppConfig(providers={'bench': ProviderConfig.from_dict('bench', server.provider_config())})
+
+
+def _check_in(app_config: AppConfig, api_user: str = '1'):
+	account = AccountConfig(cookies={'session': 's'}, api_user=api_user, provider='bench')
+
+	async def run():
+		try:
+			return await checkin.check_in_account(account, 0, app_config)
+		finally:
+			await checkin.http_clients.close()
+
+	return asyncio.run(run())
+
+
+def test_escalation_stops_at_cached_waf_cookies(monkeypatch):
+	cache = WafCookieCache()
+	monkeypatch.setattr(checkin, 'waf_cookie_cache', cache)
+
+	async def no_browser(*args, **kwargs):
+		raise AssertionError('browser should not be used')
+
+	monkeypatch.setattr(checkin, 'harvest_waf_entry', no_browser)
+	with FakeNewApiServer(FakeNewApiState(require_token=False)) as server:
+		cache.put(server.url, WafHarvest(cookies=[{'name': n, 'value': 'v'} for n in WAF_COOKIE_NAMES]))
+		ok, info = _check_in(_waf_provider(server))
+
+		assert ok and info['tier'] == 'cached_waf'
+		assert server.state.requests == {'/api/user/self': 2, '/api/user/sign_in': 1}
+
+
+def test_escalation_harvests_when_cached_cookies_are_stale(monkeypatch):
+	cache = WafCookieCache()
+	monkeypatch.setattr(checkin, 'waf_cookie_cache', cache)
+	harvests = []
+
+	async def harvest(account_name, provider_config, need_sitekey):
+		harvests.append(need_sitekey)
+		return WafHarvest(cookies=[{'name': n, 'value': 'fresh'} for n in WAF_COOKIE_NAMES])
+
+	monkeypatch.setattr(checkin, 'harvest_waf_entry', harvest)
+	with FakeNewApiServer(FakeNewApiState(require_token=False)) as server:
+		cache.put(server.url, WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'stale'}]))
+		ok, info = _check_in(_waf_provider(server))
+
+		assert ok and info['tier'] == 'browser'
+		assert harvests == [True]
+		assert cache.get(server.url).cookies['acw_tc'] == 'fresh'
+
+
+def test_solver_is_used_only_after_tokenless_sign_in_is_rejected(monkeypatch):
+	monkeypatch.setattr(checkin, '_token_required_domains', set())
+	solves = []
+
+	async def fake_bypass(account_name, provider_config, need_token=None):
+		solves.append(need_token)
+		return {'cookies': {}, 'token': f'{FAKE_TOKEN_PREFIX}{len(solves)}'}
+
+	monkeypatch.setattr(checkin, 'get_waf_bypass_data', fake_bypass)
+	state = FakeNewApiState(require_waf=False, require_token=True)
+	with FakeNewApiServer(state) as server:
+		app_config = AppConfig(
+			providers={'bench': ProviderConfig.from_dict('bench', server.provider_config(bypass_method='waf_cookies'))}
+		)
+		ok, info = _check_in(app_config, api_user='1')
+		assert ok and info['tier'] == 'solver'
+		assert state.requests == {'/api/user/self': 1, '/api/user/sign_in': 2}
+
+		# 同一次运行中的后续账号直接求解，不再先试无 token 签到
+		ok, info = _check_in(app_config, api_user='2')
+		assert ok and info['tier'] == 'solver'
+		assert state.requests == {'/api/user/self': 2, '/api/user/sign_in': 3}
+		assert solves == [True, True]
+
+
+def test_expired_session_fails_fast_and_is_not_retried_next_run(monkeypatch, tmp_path):
+	async def no_browser(*args, **kwargs):
+		raise AssertionError('browser should not be used')
+
+	monkeypatch.setattr(checkin, 'harvest_waf_entry', no_browser)
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	with FakeNewApiServer(state) as server:
+		ok, info = _check_in(_waf_provider(server), api_user='')
+		assert not ok and info['error_class'] == 'auth' and info['tier'] == 'direct'
+		assert state.requests == {'/api/user/self': 1}
+
+		_main_env(monkeypatch, tmp_path, server, [{'provider': 'bench', 'api_user': '', 'cookies': {'session': 's'}}])
+
+		_run_main([])
+		assert state.requests == {'/api/user/self': 2}
+
+		# 同一个失效 session 不再发请求
+		_run_main([])
+		assert state.requests == {'/api/user/self': 2}
+
+		# 更新 cookies 后恢复请求
+		monkeypatch.setenv('ANYROUTER_ACCOUNTS', '[{"provider": "bench", "api_user": "", "cookies": {"session": "new"}}]')
+		_run_main([])
+		assert state.requests == {'/api/user/self': 3}
+
+
+def test_failed_sign_in_retries_only_the_post_with_a_fresh_token(monkeypatch):
+	monkeypatch.setattr(checkin, '_token_required_domains', set())
+	monkeypatch.setattr(checkin, 'retry_engine', RetryEngine(stages={
+		'user_info': StagePolicy({'server_error': 2}, backoff=0),
+		'sign_in': StagePolicy({'server_error': 2, 'business': 1}, backoff=0),
+	}))
+	solves = []
+
+	async def fake_bypass(account_name, provider_config, need_token=None):
+		solves.append(need_token)
+		return {'cookies': {}, 'token': f'{FAKE_TOKEN_PREFIX}{len(solves)}'}
+
+	monkeypatch.setattr(checkin, 'get_waf_bypass_data', fake_bypass)
+	state = FakeNewApiState(require_waf=False, require_token=True)
+	state.failures = {'/api/user/self': 1, '/api/user/sign_in': 1}
+	with FakeNewApiServer(state) as server:
+		app_config = AppConfig(
+			providers={'bench': ProviderConfig.from_dict('bench', server.provider_config(bypass_method='waf_cookies'))}
+		)
+		ok, info = _check_in(app_config)
+
+	assert ok and info['tier'] == 'solver'
+	# 查询失败一次后重试；签到依次为: 无 token 被拒、token 被消耗后 502、换新 token 成功
+	assert state.requests == {'/api/user/self': 2, '/api/user/sign_in': 3}
+	assert solves == [True, True]
+
+
+def test_circuit_breaker_skips_accounts_on_a_failing_provider(monkeypatch):
+	monkeypatch.setattr(checkin, 'circuit_breakers', CircuitBreakers(threshold=2, probe_interval=0.2))
+	monkeypatch.setattr(checkin, 'retry_engine', RetryEngine(stages={}))
+	down = FakeNewApiState(require_waf=False, require_token=False)
+	down.failures = {'/api/user/self': 100}
+	up = FakeNewApiState(require_waf=False, require_token=False)
+	with FakeNewApiServer(down) as bad, FakeNewApiServer(up) as good:
+		app_config = AppConfig(providers={
+			'bad': ProviderConfig.from_dict('bad', bad.provider_config()),
+			'good': ProviderConfig.from_dict('good', good.provider_config()),
+		})
+		accounts = [
+			AccountConfig(cookies={'session': 's'}, api_user=str(i), provider='bad' if i < 5 else 'good')
+			for i in range(8)
+		]
+
+		async def run():
+			try:
+				return await checkin.run_accounts(accounts, app_config, concurrency=1)
+			finally:
+				await checkin.http_clients.close()
+
+		results = asyncio.run(run())
+
+	# 两个账号失败后熔断，推迟的账号中只有一个作为半开探测发出请求
+	assert down.requests == {'/api/user/self': 3}
+	assert [info.get('error_class') for _, info in results[:5]] == ['server_error'] * 2 + ['server_error'] + ['circuit_open'] * 2
+	assert all(ok for ok, _ in results[5:])
+	assert up.signed_in == {'5', '6', '7'}
+
+
+def test_deferred_accounts_resume_at_once_when_the_breaker_recovers(monkeypatch):
+	monkeypatch.setattr(checkin, 'circuit_breakers', CircuitBreakers(threshold=2, probe_interval=5))
+	monkeypatch.setattr(checkin, 'retry_engine', RetryEngine(stages={}))
+	state = FakeNewApiState(require_waf=False, require_token=False, latency=0.1)
+	state.failures = {'/api/user/self': 2}
+	with FakeNewApiServer(state) as server:
+		app_config = AppConfig(providers={'bench': ProviderConfig.from_dict('bench', server.provider_config())})
+		accounts = [AccountConfig(cookies={'session': 's'}, api_user=str(i), provider='bench') for i in range(6)]
+
+		async def run():
+			try:
+				return await checkin.run_accounts(accounts, app_config, concurrency=3)
+			finally:
+				await checkin.http_clients.close()
+
+		started = time.monotonic()
+		results = asyncio.run(run())
+
+	# 两个账号失败后熔断，熔断期间仍在进行的账号签到成功使熔断恢复，推迟的账号不再等待探测时间
+	assert sum(ok for ok, _ in results) == 4
+	assert len(state.signed_in) == 4
+	assert time.monotonic() - started < 2
+
+
+def test_rate_limiter_backs_off_when_the_site_throttles(monkeypatch):
+	limiters = RateLimiters()
+	monkeypatch.setattr(checkin, 'rate_limiters', limiters)
+	monkeypatch.setattr(checkin, 'retry_engine', RetryEngine(stages={
+		'user_info': StagePolicy({'rate_limit': 5}, backoff=0),
+		'sign_in': StagePolicy({'rate_limit': 5}, backoff=0),
+	}))
+	state = FakeNewApiState(require_waf=False, require_token=False, latency=0.05, max_in_flight=3)
+	with FakeNewApiServer(state) as server:
+		config = server.provider_config(rate_limit={'rate': 0, 'initial_concurrency': 8, 'max_concurrency': 8})
+		app_config = AppConfig(providers={'bench': ProviderConfig.from_dict('bench', config)})
+		accounts = [AccountConfig(cookies={'session': 's'}, api_user=str(i), provider='bench') for i in range(12)]
+
+		async def run():
+			try:
+				return await checkin.run_accounts(accounts, app_config, concurrency=12)
+			finally:
+				await checkin.http_clients.close()
+
+		results = asyncio.run(run())
+
+	limiter = limiters.limiters[server.url]
+	assert all(ok for ok, _ in results) and len(state.signed_in) == 12
+	assert state.throttled and limiter.stats['decreases'] >= 1
+	assert state.peak_in_flight <= 3 and limiter.limit <= 8
+
+
+def test_shards_write_partials_and_merge_updates_history(monkeypatch, tmp_path):
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	accounts = [{'provider': 'bench', 'api_user': str(i), 'cookies': {'session': 's'}} for i in range(6)]
+	with FakeNewApiServer(state) as server:
+		history = _main_env(monkeypatch, tmp_path, server, accounts)
+
+		partials = []
+		for i in (1, 2):
+			partials.append(str(tmp_path / f'shard{i}.json'))
+			# 各分片在不同进程中运行
+			checkin.tracer.spans.clear()
+			_run_main(['--shard', f'{i}/2', '--shard-output', partials[-1]])
+			# 分片不写运行历史
+			assert not os.path.exists(history.path)
+		assert state.signed_in == {str(i) for i in range(6)}
+		assert state.requests == {'/api/user/self': 6, '/api/user/sign_in': 6}
+
+		checkin.tracer.spans.clear()
+		_run_main(['--merge', *partials])
+
+	with sqlite3.connect(history.path) as conn:
+		runs = conn.execute('SELECT total, succeeded FROM runs').fetchall()
+		names = [row[0] for row in conn.execute('SELECT name FROM account_results ORDER BY rowid')]
+		timed = {row[0] for row in conn.execute("SELECT account FROM stage_timings WHERE stage = 'account'")}
+	assert runs == [(6, 6)]
+	assert names == [f'Account {i + 1}' for i in range(6)]
+	assert timed == {f'bench:{i}' for i in range(6)}
+
+
+def test_worker_processes_check_in_all_accounts(monkeypatch, tmp_path):
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	accounts = [{'provider': 'bench', 'api_user': str(i), 'cookies': {'session': 's'}} for i in range(6)]
+	with FakeNewApiServer(state) as server:
+		history = _main_env(monkeypatch, tmp_path, server, accounts)
+		# worker 进程不写运行历史
+		monkeypatch.setenv('CHECKIN_HISTORY_DB', '')
+
+		_run_main(['--workers', '2', '--concurrency', '2'])
+
+	assert state.signed_in == {str(i) for i in range(6)}
+	with sqlite3.connect(history.path) as conn:
+		results = conn.execute('SELECT account, ok, tier FROM account_results ORDER BY rowid').fetchall()
+		timed = {row[0] for row in conn.execute("SELECT account FROM stage_timings WHERE stage = 'account'")}
+	assert results == [(f'bench:{i}', 1, 'direct') for i in range(6)]
+	# worker 中的 span 交回协调者后仍归属到各自账号
+	assert timed == {f'bench:{i}' for i in range(6)}
+
+
+def test_accounts_file_skips_invalid_records(monkeypatch, tmp_path, capsys):
+	state = FakeNewApiState(require_waf=False, require_token=False)
+	path = tmp_path / 'accounts.jsonl'
+	lines = [json.dumps({'provider': 'bench', 'api_user': str(i), 'cookies': {'session': 's'}}) for i in range(3)]
+	lines.insert(1, '{"provider": "bench", "api_user": "x"}')
+	path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+	with FakeNewApiServer(state) as server:
+		history = _main_env(monkeypatch, tmp_path, server, None)
+
+		_run_main(['--accounts-file', str(path)])
+
+	assert state.signed_in == {'0', '1', '2'}
+	assert '1 条账号配置无效' in capsys.readouterr().out
+	with sqlite3.connect(history.path) as conn:
+		names = [row[0] for row in conn.execute('SELECT name FROM account_results ORDER BY rowid')]
+	assert names == ['Account 1', 'Account 3', 'Account 4']
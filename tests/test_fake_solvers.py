@@ -0,0 +1,60 @@
+import asyncio
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from benchmarks.bench_turnstile import build_service, run_benchmark
+from benchmarks.fake_newapi import FAKE_SITEKEY, FAKE_TOKEN_PREFIX
+from benchmarks.fake_solvers import FakeSolverConfig, FakeSolverServer
+from utils.http_pool import http_clients
+
+
+def _fast_service(backend: str, url: str):
+	service = build_service(backend, url, None, hedge_delay=-1, deadline=5)
+	# 预先给出耗时历史，让首次轮询落在 50ms 左右
+	for _ in range(5):
+		service.history.record(backend, 0.05)
+	return service
+
+
+def _solve(service):
+	async def run():
+		try:
+			return await service.solve_turnstile('https://bench.example.com', FAKE_SITEKEY, 'test')
+		finally:
+			await http_clients.close()
+
+	return asyncio.run(run())
+
+
+def test_yescaptcha_stand_in_returns_token():
+	with FakeSolverServer(FakeSolverConfig(median=0.02, sigma=0)) as server:
+		token = _solve(_fast_service('yescaptcha', server.url))
+		assert token.startswith(FAKE_TOKEN_PREFIX)
+		assert server.state.requests == {'/createTask': 1, '/getTaskResult': 1}
+
+
+def test_local_solver_stand_in_reports_captcha_fail():
+	with FakeSolverServer(FakeSolverConfig(median=0.02, sigma=0, fail_rate=1.0)) as server:
+		assert _solve(_fast_service('local_solver', server.url)) is None
+		assert server.state.requests == {'/turnstile': 1, '/result': 1}
+
+
+def test_create_errors_are_injected_for_both_protocols():
+	with FakeSolverServer(FakeSolverConfig(error_rate=1.0)) as server:
+		assert _solve(_fast_service('yescaptcha', server.url)) is None
+		assert _solve(_fast_service('local_solver', server.url)) is None
+		assert server.state.created == 0
+
+
+def test_benchmark_reports_time_to_token_and_request_count():
+	config = FakeSolverConfig(median=0.05, sigma=0, seed=1)
+	result = run_benchmark(backend='local_solver', solves=6, concurrency=6, config=config, deadline=6)
+
+	assert result['succeeded'] == 6
+	assert result['peak_pending_tasks'] == 6
+	# 默认轮询计划：5 秒后第一次查询即拿到结果
+	assert result['requests_per_solve'] == 2.0
+	assert 5.0 <= result['time_to_token']['p50'] < 6.0
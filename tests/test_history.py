@@ -0,0 +1,89 @@
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.history import AccountResult, RunHistory
+from utils.trace import Span
+
+
+def _results(quota_a: float, quota_b: float) -> list[AccountResult]:
+	return [
+		AccountResult(account='anyrouter:1', name='A', provider='anyrouter', ok=True, quota=quota_a, used_quota=1.0),
+		AccountResult(
+			account='anyrouter:2', name='B', provider='anyrouter', ok=False, quota=quota_b, error='HTTP 500',
+			error_class='server_error',
+		),
+	]
+
+
+def test_record_run_and_detect_changed_accounts(tmp_path):
+	history = RunHistory(path=str(tmp_path / 'history.db'))
+	assert history.last_balances() == {}
+
+	spans = [
+		Span(stage='http.sign_in', start=time.time(), duration=0.4, tags={'account': 0, 'provider': 'anyrouter'}),
+		Span(stage='browser.launch', start=time.time(), duration=1.2),
+	]
+	assert history.record_run(time.time(), _results(10.0, 20.0), spans) == 1
+	previous = history.last_balances()
+	assert previous == {'anyrouter:1': 10.0, 'anyrouter:2': 20.0}
+
+	current = _results(12.5, 20.0)
+	changed = history.changed_accounts(previous, current)
+	assert [(r.account, before) for r, before in changed] == [('anyrouter:1', 10.0)]
+
+	history.record_run(time.time(), current)
+	assert history.last_balances()['anyrouter:1'] == 12.5
+
+	with sqlite3.connect(history.path) as conn:
+		rows = conn.execute('SELECT account, stage, tags FROM stage_timings ORDER BY stage').fetchall()
+		classes = conn.execute("SELECT DISTINCT error_class FROM account_results WHERE account = 'anyrouter:2'").fetchall()
+	assert rows == [(None, 'browser.launch', None), ('anyrouter:1', 'http.sign_in', 'provider=anyrouter')]
+	assert classes == [('server_error',)]
+
+	stats = history.stage_stats('http.sign_in', since=time.time() - 60)
+	assert stats['count'] == 1 and stats['max'] == 0.4
+
+
+def test_disabled_history_is_a_no_op():
+	history = RunHistory(path=None)
+	assert history.record_run(time.time(), _results(1.0, 2.0)) is None
+	assert history.last_balances() == {}
+
+
+def test_completed_accounts_are_keyed_by_provider_day(tmp_path):
+	from datetime import datetime, timezone
+
+	from utils.config_v2 import ProviderConfig
+
+	provider = ProviderConfig(name='anyrouter', domain='https://anyrouter.top')
+	# UTC 17:00 在 UTC+8 已是第二天
+	assert provider.checkin_day(datetime(2025, 1, 1, 17, 0, tzinfo=timezone.utc)) == '2025-01-02'
+
+	history = RunHistory(path=str(tmp_path / 'history.db'))
+	results = _results(1.0, 2.0)
+	for r in results:
+		r.day = '2025-01-02'
+	history.record_run(time.time(), results)
+
+	# 只有成功的账号记为已签到，且只对同一天有效
+	assert history.completed({'anyrouter:1': '2025-01-02', 'anyrouter:2': '2025-01-02'}) == {'anyrouter:1'}
+	assert history.completed({'anyrouter:1': '2025-01-03'}) == set()
+
+
+def test_dead_sessions_follow_the_latest_result(tmp_path):
+	history = RunHistory(path=str(tmp_path / 'history.db'))
+	dead = AccountResult(
+		account='anyrouter:1', name='A', provider='anyrouter', ok=False, error_class='auth', session_fp='fp-old',
+	)
+	history.record_run(time.time(), [dead])
+	assert history.dead_sessions() == {'anyrouter:1': 'fp-old'}
+
+	# 更新 cookies 后成功一次，不再视为失效
+	time.sleep(0.01)
+	history.record_run(time.time(), [AccountResult(account='anyrouter:1', name='A', provider='anyrouter', ok=True, session_fp='fp-new')])
+	assert history.dead_sessions() == {}
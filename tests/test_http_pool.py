@@ -0,0 +1,57 @@
+import asyncio
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.http_pool import ClientRegistry
+
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		body = (self.headers.get('cookie') or '').encode()
+		self.send_response(200)
+		self.send_header('Set-Cookie', 'acw_tc=leaked; Path=/')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+@pytest.fixture
+def server_url():
+	server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield f'http://127.0.0.1:{server.server_address[1]}'
+	server.shutdown()
+
+
+def test_registry_reuses_connection_and_does_not_share_cookies(server_url):
+	registry = ClientRegistry()
+
+	async def run():
+		client = registry.get(server_url)
+		assert registry.get(f'{server_url}/other') is client
+		first = await client.get(f'{server_url}/a', headers={'cookie': 'session=one'})
+		second = await client.get(f'{server_url}/b')
+		await registry.close()
+		return first.text, second.text
+
+	first, second = asyncio.run(run())
+
+	assert first == 'session=one'
+	# 上一个响应设置的 cookie 不会被带到下一个请求
+	assert second == ''
+	stats = registry.stats[f'http://127.0.0.1:{server_url.rsplit(":", 1)[1]}']
+	assert stats['requests'] == 2
+	assert stats['connections'] == 1
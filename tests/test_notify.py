@@ -1,9 +1,11 @@
+import asyncio
 import os
 import sys
 from datetime import datetime
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import httpx
 import pytest
 from dotenv import load_dotenv
 
@@ -15,12 +17,34 @@ load_dotenv(project_root / '.env')
 
 from utils.notify import NotificationKit
 
+TEST_ENV = {
+	'EMAIL_USER': 'user@example.com',
+	'EMAIL_PASS': 'password',
+	'EMAIL_TO': 'to@example.com',
+	'PUSHPLUS_TOKEN': 'test_token',
+	'DINGDING_WEBHOOK': 'https://oapi.dingtalk.com/robot/send?access_token=fbcd45f32f17dea5c762e82644c7f28945075e0b4d22953c8eebe064b106a96f',
+	'FEISHU_WEBHOOK': 'https://open.feishu.cn/open-apis/bot/v2/hook/test',
+	'WEIXIN_WEBHOOK': 'http://weixin.example.com',
+	'GOTIFY_URL': 'https://gotify.example.com/message',
+	'GOTIFY_TOKEN': 'test_token',
+	'GOTIFY_PRIORITY': '9',
+}
+
 
 @pytest.fixture
-def notification_kit():
+def notification_kit(monkeypatch):
+	if os.getenv('ENABLE_REAL_TEST') != 'true':
+		for key, value in TEST_ENV.items():
+			monkeypatch.setenv(key, value)
 	return NotificationKit()
 
 
+@pytest.fixture
+def mock_post():
+	with patch('httpx.Client') as mock_client_class:
+		yield mock_client_class.return_value.__enter__.return_value.post
+
+
 def test_real_notification(notification_kit):
 	"""真实接口测试，需要配置.env.local文件"""
 	if os.getenv('ENABLE_REAL_TEST') != 'true':
@@ -40,9 +64,10 @@ def test_send_email(mock_smtp, notification_kit):
 
 	assert mock_server.login.called
 	assert mock_server.send_message.called
+	# 卡住的 SMTP 连接按超时断开，不会拖住进程退出
+	assert mock_smtp.call_args.kwargs['timeout'] == notification_kit.timeout
 
 
-@patch('requests.post')
 def test_send_pushplus(mock_post, notification_kit):
 	notification_kit.send_pushplus('测试标题', '测试内容')
 
@@ -51,7 +76,6 @@ def test_send_pushplus(mock_post, notification_kit):
 	assert 'test_token' in str(args)
 
 
-@patch('requests.post')
 def test_send_dingtalk(mock_post, notification_kit):
 	notification_kit.send_dingtalk('测试标题', '测试内容')
 
@@ -61,7 +85,6 @@ def test_send_dingtalk(mock_post, notification_kit):
 	mock_post.assert_called_once_with(expected_webhook, json=expected_data)
 
 
-@patch('requests.post')
 def test_send_feishu(mock_post, notification_kit):
 	notification_kit.send_feishu('测试标题', '测试内容')
 
@@ -70,7 +93,6 @@ def test_send_feishu(mock_post, notification_kit):
 	assert 'card' in args['json']
 
 
-@patch('requests.post')
 def test_send_wecom(mock_post, notification_kit):
 	notification_kit.send_wecom('测试标题', '测试内容')
 
@@ -92,23 +114,24 @@ def test_send_gotify(mock_client_class, notification_kit):
 	mock_client_instance.post.assert_called_once_with(expected_url, json=expected_data)
 
 
-def test_missing_config():
-	os.environ.clear()
+def test_missing_config(monkeypatch):
+	for key in ('EMAIL_USER', 'EMAIL_PASS', 'EMAIL_TO', 'PUSHPLUS_TOKEN'):
+		monkeypatch.delenv(key, raising=False)
 	kit = NotificationKit()
 
-	with pytest.raises(ValueError, match='未配置邮箱信息'):
+	with pytest.raises(ValueError, match='Email configuration not set'):
 		kit.send_email('测试', '测试')
 
-	with pytest.raises(ValueError, match='未配置PushPlus Token'):
+	with pytest.raises(ValueError, match='PushPlus Token not configured'):
 		kit.send_pushplus('测试', '测试')
 
 
-@patch('anyrouter.notify.NotificationKit.send_email')
-@patch('anyrouter.notify.NotificationKit.send_dingtalk')
-@patch('anyrouter.notify.NotificationKit.send_wecom')
-@patch('anyrouter.notify.NotificationKit.send_pushplus')
-@patch('anyrouter.notify.NotificationKit.send_feishu')
-@patch('anyrouter.notify.NotificationKit.send_gotify')
+@patch('utils.notify.NotificationKit.send_email')
+@patch('utils.notify.NotificationKit.send_dingtalk')
+@patch('utils.notify.NotificationKit.send_wecom')
+@patch('utils.notify.NotificationKit.send_pushplus')
+@patch('utils.notify.NotificationKit.send_feishu')
+@patch('utils.notify.NotificationKit.send_gotify')
 def test_push_message(mock_gotify, mock_feishu, mock_pushplus, mock_wecom, mock_dingtalk, mock_email, notification_kit):
 	notification_kit.push_message('测试标题', '测试内容')
 
@@ -118,3 +141,30 @@ def test_push_message(mock_gotify, mock_feishu, mock_pushplus, mock_wecom, mock_
 	assert mock_pushplus.called
 	assert mock_feishu.called
 	assert mock_gotify.called
+
+
+def test_apush_message_sends_concurrently_with_per_channel_timeout(monkeypatch, capsys):
+	for key in ('EMAIL_USER', 'EMAIL_PASS', 'EMAIL_TO', 'PUSHPLUS_TOKEN', 'SERVERPUSHKEY', 'WEIXIN_WEBHOOK'):
+		monkeypatch.delenv(key, raising=False)
+	monkeypatch.setenv('DINGDING_WEBHOOK', 'https://dingtalk.example.com')
+	monkeypatch.setenv('FEISHU_WEBHOOK', 'https://feishu.example.com')
+	monkeypatch.setenv('NOTIFY_TIMEOUT', '0.2')
+	for key in ('GOTIFY_URL', 'TELEGRAM_BOT_TOKEN', 'BARK_KEY'):
+		monkeypatch.delenv(key, raising=False)
+	kit = NotificationKit()
+	posted = []
+
+	async def fake_post(self, url, json=None):
+		posted.append(url)
+		if 'feishu' in url:
+			await asyncio.sleep(5)
+
+	monkeypatch.setattr(httpx.AsyncClient, 'post', fake_post)
+
+	assert kit.configured_channels() == ['DingTalk', 'Feishu']
+	asyncio.run(kit.apush_message('测试标题', '测试内容'))
+
+	output = capsys.readouterr().out
+	assert sorted(posted) == ['https://dingtalk.example.com', 'https://feishu.example.com']
+	assert '[DingTalk]: Message push successful!' in output
+	assert '[Feishu]: Message push failed! Reason: timed out' in output
@@ -0,0 +1,40 @@
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils import output
+
+
+def test_grouped_output_is_not_interleaved(monkeypatch):
+	stream = io.StringIO()
+	monkeypatch.setattr(sys, 'stdout', stream)
+
+	async def account(name: str, delay: float):
+		for i in range(3):
+			print(f'{name}-{i}')
+			await asyncio.sleep(delay)
+		return name
+
+	async def run():
+		return await asyncio.gather(output.grouped(account('a', 0.01)), output.grouped(account('b', 0.005)))
+
+	assert asyncio.run(run()) == ['a', 'b']
+
+	lines = stream.getvalue().split()
+	assert sorted(lines) == ['a-0', 'a-1', 'a-2', 'b-0', 'b-1', 'b-2']
+	# 每个账号的日志连续成块
+	assert lines in (['a-0', 'a-1', 'a-2', 'b-0', 'b-1', 'b-2'], ['b-0', 'b-1', 'b-2', 'a-0', 'a-1', 'a-2'])
+
+
+def test_output_outside_group_is_written_directly(monkeypatch):
+	stream = io.StringIO()
+	monkeypatch.setattr(sys, 'stdout', stream)
+	output.install()
+
+	print('direct')
+
+	assert stream.getvalue() == 'direct\n'
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.classify import BUSINESS, OK, RATE_LIMIT, SERVER_ERROR, WAF_CHALLENGE, Classification
+from utils.config_v2 import ProviderConfig
+from utils.rate_limit import DomainLimiter, RateLimitConfig
+
+
+def _limiter(**config) -> DomainLimiter:
+	return DomainLimiter('https://a.example', RateLimitConfig(**{'rate': 0, **config}))
+
+
+def test_aimd_grows_additively_and_halves_once_per_round():
+	limiter = _limiter(initial_concurrency=4, max_concurrency=8)
+	sent_at = time.monotonic()
+	for _ in range(4):
+		limiter.record(sent_at, Classification(OK))
+	assert 4.9 < limiter.limit < 5.0
+
+	# 同一轮发出的请求连续 429 只减半一次
+	limiter.record(sent_at, Classification(RATE_LIMIT))
+	limiter.record(sent_at, Classification(RATE_LIMIT))
+	assert 2.4 < limiter.limit < 2.5 and limiter.stats['decreases'] == 1
+
+	limiter.record(time.monotonic(), Classification(SERVER_ERROR, status_code=503))
+	assert 1.2 < limiter.limit < 1.25
+	limiter.record(time.monotonic(), Classification(RATE_LIMIT))
+	assert limiter.limit == 1.0
+
+	# 业务失败也说明站点正常响应
+	limiter.record(time.monotonic(), Classification(BUSINESS))
+	assert limiter.limit == 2.0
+
+
+def test_expected_challenges_do_not_shrink_the_limit():
+	limiter = _limiter(initial_concurrency=4)
+	limiter.record(time.monotonic(), Classification(WAF_CHALLENGE), challenge_expected=True)
+	assert limiter.limit == 4
+	limiter.record(time.monotonic(), Classification(WAF_CHALLENGE))
+	assert limiter.limit == 2
+
+
+def test_concurrency_cap_and_token_bucket():
+	limiter = _limiter(initial_concurrency=2, max_concurrency=2)
+	paced = _limiter(rate=20, burst=1, initial_concurrency=8)
+
+	async def request(limiter):
+		async with limiter.slot():
+			await asyncio.sleep(0.02)
+
+	async def run():
+		await asyncio.gather(*(request(limiter) for _ in range(6)))
+		started = time.monotonic()
+		await asyncio.gather(*(request(paced) for _ in range(5)))
+		return time.monotonic() - started
+
+	elapsed = asyncio.run(run())
+	assert limiter.stats['peak'] == 2 and limiter.stats['requests'] == 6
+	# 20 个/秒、突发 1：5 个请求至少需要 0.2 秒
+	assert elapsed >= 0.19
+
+
+def test_config_from_providers_json():
+	provider = ProviderConfig.from_dict('x', {'domain': 'https://x.example', 'rate_limit': {'rate': 2, 'max_concurrency': 3, 'other': 1}})
+	config = RateLimitConfig.from_dict(provider.rate_limit)
+	assert config.rate == 2 and config.max_concurrency == 3 and config.burst == 10
+	assert RateLimitConfig.from_dict(None) == RateLimitConfig()
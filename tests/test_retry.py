@@ -0,0 +1,89 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.classify import AUTH, NETWORK, OK, RATE_LIMIT, Classification
+from utils.retry import Deadline, RetryEngine, StagePolicy
+
+
+def _run(engine: RetryEngine, results: list[Classification], deadline=None, before_retry=None):
+	calls = []
+
+	async def attempt():
+		calls.append(1)
+		return results[min(len(calls), len(results)) - 1]
+
+	result = asyncio.run(engine.run('stage', attempt, deadline, before_retry))
+	return result, len(calls)
+
+
+def test_budgets_are_per_error_class():
+	engine = RetryEngine(stages={'stage': StagePolicy({NETWORK: 2, RATE_LIMIT: 1}, backoff=0)})
+	network, limited = Classification(NETWORK, 'refused'), Classification(RATE_LIMIT, '429')
+
+	result, calls = _run(engine, [network, network, limited, Classification(OK)])
+	assert result.ok and calls == 4
+
+	result, calls = _run(engine, [network, network, network])
+	assert result.kind == NETWORK and calls == 3
+
+	# 未列出的类别不重试
+	result, calls = _run(engine, [Classification(AUTH, '401')])
+	assert result.kind == AUTH and calls == 1
+
+
+def test_backoff_is_exponential_capped_and_jittered():
+	engine = RetryEngine(stages={}, jitter=0.5)
+	policy = StagePolicy({NETWORK: 5}, backoff=2.0, max_backoff=5.0)
+	network = Classification(NETWORK)
+
+	for _ in range(50):
+		assert 1.0 <= engine.delay(policy, network, 0) <= 2.0
+		assert 2.0 <= engine.delay(policy, network, 1) <= 4.0
+		assert 2.5 <= engine.delay(policy, network, 3) <= 5.0
+	assert engine.delay(policy, Classification(RATE_LIMIT, retry_after=3), 0) == 3
+
+
+def test_deadline_stops_retries():
+	engine = RetryEngine(stages={'stage': StagePolicy({NETWORK: 3}, backoff=10)})
+	started = time.monotonic()
+	result, calls = _run(engine, [Classification(NETWORK)], deadline=Deadline(1.0))
+	assert calls == 1 and time.monotonic() - started < 1.0
+	assert Deadline(None).allows(1e9)
+
+
+def test_before_retry_can_veto():
+	engine = RetryEngine(stages={'stage': StagePolicy({NETWORK: 3}, backoff=0)})
+	seen = []
+
+	async def before_retry(result):
+		seen.append(result.kind)
+		return len(seen) < 2
+
+	result, calls = _run(engine, [Classification(NETWORK)], before_retry=before_retry)
+	assert calls == 2 and seen == [NETWORK, NETWORK]
+
+
+def test_deadline_bounds_attempts_and_before_retry():
+	engine = RetryEngine(stages={'stage': StagePolicy({NETWORK: 3}, backoff=0)})
+
+	async def slow_attempt():
+		await asyncio.sleep(10)
+		return Classification(OK)
+
+	started = time.monotonic()
+	result = asyncio.run(engine.run('stage', slow_attempt, Deadline(0.2)))
+	assert result.kind == NETWORK and time.monotonic() - started < 1.0
+
+	async def slow_refresh(result):
+		# 例如换新 token 时求解迟迟不返回
+		await asyncio.sleep(10)
+		return True
+
+	started = time.monotonic()
+	result, calls = _run(engine, [Classification(NETWORK, 'refused')], Deadline(0.2), slow_refresh)
+	assert result.message == 'refused' and calls == 1 and time.monotonic() - started < 1.0
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.history import AccountResult
+from utils.shard import load_partials, parse_shard, shard_of, write_partial
+from utils.trace import Span
+
+
+def test_parse_shard():
+	assert parse_shard('2/3') == (2, 3)
+	for text in ('0/3', '4/3', '1/0', 'x', '1-2'):
+		with pytest.raises(ValueError):
+			parse_shard(text)
+
+
+def test_hash_partition_is_stable_and_complete():
+	keys = [f'anyrouter:{i}' for i in range(200)]
+	shards = [shard_of(key, 4) for key in keys]
+	assert shards == [shard_of(key, 4) for key in keys]
+	assert set(shards) == {1, 2, 3, 4}
+	# 增加账号不影响已有账号的分片
+	assert [shard_of(key, 4) for key in keys[:100]] == shards[:100]
+
+
+def test_partials_merge_in_original_order(tmp_path, capsys):
+	def result(i):
+		return AccountResult(account=f'p:{i}', name=f'Account {i + 1}', provider='p', ok=i != 2, quota=float(i))
+
+	span = Span(stage='http.sign_in', start=1.0, duration=0.1, tags={'account': 1, 'provider': 'p'})
+	write_partial(str(tmp_path / 'b.json'), (2, 3), 20.0, [(1, result(1), 'B'), (3, result(3), 'D')], [span])
+	write_partial(str(tmp_path / 'a.json'), (1, 3), 10.0, [(0, result(0), 'A'), (2, result(2), 'C')], [])
+
+	started_at, results, notify_list, spans, errors = load_partials([str(tmp_path / 'b.json'), str(tmp_path / 'a.json')])
+	assert started_at == 10.0
+	assert [r.account for r in results] == ['p:0', 'p:1', 'p:2', 'p:3']
+	assert notify_list == ['A', 'B', 'C', 'D']
+	assert not results[2].ok and results[3].quota == 3.0
+	# 分片内序号 1 对应该分片的第二个账号
+	assert spans[0].tags == {'account': 'p:3', 'provider': 'p'}
+	assert '缺少分片: 3/3' in capsys.readouterr().out
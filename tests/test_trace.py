@@ -0,0 +1,64 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.trace import Tracer, percentile
+
+
+def test_percentile_nearest_rank():
+	values = [float(i) for i in range(1, 21)]
+	assert percentile(values, 0.5) == 10.0
+	assert percentile(values, 0.95) == 19.0
+	assert percentile([], 0.5) == 0.0
+
+
+def test_spans_carry_account_tags_across_tasks():
+	tracer = Tracer()
+
+	async def account(i: int):
+		with tracer.tagged(account=i, provider='anyrouter'), tracer.span('account'):
+			await asyncio.sleep(0.01 * (3 - i))
+			with tracer.span('solver.solve', backend='yescaptcha') as tags:
+				tags['won'] = i == 1
+
+	async def main():
+		await asyncio.gather(*(account(i) for i in range(3)))
+
+	asyncio.run(main())
+
+	assert len(tracer.spans) == 6
+	solve = tracer.spans_for(account=1)
+	assert {s.stage for s in solve} == {'account', 'solver.solve'}
+	won = [s for s in tracer.spans if s.tags.get('won')]
+	assert len(won) == 1 and won[0].tags == {'account': 1, 'provider': 'anyrouter', 'backend': 'yescaptcha', 'won': True}
+	assert tracer.summary()['account']['count'] == 3
+
+
+def test_failed_span_is_recorded_and_written(tmp_path):
+	tracer = Tracer(path=str(tmp_path / 'profile.jsonl'))
+	with pytest.raises(ValueError):
+		with tracer.span('http.sign_in'):
+			raise ValueError('boom')
+	with tracer.span('http.sign_in'):
+		pass
+
+	summary = tracer.summary()['http.sign_in']
+	assert summary['count'] == 2 and summary['errors'] == 1
+
+	tracer.write()
+	lines = (tmp_path / 'profile.jsonl').read_text(encoding='utf-8').splitlines()
+	records = [json.loads(line) for line in lines]
+	assert [r['ok'] for r in records] == [False, True]
+	assert records[0]['error'] == 'ValueError'
+
+	tracer.path = str(tmp_path / 'profile.json')
+	tracer.write()
+	data = json.loads((tmp_path / 'profile.json').read_text(encoding='utf-8'))
+	assert data['summary']['http.sign_in']['count'] == 2
+	assert len(data['spans']) == 2
@@ -0,0 +1,225 @@
+import asyncio
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.solve_history import SolveTimeHistory
+from utils.turnstile import TurnstileService
+
+
+def make_service(monkeypatch, limit=2):
+	monkeypatch.setenv('YESCAPTCHA_KEY', 'test_key')
+	monkeypatch.setenv('TURNSTILE_PREFETCH_LIMIT', str(limit))
+	return TurnstileService()
+
+
+def test_prefetch_pool_serves_tokens_and_respects_limit(monkeypatch):
+	service = make_service(monkeypatch, limit=2)
+	active, peak, counter = 0, 0, 0
+
+	async def fake_solve(siteurl, sitekey, account_name=''):
+		nonlocal active, peak, counter
+		active += 1
+		peak = max(peak, active)
+		await asyncio.sleep(0.01)
+		active -= 1
+		counter += 1
+		return f'token-{counter}'
+
+	service._solve_direct = fake_solve
+
+	async def run():
+		service.expect('https://anyrouter.top', 5)
+		tokens = await asyncio.gather(
+			*(service.solve_turnstile('https://anyrouter.top', '0x4AAA', f'acc{i}') for i in range(5))
+		)
+		await service.close()
+		return tokens
+
+	tokens = asyncio.run(run())
+
+	assert len(set(tokens)) == 5
+	assert peak <= 2
+	# 不会为登记数量之外的账号求解
+	assert counter == 5
+
+
+def test_accounts_that_end_without_a_token_release_their_demand(monkeypatch):
+	service = make_service(monkeypatch, limit=2)
+	solved = 0
+
+	async def fake_solve(siteurl, sitekey, account_name=''):
+		nonlocal solved
+		await asyncio.sleep(0.01)
+		solved += 1
+		return f'token-{solved}'
+
+	service._solve_direct = fake_solve
+
+	async def account(needs_token: bool):
+		with service.claim('https://anyrouter.top'):
+			await asyncio.sleep(0)
+			if needs_token:
+				# 同一账号换新 token 重试也只扣减一次需求
+				await service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')
+				await service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')
+
+	async def run():
+		service.expect('https://anyrouter.top', 6)
+		await asyncio.gather(account(True), *(account(False) for _ in range(5)))
+		await asyncio.sleep(0.05)
+		demand = dict(service._demand)
+		await service.close()
+		return demand
+
+	# 5 个账号没用到 token（无 token 签到成功、熔断跳过等），预取不再为它们求解
+	assert asyncio.run(run()) == {'https://anyrouter.top': 0}
+	assert solved <= 3
+
+
+def test_expired_prefetched_tokens_are_discarded(monkeypatch):
+	service = make_service(monkeypatch)
+	service.token_max_age = 0
+
+	async def fake_solve(siteurl, sitekey, account_name=''):
+		return 'direct' if account_name == 'acc' else 'stale'
+
+	service._solve_direct = fake_solve
+
+	async def run():
+		service.expect('https://anyrouter.top', 1)
+		return await service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')
+
+	assert asyncio.run(run()) == 'direct'
+
+
+def test_prefetch_disabled_solves_directly(monkeypatch):
+	service = make_service(monkeypatch, limit=0)
+
+	async def fake_solve(siteurl, sitekey, account_name=''):
+		return 'direct'
+
+	service._solve_direct = fake_solve
+
+	assert asyncio.run(service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')) == 'direct'
+
+
+def test_hedged_solve_first_token_wins_and_loser_is_cancelled(monkeypatch):
+	monkeypatch.setenv('TURNSTILE_HEDGE_DELAY', '0.01')
+	service = make_service(monkeypatch, limit=0)
+	cancelled = []
+
+	async def slow_primary(siteurl, sitekey, account_name):
+		try:
+			await asyncio.sleep(5)
+		except asyncio.CancelledError:
+			cancelled.append('primary')
+			raise
+		return 'slow'
+
+	async def fast_hedge(siteurl, sitekey, account_name):
+		await asyncio.sleep(0.01)
+		return 'fast'
+
+	service.backends['yescaptcha'] = slow_primary
+	service.register_backend('browser', fast_hedge)
+
+	assert asyncio.run(service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')) == 'fast'
+	assert cancelled == ['primary']
+	assert service.stats['browser']['wins'] == 1
+	assert service.stats['yescaptcha']['cancelled'] == 1
+
+
+def test_hedge_prefers_the_other_solver_over_the_browser(monkeypatch):
+	service = make_service(monkeypatch)
+	service.hedge_delay = 1
+	service.method = 'yescaptcha'
+	# main() 注册浏览器方式时求解方式还没确定，浏览器排在最前
+	service.register_backend('browser', None)
+	service.backends['yescaptcha'] = service._solve_with_yescaptcha
+	assert service._pick_hedge_backend() == 'browser'
+
+	service.backends['local_solver'] = service._solve_with_local_solver
+	assert service._pick_hedge_backend() == 'local_solver'
+
+
+def test_hedge_not_started_when_primary_is_fast(monkeypatch):
+	monkeypatch.setenv('TURNSTILE_HEDGE_DELAY', '1')
+	service = make_service(monkeypatch, limit=0)
+
+	async def primary(siteurl, sitekey, account_name):
+		return 'primary'
+
+	async def hedge(siteurl, sitekey, account_name):
+		raise AssertionError('hedge should not run')
+
+	service.backends['yescaptcha'] = primary
+	service.register_backend('browser', hedge)
+
+	assert asyncio.run(service.solve_turnstile('https://anyrouter.top', '0x4AAA', 'acc')) == 'primary'
+	assert 'browser' not in service.stats
+
+
+def test_poll_schedule_follows_learned_distribution():
+	history = SolveTimeHistory(deadline=30)
+	for seconds in (6, 7, 7, 8, 8, 9, 10, 12):
+		history.record('yescaptcha', seconds, seconds)
+
+	points = history.schedule('yescaptcha')
+
+	assert points[0] == 8
+	assert points == sorted(points)
+	assert points[-1] <= 30
+	# 比固定 5s + 2s 间隔的计划轮询次数更少
+	assert len(points) < len(SolveTimeHistory(deadline=30).schedule('yescaptcha'))
+
+
+def test_schedule_learns_ready_times_earlier_than_first_poll():
+	history = SolveTimeHistory(deadline=30)
+	ready_times = [5.1 + 0.5 * (i % 6) / 5 for i in range(60)]
+
+	def time_to_token(ready):
+		pending = 0.0
+		for point in history.schedule('yescaptcha'):
+			if point >= ready:
+				history.record('yescaptcha', point, pending)
+				return point
+			pending = point
+
+	waits = [time_to_token(ready) for ready in ready_times]
+
+	# 默认计划在 7s 才拿到 5.1~5.6s 就绪的 token，学习后轮询点提前
+	assert waits[0] == 7.0
+	assert sum(waits[-20:]) / 20 < 6.2
+	assert history.schedule('yescaptcha')[0] < 6
+
+
+def test_default_schedule_without_history():
+	points = SolveTimeHistory(deadline=65).schedule('local_solver')
+
+	assert points[:3] == [5.0, 7.0, 9.0]
+	assert len(points) == 31
+
+
+def test_method_is_resolved_lazily_and_health_probe_is_cached(monkeypatch):
+	monkeypatch.delenv('YESCAPTCHA_KEY', raising=False)
+	monkeypatch.delenv('TURNSTILE_HEDGE_DELAY', raising=False)
+	probes = []
+
+	async def fake_probe(self):
+		probes.append(1)
+		return False
+
+	service = TurnstileService()
+	assert service.get_method() is None
+
+	async def run():
+		monkeypatch.setattr(TurnstileService, 'check_solver_available', fake_probe)
+		first = await service.resolve_method()
+		second = await service.resolve_method()
+		return first, second
+
+	assert asyncio.run(run()) == ('browser', 'browser')
+	assert probes == [1]
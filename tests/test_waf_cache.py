@@ -0,0 +1,73 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.waf_cache import WafCookieCache, WafHarvest, looks_like_waf_challenge
+
+
+def test_concurrent_requests_share_one_harvest():
+	cache = WafCookieCache()
+	calls = []
+
+	async def harvest():
+		calls.append(1)
+		await asyncio.sleep(0.01)
+		return WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'abc', 'expires': -1}], sitekey='0x4AAA')
+
+	async def run():
+		return await asyncio.gather(*(cache.get_or_harvest('https://anyrouter.top', harvest) for _ in range(10)))
+
+	entries = asyncio.run(run())
+
+	assert len(calls) == 1
+	assert all(e.cookies == {'acw_tc': 'abc'} and e.sitekey == '0x4AAA' for e in entries)
+	assert cache.stats['hits'] == 9
+
+
+def test_entry_expires_with_earliest_cookie():
+	cache = WafCookieCache(max_ttl=1800)
+	entry = cache.put(
+		'https://anyrouter.top',
+		WafHarvest(cookies=[{'name': 'a', 'value': '1', 'expires': time.time() - 1}, {'name': 'b', 'value': '2'}]),
+	)
+
+	assert entry.is_expired()
+	assert cache.get('https://anyrouter.top') is None
+
+
+def test_cookie_refresh_keeps_known_sitekey():
+	cache = WafCookieCache()
+	cache.put('https://anyrouter.top', WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'old'}], sitekey='0x4AAA'))
+	entry = cache.put('https://anyrouter.top', WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'new'}]))
+
+	assert entry.cookies == {'acw_tc': 'new'} and entry.sitekey == '0x4AAA'
+
+
+def test_failed_probe_triggers_new_harvest(tmp_path):
+	path = tmp_path / 'waf.json'
+	cache = WafCookieCache(path=str(path))
+	cache.put('https://anyrouter.top', WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'old'}]))
+	cache.save()
+
+	reloaded = WafCookieCache(path=str(path))
+	reloaded.load()
+
+	async def harvest():
+		return WafHarvest(cookies=[{'name': 'acw_tc', 'value': 'new'}])
+
+	async def probe(entry):
+		return False
+
+	entry = asyncio.run(reloaded.get_or_harvest('https://anyrouter.top', harvest, probe))
+
+	assert entry.cookies == {'acw_tc': 'new'}
+	assert reloaded.stats['probe_failures'] == 1
+
+
+def test_looks_like_waf_challenge():
+	assert looks_like_waf_challenge(200, 'text/html', '<html><script>var arg1="abc";</script></html>')
+	assert not looks_like_waf_challenge(401, 'application/json', '{"success": false}')
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import queue
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.workers import JobError, WorkerPool, serve
+
+
+def _crash(marker: str, once: bool):
+	"""进程直接退出，模拟浏览器把 worker 拖垮（once 时只在第一次调用时退出）"""
+	if once and os.path.exists(marker):
+		return
+	open(marker, 'w').close()
+	os._exit(1)
+
+
+def _square_worker(worker_id, inbox, outbox, marker_dir, concurrency):
+	async def handle(payload):
+		if payload in ('crash', 'crash-once'):
+			_crash(os.path.join(marker_dir, 'crashed'), once=payload == 'crash-once')
+		if payload == 'slow':
+			await asyncio.sleep(0.2)
+			return 'slow', worker_id
+		if payload == 'crash-once':
+			return 'recovered', worker_id
+		if payload == 'raise':
+			raise RuntimeError('boom')
+		return payload * payload, worker_id
+
+	asyncio.run(serve(worker_id, inbox, outbox, handle, concurrency))
+
+
+def _pool(tmp_path, size: int, concurrency: int = 1, **kwargs) -> WorkerPool:
+	return WorkerPool(size, _square_worker, args=(str(tmp_path), concurrency), concurrency=concurrency, **kwargs)
+
+
+def test_pool_runs_jobs_across_workers(tmp_path):
+	pool = _pool(tmp_path, 2, concurrency=2)
+	done = asyncio.run(pool.run({i: i for i in range(10)}))
+
+	assert {key: value for key, (value, _) in done.items()} == {i: i * i for i in range(10)}
+	assert pool.stats == {'started': 2, 'restarts': 0, 'crashed_jobs': 0}
+
+
+def test_crashed_worker_is_restarted_and_its_job_retried(tmp_path):
+	pool = _pool(tmp_path, 2)
+	done = asyncio.run(pool.run({'a': 3, 'b': 'crash-once', 'c': 4, 'd': 'raise'}))
+
+	assert done['a'][0] == 9 and done['c'][0] == 16
+	assert done['b'][0] == 'recovered'
+	# 任务自身抛出异常不会拖垮 worker，结果与崩溃区分开
+	assert done['d'] == JobError('RuntimeError: boom')
+	assert pool.stats == {'started': 3, 'restarts': 1, 'crashed_jobs': 0}
+
+
+def test_job_that_always_crashes_is_given_up(tmp_path):
+	pool = _pool(tmp_path, 1, max_attempts=2)
+	done = asyncio.run(pool.run({'ok': 2, 'bad': 'crash'}))
+
+	assert done == {'ok': (4, 0), 'bad': None}
+	assert pool.stats == {'started': 3, 'restarts': 2, 'crashed_jobs': 1}
+
+
+
+def test_crash_is_noticed_while_other_workers_keep_returning(tmp_path):
+	pool = _pool(tmp_path, 2)
+	done = asyncio.run(pool.run({'b': 'crash-once', **{i: 'slow' for i in range(12)}}))
+
+	assert done['b'][0] == 'recovered'
+	# 不必等另一个 worker 空闲下来，崩溃的任务重新分配后优先执行
+	assert list(done).index('b') < len(done) - 1
+
+
+def test_idle_consumers_do_not_block_the_default_executor():
+	inbox, outbox = queue.Queue(), queue.Queue()
+	resolved = asyncio.Event()
+
+	async def handle(payload):
+		# httpx 建立新连接时在默认线程池中解析域名
+		await asyncio.get_running_loop().getaddrinfo('localhost', 80)
+		resolved.set()
+		return payload
+
+	async def run():
+		# consumer 数多于默认线程池的线程数（最多 32）
+		task = asyncio.create_task(serve(0, inbox, outbox, handle, concurrency=40))
+		inbox.put(('a', 1))
+		await asyncio.wait_for(resolved.wait(), 5)
+		inbox.put(None)
+		await asyncio.wait_for(task, 5)
+		return outbox.get_nowait()
+
+	assert asyncio.run(run()) == (0, 'a', 1)
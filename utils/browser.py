@@ -0,0 +1,277 @@
+"""
+共享浏览器管理
+整个运行期间只启动一个 Chromium 进程（首次需要时才启动），
+每个账号从中创建独立的 browser context，用完即关闭，不落盘。
+Playwright 也只在第一次需要浏览器时才导入。
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from utils.trace import tracer
+
+LAUNCH_ARGS = ['--disable-blink-features=AutomationControlled', '--no-sandbox']
+
+# 在页面脚本执行前注入：包装 turnstile.render 的 callback，token 一生成就推送给 Python
+TOKEN_HOOK_SCRIPT = """
+(() => {
+	const report = (token) => {
+		try {
+			if (token && window.__checkinReportToken) window.__checkinReportToken(token);
+		} catch (e) {}
+	};
+	const wrap = (ts) => {
+		if (!ts || ts.__checkinWrapped || typeof ts.render !== 'function') return ts;
+		const render = ts.render;
+		ts.render = function (container, params) {
+			if (params && typeof params === 'object') {
+				const callback = params.callback;
+				params.callback = function (token) {
+					report(token);
+					if (typeof callback === 'function') return callback.apply(this, arguments);
+				};
+			}
+			return render.apply(this, arguments);
+		};
+		ts.__checkinWrapped = true;
+		return ts;
+	};
+	let current = wrap(window.turnstile);
+	try {
+		Object.defineProperty(window, 'turnstile', {
+			configurable: true,
+			get() { return current; },
+			set(value) { current = wrap(value); },
+		});
+	} catch (e) {}
+})();
+"""
+
+# 采集页面默认拦截的资源类型；Turnstile 所在的域名始终放行
+DEFAULT_BLOCKED_TYPES = ('image', 'font', 'stylesheet', 'media')
+ALWAYS_ALLOWED_HOSTS = ('challenges.cloudflare.com',)
+
+
+def _host_matches(host: str, patterns) -> bool:
+	return any(host == p or host.endswith('.' + p) for p in patterns)
+
+
+@dataclass
+class ResourceRules:
+	"""采集页面的请求拦截规则"""
+
+	origin_host: str
+	block_types: tuple[str, ...] = DEFAULT_BLOCKED_TYPES
+	allow_hosts: tuple[str, ...] = ()
+	block_hosts: tuple[str, ...] = ()
+	block_third_party: bool = True
+
+	@classmethod
+	def for_provider(cls, provider_config) -> 'ResourceRules | None':
+		"""
+		根据 provider 配置生成规则
+
+		支持的 provider 字段: block_resource_types / allow_hosts / block_hosts / block_third_party；
+		环境变量 BROWSER_BLOCK_RESOURCES=false 时全局关闭拦截。
+		"""
+		if os.getenv('BROWSER_BLOCK_RESOURCES', 'true').lower() in ('false', '0', 'no'):
+			return None
+		block_types = provider_config.block_resource_types
+		return cls(
+			origin_host=urlsplit(provider_config.domain).hostname or '',
+			block_types=tuple(DEFAULT_BLOCKED_TYPES if block_types is None else block_types),
+			allow_hosts=tuple(provider_config.allow_hosts or ()),
+			block_hosts=tuple(provider_config.block_hosts or ()),
+			block_third_party=provider_config.block_third_party,
+		)
+
+	def should_block(self, url: str, resource_type: str) -> bool:
+		host = urlsplit(url).hostname or ''
+		if not host or _host_matches(host, ALWAYS_ALLOWED_HOSTS):
+			return False
+		if _host_matches(host, self.block_hosts):
+			return True
+		if resource_type in self.block_types:
+			return True
+		if _host_matches(host, (self.origin_host,)) or _host_matches(host, self.allow_hosts):
+			return False
+		return self.block_third_party
+
+
+@dataclass
+class ResourceStats:
+	"""本次运行的请求拦截统计"""
+
+	allowed: int = 0
+	allowed_bytes: int = 0
+	blocked: dict[str, int] = field(default_factory=dict)
+
+	def report(self):
+		blocked = sum(self.blocked.values())
+		if not blocked and not self.allowed:
+			return
+		detail = ', '.join(f'{t} {n}' for t, n in sorted(self.blocked.items(), key=lambda x: -x[1]))
+		print(
+			f'[Browser] 资源拦截: 放行 {self.allowed} 个请求 ({self.allowed_bytes / 1024:.0f} KB), '
+			f'拦截 {blocked} 个请求{f" ({detail})" if detail else ""}'
+		)
+
+
+class PageSignals:
+	"""
+	把页面事件（响应、导航、加载、Turnstile 回调）汇总为可等待的信号
+
+	用 wait_until() 代替固定 sleep：每当页面有动静时重新检查条件，
+	条件满足立即返回，超时时间只作为上限。
+	"""
+
+	def __init__(self, page):
+		self.page = page
+		self.token: str | None = None
+		self._changed = asyncio.Event()
+		for event in ('response', 'framenavigated', 'domcontentloaded', 'load'):
+			page.on(event, self._notify)
+
+	def _notify(self, *args):
+		self._changed.set()
+
+	def _on_token(self, token: str):
+		self.token = token
+		self._changed.set()
+
+	async def install(self):
+		"""安装 token 回调钩子（需在 goto 之前调用）"""
+		await self.page.expose_function('__checkinReportToken', self._on_token)
+		await self.page.add_init_script(TOKEN_HOOK_SCRIPT)
+
+	async def wait_until(self, check, timeout: float, tick: float = 0.25):
+		"""
+		等待 check() 返回真值
+
+		Args:
+			check: async () -> 结果，页面每次变化（以及每隔 tick 秒兜底）时调用
+			timeout: 最长等待秒数
+
+		Returns:
+			check() 的第一个真值，超时返回 None
+		"""
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + timeout
+		while True:
+			self._changed.clear()
+			try:
+				result = await check()
+			except Exception:
+				# 页面导航期间执行上下文会被销毁，等下一次信号再试
+				result = None
+			if result:
+				return result
+
+			remaining = deadline - loop.time()
+			if remaining <= 0:
+				return None
+			try:
+				await asyncio.wait_for(self._changed.wait(), timeout=min(tick, remaining))
+			except asyncio.TimeoutError:
+				pass
+
+
+class BrowserManager:
+	"""单浏览器实例 + 每账号轻量 context"""
+
+	def __init__(self, headless: bool = True):
+		self.headless = headless
+		self._playwright = None
+		self._browser = None
+		self._lock: asyncio.Lock | None = None
+		self._loop: asyncio.AbstractEventLoop | None = None
+		self.launch_seconds: float | None = None
+		self.resource_stats = ResourceStats()
+
+	def _get_lock(self) -> asyncio.Lock:
+		# 锁与浏览器都绑定在创建它们的事件循环上，换了循环就重新开始
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self._loop = loop
+			self._lock = asyncio.Lock()
+			self._playwright = None
+			self._browser = None
+		return self._lock
+
+	async def get_browser(self):
+		"""获取共享浏览器，首次调用时启动"""
+		async with self._get_lock():
+			if self._browser is None or not self._browser.is_connected():
+				print('[Browser] 启动共享浏览器...')
+				start = time.perf_counter()
+				with tracer.span('browser.launch'):
+					if self._playwright is None:
+						from playwright.async_api import async_playwright
+
+						self._playwright = await async_playwright().start()
+					self._browser = await self._playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+				self.launch_seconds = time.perf_counter() - start
+				print(f'[Browser] 浏览器启动耗时 {self.launch_seconds:.2f}s')
+			return self._browser
+
+	@asynccontextmanager
+	async def new_context(self, rules: ResourceRules | None = None, **kwargs):
+		"""创建一个隔离的 browser context，退出时自动关闭；给定 rules 时按规则拦截请求"""
+		browser = await self.get_browser()
+		context = await browser.new_context(**kwargs)
+		if rules:
+			await self._install_rules(context, rules)
+		try:
+			yield context
+		finally:
+			try:
+				await context.close()
+			except Exception:
+				pass
+
+	async def _install_rules(self, context, rules: ResourceRules):
+		stats = self.resource_stats
+
+		async def handle(route):
+			request = route.request
+			if rules.should_block(request.url, request.resource_type):
+				stats.blocked[request.resource_type] = stats.blocked.get(request.resource_type, 0) + 1
+				await route.abort()
+			else:
+				stats.allowed += 1
+				await route.continue_()
+
+		def on_response(response):
+			try:
+				stats.allowed_bytes += int(response.headers.get('content-length') or 0)
+			except ValueError:
+				pass
+
+		await context.route('**/*', handle)
+		context.on('response', on_response)
+
+	async def close(self):
+		"""关闭浏览器与 Playwright 驱动（运行结束时调用一次）"""
+		if self._loop is not asyncio.get_running_loop():
+			return
+		async with self._get_lock():
+			if self._browser is not None:
+				try:
+					await self._browser.close()
+				except Exception:
+					pass
+				self._browser = None
+			if self._playwright is not None:
+				try:
+					await self._playwright.stop()
+				except Exception:
+					pass
+				self._playwright = None
+
+
+# 全局实例
+browser_manager = BrowserManager()
@@ -0,0 +1,103 @@
+"""
+站点熔断
+
+某个站点宕机或全面拦截时，后续账号不再逐个经历浏览器启动、页面超时与求解才失败：
+- 同一域名连续 threshold 个账号以超时 / 5xx / WAF 拦截失败后熔断（其他站点不受影响）
+- 熔断期间该域名剩余的账号推迟到其他账号之后处理
+- 距熔断 probe_interval 秒后放行一个账号作为半开探测：成功则恢复，失败则剩余账号直接跳过
+"""
+
+import os
+import time
+from dataclasses import dataclass
+
+from utils.classify import NETWORK, SERVER_ERROR, WAF_CHALLENGE
+
+# 说明站点本身不可用的错误类别（auth / business 等说明站点仍在正常响应）
+TRIPPING = (NETWORK, SERVER_ERROR, WAF_CHALLENGE)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+@dataclass
+class CircuitBreaker:
+	"""单个域名的熔断器"""
+
+	domain: str
+	threshold: int
+	probe_interval: float
+	state: str = CLOSED
+	failures: int = 0
+	opened_at: float = 0.0
+	rejected: int = 0
+	trips: int = 0
+
+	def allow(self) -> bool:
+		"""是否放行一个账号；熔断期间到达探测时间时放行一个作为半开探测"""
+		if self.state == CLOSED:
+			return True
+		if self.state == OPEN and self.probe_wait() <= 0:
+			self.state = HALF_OPEN
+			print(f'[CIRCUIT] {self.domain}: 半开探测')
+			return True
+		return False
+
+	def probe_wait(self) -> float:
+		"""距离下一次半开探测的秒数"""
+		return max(0.0, self.opened_at + self.probe_interval - time.monotonic())
+
+	def record(self, kind: str | None):
+		"""记录一个账号的结果（错误类别，成功时为 None 或 ok）"""
+		if kind in TRIPPING:
+			self.failures += 1
+			if self.state == HALF_OPEN or (self.state == CLOSED and self.threshold and self.failures >= self.threshold):
+				self._open()
+		else:
+			if self.state != CLOSED:
+				print(f'[CIRCUIT] {self.domain}: 探测成功，恢复请求')
+			self.state = CLOSED
+			self.failures = 0
+
+	def _open(self):
+		self.state = OPEN
+		self.opened_at = time.monotonic()
+		self.trips += 1
+		print(f'[CIRCUIT] {self.domain}: 连续 {self.failures} 个账号失败，熔断 {self.probe_interval:.0f}s')
+
+
+class CircuitBreakers:
+	"""按域名管理熔断器"""
+
+	def __init__(self, threshold: int = 3, probe_interval: float = 30.0):
+		self.threshold = threshold
+		self.probe_interval = probe_interval
+		self.breakers: dict[str, CircuitBreaker] = {}
+
+	@classmethod
+	def from_env(cls) -> 'CircuitBreakers':
+		"""从环境变量创建（CIRCUIT_FAILURE_THRESHOLD 为 0 时关闭熔断）"""
+		return cls(
+			threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3')),
+			probe_interval=float(os.getenv('CIRCUIT_PROBE_INTERVAL', '30')),
+		)
+
+	def get(self, domain: str) -> CircuitBreaker:
+		if domain not in self.breakers:
+			self.breakers[domain] = CircuitBreaker(domain, self.threshold, self.probe_interval)
+		return self.breakers[domain]
+
+	def reset(self):
+		self.breakers.clear()
+
+	def report(self):
+		"""输出熔断过的域名与被跳过的账号数"""
+		for breaker in self.breakers.values():
+			if breaker.trips:
+				state = '已恢复' if breaker.state == CLOSED else '仍熔断'
+				print(f'[CIRCUIT] {breaker.domain}: 熔断 {breaker.trips} 次，跳过 {breaker.rejected} 个账号 ({state})')
+
+
+# 全局实例
+circuit_breakers = CircuitBreakers.from_env()
@@ -0,0 +1,141 @@
+"""
+响应分类
+
+根据状态码、响应体形态与 message 字段，把 new-api 接口的响应分为：
+- ok: 成功
+- waf_challenge: WAF 挑战页（需要升级到 WAF cookies / 浏览器）
+- auth: session 过期或无效（重试与采集都无济于事，立即失败）
+- rate_limit: 请求过于频繁
+- server_error: 5xx 或无法解析的响应
+- network: 连接失败、超时等网络异常
+- business: 接口正常返回但业务失败（例如签到被拒）
+- circuit_open: 站点熔断中，未发送请求（utils.circuit）
+
+每个类别有各自的通知措辞，各阶段按类别决定是否重试（utils.retry）。
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+import httpx
+
+from utils.waf_cache import looks_like_waf_challenge
+
+OK = 'ok'
+WAF_CHALLENGE = 'waf_challenge'
+AUTH = 'auth'
+RATE_LIMIT = 'rate_limit'
+SERVER_ERROR = 'server_error'
+NETWORK = 'network'
+BUSINESS = 'business'
+CIRCUIT_OPEN = 'circuit_open'
+
+AUTH_MARKERS = (
+	'未登录',
+	'登录已过期',
+	'重新登录',
+	'access token',
+	'New-Api-User',
+	'用户已被封禁',
+	'unauthorized',
+	'Unauthorized',
+)
+RATE_LIMIT_MARKERS = ('请求过于频繁', '频繁', 'too many requests', 'Too Many Requests', 'rate limit')
+
+
+@dataclass
+class Classification:
+	"""一次响应（或异常）的分类结果"""
+
+	kind: str
+	message: str = ''
+	status_code: int | None = None
+	retry_after: float | None = None
+	data: dict | None = None
+
+	@property
+	def ok(self) -> bool:
+		return self.kind == OK
+
+
+# 通知中对各类错误的说明（重试策略见 utils.retry）
+WORDING = {
+	WAF_CHALLENGE: '被 WAF 拦截，绕过失败',
+	AUTH: '登录已失效，请更新该账号的 cookies',
+	RATE_LIMIT: '请求过于频繁，已被站点限流',
+	SERVER_ERROR: '站点服务异常，请稍后重试',
+	NETWORK: '网络异常，无法连接站点',
+	BUSINESS: '签到失败',
+	CIRCUIT_OPEN: '已跳过: 站点连续失败，熔断中',
+}
+
+
+def _retry_after(headers) -> float | None:
+	value = headers.get('retry-after') if headers else None
+	try:
+		return float(value) if value else None
+	except ValueError:
+		return None
+
+
+def classify(status_code: int, headers, body: str) -> Classification:
+	"""
+	分类一个本应返回 JSON 的接口响应
+
+	Args:
+		status_code: HTTP 状态码
+		headers: 响应头（支持 .get）
+		body: 响应文本
+	"""
+	content_type = (headers.get('content-type', '') if headers else '') or ''
+	if looks_like_waf_challenge(status_code, content_type, body):
+		return Classification(WAF_CHALLENGE, 'WAF challenge', status_code)
+
+	data = None
+	try:
+		parsed = json.loads(body) if body else None
+		data = parsed if isinstance(parsed, dict) else None
+	except ValueError:
+		pass
+	message = str((data or {}).get('message') or (data or {}).get('msg') or '')
+
+	if status_code == 429 or any(marker in message for marker in RATE_LIMIT_MARKERS):
+		return Classification(RATE_LIMIT, message or f'HTTP {status_code}', status_code, _retry_after(headers), data)
+	if status_code == 401 or any(marker in message for marker in AUTH_MARKERS):
+		return Classification(AUTH, message or f'HTTP {status_code}', status_code, data=data)
+	if status_code >= 500:
+		return Classification(SERVER_ERROR, message or f'HTTP {status_code}', status_code, _retry_after(headers), data)
+	if data is None:
+		return Classification(SERVER_ERROR, f'HTTP {status_code}: 无法解析的响应', status_code)
+	if status_code == 403:
+		return Classification(AUTH, message or f'HTTP {status_code}', status_code, data=data)
+	if status_code != 200:
+		return Classification(BUSINESS, message or f'HTTP {status_code}', status_code, data=data)
+	if data.get('success'):
+		return Classification(OK, message, status_code, data=data)
+	return Classification(BUSINESS, message or '未知错误', status_code, data=data)
+
+
+def classify_response(response: httpx.Response) -> Classification:
+	return classify(response.status_code, response.headers, response.text)
+
+
+def classify_exception(error: Exception) -> Classification:
+	"""分类请求过程中的异常"""
+	if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+		return Classification(NETWORK, str(error) or type(error).__name__)
+	return Classification(SERVER_ERROR, str(error) or type(error).__name__)
+
+
+def wording(kind: str | None) -> str:
+	"""通知中对某类错误的说明"""
+	return WORDING.get(kind or '', '')
+
+
+def session_fingerprint(cookies: dict) -> str | None:
+	"""账号 session cookie 的指纹，用于识别未更新的失效 session（不保存原值）"""
+	session = cookies.get('session')
+	if not session:
+		return None
+	return hashlib.sha256(str(session).encode('utf-8')).hexdigest()[:16]
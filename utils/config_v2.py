@@ -7,7 +7,8 @@
 import json
 import os
 from dataclasses import dataclass
-from typing import Dict, List, Literal
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Literal
 
 
 @dataclass
@@ -22,6 +23,12 @@ class ProviderConfig:
 	api_user_key: str = 'new-api-user'
 	bypass_method: Literal['waf_cookies'] | None = None
 	waf_cookie_names: List[str] | None = None
+	block_resource_types: List[str] | None = None
+	allow_hosts: List[str] | None = None
+	block_hosts: List[str] | None = None
+	block_third_party: bool = True
+	utc_offset: float = 8.0
+	rate_limit: Dict | None = None
 
 	def __post_init__(self):
 		# 不再强制修改 bypass_method
@@ -45,6 +52,12 @@ class ProviderConfig:
 			api_user_key=data.get('api_user_key', 'new-api-user'),
 			bypass_method=data.get('bypass_method'),
 			waf_cookie_names = data.get('waf_cookie_names'),
+			block_resource_types=data.get('block_resource_types'),
+			allow_hosts=data.get('allow_hosts'),
+			block_hosts=data.get('block_hosts'),
+			block_third_party=data.get('block_third_party', True),
+			utc_offset=float(data.get('utc_offset', 8.0)),
+			rate_limit=data.get('rate_limit'),
 		)
 
 	def needs_waf_cookies(self) -> bool:
@@ -55,6 +68,11 @@ class ProviderConfig:
 		"""判断是否需要手动调用签到接口"""
 		return self.bypass_method == 'waf_cookies'
 
+	def checkin_day(self, now: datetime | None = None) -> str:
+		"""站点所在时区（utc_offset 小时）的当前日期，签到按此日期计算"""
+		now = now or datetime.now(timezone.utc)
+		return (now.astimezone(timezone.utc) + timedelta(hours=self.utc_offset)).date().isoformat()
+
 
 @dataclass
 class AppConfig:
@@ -143,37 +161,154 @@ class AccountConfig:
 		return self.name if self.name else f'Account {index + 1}'
 
 
-def load_accounts_config() -> list[AccountConfig] | None:
-	"""从环境变量加载账号配置"""
-	accounts_str = os.getenv('ANYROUTER_ACCOUNTS')
-	if not accounts_str:
+MAX_RECORD_CHARS = 1 << 20  # 单条账号记录的最大长度，超出视为格式错误（避免为坏数据无限缓冲）
+READ_CHUNK_CHARS = 1 << 16
+
+
+def parse_account(data, index: int) -> AccountConfig:
+	"""校验一条账号记录并创建 AccountConfig，无效时抛出 ValueError"""
+	if not isinstance(data, dict):
+		raise ValueError('configuration format is incorrect')
+	missing = [key for key in ('cookies', 'api_user') if key not in data]
+	if missing:
+		raise ValueError(f'missing required fields ({", ".join(missing)})')
+	if not isinstance(data['cookies'], (dict, str)) or not data['cookies']:
+		raise ValueError('cookies must be a non-empty object or string')
+	if 'name' in data and not data['name']:
+		raise ValueError('name field cannot be empty')
+	return AccountConfig.from_dict(data, index)
+
+
+def _iter_json_array(chunks) -> Iterator[object]:
+	"""逐个解析 JSON 数组的元素，不把整个数组读入内存"""
+	decoder = json.JSONDecoder()
+	buffer, pos, opened, exhausted = '', 0, False, False
+	chunks = iter(chunks)
+	while True:
+		while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+			pos += 1
+		if pos < len(buffer):
+			if not opened:
+				if buffer[pos] != '[':
+					raise ValueError('Account configuration must use array format [{}]')
+				opened, pos = True, pos + 1
+				continue
+			if buffer[pos] == ']':
+				return
+			try:
+				value, end = decoder.raw_decode(buffer, pos)
+			except json.JSONDecodeError as e:
+				if exhausted or len(buffer) - pos > MAX_RECORD_CHARS:
+					raise ValueError(f'invalid JSON at record starting near offset {pos}: {e.msg}') from None
+			else:
+				yield value
+				pos = end
+				continue
+		elif exhausted:
+			raise ValueError('unexpected end of account array')
+		# 需要更多数据
+		chunk = next(chunks, None)
+		if chunk is None:
+			exhausted = True
+		else:
+			buffer, pos = buffer[pos:] + chunk, 0
+
+
+class AccountSource:
+	"""
+	账号来源：ANYROUTER_ACCOUNTS 环境变量，或 ANYROUTER_ACCOUNTS_FILE 指向的文件
+
+	内容为 JSON 数组或 JSONL（每行一个账号对象，空行与 # 开头的行忽略），按首个非空字符自动识别。
+	逐条解析、逐条校验并按需产出账号：无效的条目记录到 errors 后跳过，不影响其他账号。
+	"""
+
+	def __init__(self, text: str | None = None, path: str | None = None):
+		self.text = text
+		self.path = path
+		self.errors: list[tuple[str, str]] = []
+
+	@classmethod
+	def from_env(cls, path: str | None = None) -> 'AccountSource | None':
+		"""优先使用账号文件（参数或 ANYROUTER_ACCOUNTS_FILE），否则读取 ANYROUTER_ACCOUNTS"""
+		path = path or os.getenv('ANYROUTER_ACCOUNTS_FILE')
+		if path:
+			return cls(path=path)
+		text = os.getenv('ANYROUTER_ACCOUNTS')
+		return cls(text=text) if text else None
+
+	def _chunks(self) -> Iterator[str]:
+		if self.path is None:
+			yield self.text or ''
+			return
+		with open(self.path, encoding='utf-8') as f:
+			while chunk := f.read(READ_CHUNK_CHARS):
+				yield chunk
+
+	def _lines(self) -> Iterator[str]:
+		if self.path is None:
+			yield from (self.text or '').splitlines()
+			return
+		with open(self.path, encoding='utf-8') as f:
+			yield from f
+
+	def _first_char(self) -> str:
+		for chunk in self._chunks():
+			stripped = chunk.lstrip()
+			if stripped:
+				return stripped[0]
+		return ''
+
+	def records(self) -> Iterator[tuple[str, object]]:
+		"""产出 (位置说明, 原始记录)；JSONL 中无法解析的行产出 ValueError，同样占一个账号序号"""
+		if self._first_char() == '[':
+			index = 0
+			try:
+				for index, record in enumerate(_iter_json_array(self._chunks()), 1):
+					yield f'Account {index}', record
+			except ValueError as e:
+				# 数组中的语法错误无法定位下一条记录，之后的账号全部跳过
+				self._error(f'Account {index + 1}', f'{e}, remaining accounts skipped')
+			return
+
+		for line_number, line in enumerate(self._lines(), 1):
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			try:
+				record = json.loads(line)
+			except ValueError as e:
+				record = ValueError(f'invalid JSON: {e}')
+			yield f'line {line_number}', record
+
+	def __iter__(self) -> Iterator[AccountConfig]:
+		index = 0
+		for label, record in self.records():
+			try:
+				if isinstance(record, ValueError):
+					raise record
+				yield parse_account(record, index)
+			except ValueError as e:
+				self._error(label, str(e))
+			index += 1
+
+	def _error(self, label: str, reason: str):
+		self.errors.append((label, reason))
+		print(f'[WARNING] {label} skipped: {reason}')
+
+
+def load_accounts_config(path: str | None = None) -> list[AccountConfig] | None:
+	"""从环境变量（或账号文件）加载账号配置，无效的条目跳过"""
+	source = AccountSource.from_env(path)
+	if source is None:
 		print('ERROR: ANYROUTER_ACCOUNTS environment variable not found')
 		return None
 
 	try:
-		accounts_data = json.loads(accounts_str)
-
-		if not isinstance(accounts_data, list):
-			print('ERROR: Account configuration must use array format [{}]')
-			return None
-
-		accounts = []
-		for i, account_dict in enumerate(accounts_data):
-			if not isinstance(account_dict, dict):
-				print(f'ERROR: Account {i + 1} configuration format is incorrect')
-				return None
-
-			if 'cookies' not in account_dict or 'api_user' not in account_dict:
-				print(f'ERROR: Account {i + 1} missing required fields (cookies, api_user)')
-				return None
-
-			if 'name' in account_dict and not account_dict['name']:
-				print(f'ERROR: Account {i + 1} name field cannot be empty')
-				return None
-
-			accounts.append(AccountConfig.from_dict(account_dict, i))
-
-		return accounts
-	except Exception as e:
-		print(f'ERROR: Account configuration format is incorrect: {e}')
+		accounts = list(source)
+	except OSError as e:
+		print(f'ERROR: Failed to read account file: {e}')
+		return None
+	if not accounts:
+		print('ERROR: No valid account configuration found')
 		return None
+	return accounts
@@ -0,0 +1,256 @@
+"""
+运行历史（SQLite）
+
+替代原来只记录一个余额 hash 的 balance_hash.txt：每次运行结束时在一个事务里批量写入
+- runs: 每次运行的起止时间与成功数
+- account_results: 每个账号的结果、余额、已用额度、错误信息与错误类别，以及到达的升级层级
+- stage_timings: 每个账号各阶段的耗时（来自 utils.trace）
+- checkins: 每个账号已确认完成签到的日期（站点时区），用于跳过当天已签到的账号
+
+可以直接用 sqlite3 查询「哪些账号余额变了」「上周某个阶段耗时多少」，无需重新运行。
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	started_at REAL NOT NULL,
+	finished_at REAL NOT NULL,
+	total INTEGER NOT NULL,
+	succeeded INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS account_results (
+	run_id INTEGER NOT NULL REFERENCES runs(id),
+	account TEXT NOT NULL,
+	name TEXT,
+	provider TEXT,
+	ok INTEGER NOT NULL,
+	quota REAL,
+	used_quota REAL,
+	error TEXT,
+	error_class TEXT,
+	finished_at REAL NOT NULL,
+	skipped INTEGER NOT NULL DEFAULT 0,
+	tier TEXT,
+	session_fp TEXT
+);
+CREATE TABLE IF NOT EXISTS stage_timings (
+	run_id INTEGER NOT NULL REFERENCES runs(id),
+	account TEXT,
+	stage TEXT NOT NULL,
+	started_at REAL NOT NULL,
+	duration REAL NOT NULL,
+	ok INTEGER NOT NULL,
+	tags TEXT
+);
+CREATE TABLE IF NOT EXISTS checkins (
+	account TEXT NOT NULL,
+	day TEXT NOT NULL,
+	completed_at REAL NOT NULL,
+	PRIMARY KEY (account, day)
+);
+CREATE INDEX IF NOT EXISTS idx_account_results_account ON account_results(account, finished_at);
+CREATE INDEX IF NOT EXISTS idx_account_results_time ON account_results(finished_at);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_stage ON stage_timings(stage, started_at);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_account ON stage_timings(account, started_at);
+"""
+
+# account_results 在首个版本之后新增的列
+ADDED_COLUMNS = {
+	'skipped': 'INTEGER NOT NULL DEFAULT 0',
+	'tier': 'TEXT',
+	'session_fp': 'TEXT',
+}
+
+
+@dataclass
+class AccountResult:
+	"""一个账号在一次运行中的结果"""
+
+	account: str
+	name: str
+	provider: str
+	ok: bool
+	quota: float | None = None
+	used_quota: float | None = None
+	error: str | None = None
+	error_class: str | None = None
+	day: str | None = None
+	skipped: bool = False
+	tier: str | None = None
+	session_fp: str | None = None
+
+
+def account_key(provider: str, api_user) -> str:
+	"""账号的稳定标识（不随配置顺序变化）"""
+	return f'{provider}:{api_user}'
+
+
+class RunHistory:
+	"""运行历史存储"""
+
+	def __init__(self, path: str | None = 'checkin_history.db'):
+		self.path = path
+
+	@classmethod
+	def from_env(cls) -> 'RunHistory':
+		"""从环境变量创建（CHECKIN_HISTORY_DB，设为空字符串时关闭）"""
+		return cls(path=os.getenv('CHECKIN_HISTORY_DB', 'checkin_history.db') or None)
+
+	def connect(self) -> sqlite3.Connection:
+		conn = sqlite3.connect(self.path)
+		conn.executescript(SCHEMA)
+		# 旧版本创建的库缺少后来新增的列
+		columns = {row[1] for row in conn.execute('PRAGMA table_info(account_results)')}
+		for column, definition in ADDED_COLUMNS.items():
+			if column not in columns:
+				conn.execute(f'ALTER TABLE account_results ADD COLUMN {column} {definition}')
+		return conn
+
+	def completed(self, days: dict[str, str]) -> set[str]:
+		"""
+		查询已完成签到的账号
+
+		Args:
+			days: 账号标识 -> 该账号站点时区的当天日期
+
+		Returns:
+			当天已确认签到的账号标识
+		"""
+		if not days or not self.path or not os.path.exists(self.path):
+			return set()
+		try:
+			with closing(self.connect()) as conn:
+				rows = conn.execute(
+					f'SELECT account, day FROM checkins WHERE day IN ({",".join("?" * len(set(days.values())))})',
+					sorted(set(days.values())),
+				).fetchall()
+			return {account for account, day in rows if days.get(account) == day}
+		except Exception as e:
+			print(f'[WARN] 签到状态读取失败: {e}')
+			return set()
+
+	def dead_sessions(self) -> dict[str, str]:
+		"""最近一次结果为 session 失效（auth）的账号及当时的 session 指纹"""
+		if not self.path or not os.path.exists(self.path):
+			return {}
+		try:
+			with closing(self.connect()) as conn:
+				rows = conn.execute(
+					"""
+					SELECT account, session_fp FROM account_results AS r
+					WHERE error_class = 'auth' AND session_fp IS NOT NULL AND finished_at = (
+						SELECT MAX(finished_at) FROM account_results WHERE account = r.account AND skipped = 0
+					)
+					"""
+				).fetchall()
+			return {account: fp for account, fp in rows}
+		except Exception as e:
+			print(f'[WARN] 运行历史读取失败: {e}')
+			return {}
+
+	def last_balances(self) -> dict[str, float]:
+		"""每个账号最近一次记录到的余额"""
+		if not self.path or not os.path.exists(self.path):
+			return {}
+		try:
+			with closing(self.connect()) as conn:
+				rows = conn.execute(
+					"""
+					SELECT account, quota FROM account_results AS r
+					WHERE quota IS NOT NULL AND finished_at = (
+						SELECT MAX(finished_at) FROM account_results
+						WHERE account = r.account AND quota IS NOT NULL
+					)
+					"""
+				).fetchall()
+			return {account: quota for account, quota in rows}
+		except Exception as e:
+			print(f'[WARN] 运行历史读取失败: {e}')
+			return {}
+
+	def record_run(self, started_at: float, results: list[AccountResult], spans=()) -> int | None:
+		"""
+		在一个事务中写入一次运行的全部结果与阶段耗时
+
+		Args:
+			started_at: 运行开始时间 (time.time())
+			results: 各账号结果
+			spans: utils.trace.Span 列表，带 account 标签（账号序号或账号标识）的归属到对应账号
+
+		Returns:
+			run id，未启用或写入失败时为 None
+		"""
+		if not self.path:
+			return None
+		finished_at = time.time()
+		try:
+			with closing(self.connect()) as conn, conn:
+				cursor = conn.execute(
+					'INSERT INTO runs (started_at, finished_at, total, succeeded) VALUES (?, ?, ?, ?)',
+					(started_at, finished_at, len(results), sum(1 for r in results if r.ok)),
+				)
+				run_id = cursor.lastrowid
+				conn.executemany(
+					'INSERT INTO account_results (run_id, account, name, provider, ok, quota, used_quota, error, error_class, '
+					'finished_at, skipped, tier, session_fp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+					[
+						(
+							run_id, r.account, r.name, r.provider, int(r.ok), r.quota, r.used_quota, r.error, r.error_class,
+							finished_at, int(r.skipped), r.tier, r.session_fp,
+						)
+						for r in results
+					],
+				)
+				conn.executemany(
+					'INSERT OR IGNORE INTO checkins (account, day, completed_at) VALUES (?, ?, ?)',
+					[(r.account, r.day, finished_at) for r in results if r.ok and r.day and not r.skipped],
+				)
+				conn.executemany(
+					'INSERT INTO stage_timings VALUES (?, ?, ?, ?, ?, ?, ?)',
+					[self._span_row(run_id, span, results) for span in spans],
+				)
+			return run_id
+		except Exception as e:
+			print(f'[WARN] 运行历史写入失败: {e}')
+			return None
+
+	@staticmethod
+	def _span_row(run_id: int, span, results: list[AccountResult]) -> tuple:
+		tags = dict(span.tags)
+		index = tags.pop('account', None)
+		if isinstance(index, str):
+			# 合并分片结果时 account 标签已是账号标识
+			account = index
+		else:
+			account = results[index].account if isinstance(index, int) and 0 <= index < len(results) else None
+		tags_text = ','.join(f'{k}={v}' for k, v in sorted(tags.items())) or None
+		return (run_id, account, span.stage, span.start, span.duration, int(span.ok), tags_text)
+
+	def changed_accounts(self, previous: dict[str, float], results: list[AccountResult]) -> list[tuple[AccountResult, float | None]]:
+		"""与上次记录相比余额发生变化的账号及其上次余额"""
+		return [
+			(r, previous.get(r.account))
+			for r in results
+			if r.quota is not None and previous.get(r.account) != r.quota
+		]
+
+	def stage_stats(self, stage: str, since: float | None = None) -> dict:
+		"""某个阶段自 since 以来的次数、平均与最大耗时"""
+		if not self.path or not os.path.exists(self.path):
+			return {'count': 0, 'avg': None, 'max': None}
+		with closing(self.connect()) as conn:
+			count, avg, maximum = conn.execute(
+				'SELECT COUNT(*), AVG(duration), MAX(duration) FROM stage_timings WHERE stage = ? AND started_at >= ?',
+				(stage, since or 0),
+			).fetchone()
+		return {'count': count, 'avg': avg, 'max': maximum}
+
+
+# 全局实例
+run_history = RunHistory.from_env()
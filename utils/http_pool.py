@@ -0,0 +1,130 @@
+"""
+共享 HTTP 客户端
+每个 origin（scheme://host:port）只创建一个带连接池的 httpx.AsyncClient，
+所有账号共用，避免每个账号重复 DNS / TCP / TLS / HTTP2 握手；运行结束时统一关闭。
+
+客户端不保存响应中的 cookie：账号 cookie 与 new-api-user 等请求头仍由调用方逐请求传入，
+不会在账号之间串用。
+"""
+
+import asyncio
+import os
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import httpx
+
+
+def _origin(url: str) -> str:
+	parts = urlsplit(url)
+	port = parts.port or (443 if parts.scheme == 'https' else 80)
+	return f'{parts.scheme}://{parts.hostname}:{port}'
+
+
+class ClientRegistry:
+	"""按 origin 共享的 httpx.AsyncClient 注册表"""
+
+	def __init__(
+		self,
+		max_connections: int = 20,
+		max_keepalive: int = 10,
+		keepalive_expiry: float = 30.0,
+		timeout: float = 30.0,
+		http2: bool = True,
+	):
+		self.limits = httpx.Limits(
+			max_connections=max_connections,
+			max_keepalive_connections=max_keepalive,
+			keepalive_expiry=keepalive_expiry,
+		)
+		self.timeout = timeout
+		self.http2 = http2
+		self.stats: dict[str, dict] = {}
+		self._clients: dict[str, httpx.AsyncClient] = {}
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	@classmethod
+	def from_env(cls) -> 'ClientRegistry':
+		"""从环境变量创建（HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE / HTTP_KEEPALIVE_EXPIRY / HTTP_TIMEOUT）"""
+		return cls(
+			max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '20') or 20),
+			max_keepalive=int(os.getenv('HTTP_MAX_KEEPALIVE', '10') or 10),
+			keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30') or 30),
+			timeout=float(os.getenv('HTTP_TIMEOUT', '30') or 30),
+		)
+
+	def get(self, url: str) -> httpx.AsyncClient:
+		"""获取 url 所属 origin 的共享客户端"""
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			# 客户端的连接绑定在事件循环上，换了循环只能重新创建
+			self._loop = loop
+			self._clients = {}
+
+		origin = _origin(url)
+		client = self._clients.get(origin)
+		if client is None or client.is_closed:
+			stats = self.stats.setdefault(
+				origin, {'requests': 0, 'connections': 0, 'connect_seconds': 0.0, 'tls_seconds': 0.0}
+			)
+			client = httpx.AsyncClient(
+				http2=self.http2,
+				timeout=self.timeout,
+				limits=self.limits,
+				cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+				event_hooks={'request': [self._request_hook(stats)]},
+			)
+			self._clients[origin] = client
+		return client
+
+	def _request_hook(self, stats: dict):
+		async def hook(request: httpx.Request):
+			stats['requests'] += 1
+			request.extensions['trace'] = self._tracer(stats)
+
+		return hook
+
+	@staticmethod
+	def _tracer(stats: dict):
+		"""httpcore trace 回调：统计新建连接数与握手耗时"""
+		started: dict[str, float] = {}
+
+		async def trace(event_name: str, info: dict):
+			if event_name == 'connection.connect_tcp.started':
+				stats['connections'] += 1
+				started['tcp'] = time.monotonic()
+			elif event_name == 'connection.connect_tcp.complete' and 'tcp' in started:
+				stats['connect_seconds'] += time.monotonic() - started.pop('tcp')
+			elif event_name == 'connection.start_tls.started':
+				started['tls'] = time.monotonic()
+			elif event_name == 'connection.start_tls.complete' and 'tls' in started:
+				stats['tls_seconds'] += time.monotonic() - started.pop('tls')
+
+		return trace
+
+	async def close(self):
+		"""关闭所有客户端（运行结束时调用一次）"""
+		if self._loop is not asyncio.get_running_loop():
+			return
+		clients, self._clients = list(self._clients.values()), {}
+		for client in clients:
+			try:
+				await client.aclose()
+			except Exception:
+				pass
+
+	def report(self):
+		"""输出各 origin 的请求数、新建连接数与握手耗时"""
+		for origin, stats in self.stats.items():
+			if not stats['requests']:
+				continue
+			reused = max(0, stats['requests'] - stats['connections'])
+			print(
+				f"[HTTP] {origin}: 请求 {stats['requests']} 次, 新建连接 {stats['connections']} 个, "
+				f"复用 {reused} 次, TCP 建连 {stats['connect_seconds']:.2f}s, TLS 握手 {stats['tls_seconds']:.2f}s"
+			)
+
+
+# 全局实例
+http_clients = ClientRegistry.from_env()
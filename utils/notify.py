@@ -1,3 +1,4 @@
+import asyncio
 import os
 import smtplib
 from email.mime.text import MIMEText
@@ -26,6 +27,7 @@ class NotificationKit:
 		self.telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID')
 		self.bark_key = os.getenv('BARK_KEY')
 		self.bark_server = os.getenv('BARK_SERVER', 'https://api.day.app')
+		self.timeout = float(os.getenv('NOTIFY_TIMEOUT', '10') or 10)
 
 	def send_email(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
 		if not self.email_user or not self.email_pass or not self.email_to:
@@ -42,38 +44,24 @@ class NotificationKit:
 		msg['Subject'] = title
 
 		smtp_server = self.smtp_server if self.smtp_server else f'smtp.{self.email_user.split("@")[1]}'
-		with smtplib.SMTP_SSL(smtp_server, 465) as server:
+		# 设置 socket 超时：wait_for 只是不再等待，卡住的连接仍会占住线程并拖住进程退出
+		with smtplib.SMTP_SSL(smtp_server, 465, timeout=self.timeout) as server:
 			server.login(self.email_user, self.email_pass)
 			server.send_message(msg)
 
-	def send_pushplus(self, title: str, content: str):
-		if not self.pushplus_token:
-			raise ValueError('PushPlus Token not configured')
-
+	def _pushplus_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {'token': self.pushplus_token, 'title': title, 'content': content, 'template': 'html'}
-		with httpx.Client(timeout=30.0) as client:
-			client.post('http://www.pushplus.plus/send', json=data)
-
-	def send_serverPush(self, title: str, content: str):
-		if not self.server_push_key:
-			raise ValueError('Server Push key not configured')
+		return 'http://www.pushplus.plus/send', data
 
+	def _server_push_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {'title': title, 'desp': content}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(f'https://sctapi.ftqq.com/{self.server_push_key}.send', json=data)
-
-	def send_dingtalk(self, title: str, content: str):
-		if not self.dingding_webhook:
-			raise ValueError('DingTalk Webhook not configured')
+		return f'https://sctapi.ftqq.com/{self.server_push_key}.send', data
 
+	def _dingtalk_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.dingding_webhook, json=data)
-
-	def send_feishu(self, title: str, content: str):
-		if not self.feishu_webhook:
-			raise ValueError('Feishu Webhook not configured')
+		return self.dingding_webhook, data
 
+	def _feishu_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {
 			'msg_type': 'interactive',
 			'card': {
@@ -81,21 +69,13 @@ class NotificationKit:
 				'header': {'template': 'blue', 'title': {'content': title, 'tag': 'plain_text'}},
 			},
 		}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.feishu_webhook, json=data)
-
-	def send_wecom(self, title: str, content: str):
-		if not self.weixin_webhook:
-			raise ValueError('WeChat Work Webhook not configured')
+		return self.feishu_webhook, data
 
+	def _wecom_request(self, title: str, content: str) -> tuple[str, dict]:
 		data = {'msgtype': 'text', 'text': {'content': f'{title}\n{content}'}}
-		with httpx.Client(timeout=30.0) as client:
-			client.post(self.weixin_webhook, json=data)
-
-	def send_gotify(self, title: str, content: str):
-		if not self.gotify_url or not self.gotify_token:
-			raise ValueError('Gotify URL or Token not configured')
+		return self.weixin_webhook, data
 
+	def _gotify_request(self, title: str, content: str) -> tuple[str, dict]:
 		# 使用环境变量配置的优先级，默认为9
 		priority = self.gotify_priority
 
@@ -108,24 +88,14 @@ class NotificationKit:
 			'priority': priority
 		}
 
-		url = f'{self.gotify_url}?token={self.gotify_token}'
-		with httpx.Client(timeout=30.0) as client:
-			client.post(url, json=data)
-
-	def send_telegram(self, title: str, content: str):
-		if not self.telegram_bot_token or not self.telegram_chat_id:
-			raise ValueError('Telegram Bot Token or Chat ID not configured')
+		return f'{self.gotify_url}?token={self.gotify_token}', data
 
+	def _telegram_request(self, title: str, content: str) -> tuple[str, dict]:
 		message = f'<b>{title}</b>\n\n{content}'
 		data = {'chat_id': self.telegram_chat_id, 'text': message, 'parse_mode': 'HTML'}
-		url = f'https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage'
-		with httpx.Client(timeout=30.0) as client:
-			client.post(url, json=data)
-
-	def send_bark(self, title: str, content: str):
-		if not self.bark_key:
-			raise ValueError('Bark Key not configured')
+		return f'https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage', data
 
+	def _bark_request(self, title: str, content: str) -> tuple[str, dict]:
 		# Bark API 支持 GET/POST，这里使用 POST JSON 方式支持更多参数
 		# 文档: https://bark.day.app/#/tutorial
 		url = f'{self.bark_server.rstrip("/")}/push'
@@ -136,10 +106,119 @@ class NotificationKit:
 			'icon': 'https://anyrouter.top/favicon.ico',  # 可选：尝试使用 AnyRouter 图标
 			'group': 'AnyRouter'
 		}
+		return url, data
 
+	def _post(self, request: tuple[str, dict]):
+		url, data = request
 		with httpx.Client(timeout=30.0) as client:
 			client.post(url, json=data)
 
+	def send_pushplus(self, title: str, content: str):
+		if not self.pushplus_token:
+			raise ValueError('PushPlus Token not configured')
+
+		self._post(self._pushplus_request(title, content))
+
+	def send_serverPush(self, title: str, content: str):
+		if not self.server_push_key:
+			raise ValueError('Server Push key not configured')
+
+		self._post(self._server_push_request(title, content))
+
+	def send_dingtalk(self, title: str, content: str):
+		if not self.dingding_webhook:
+			raise ValueError('DingTalk Webhook not configured')
+
+		self._post(self._dingtalk_request(title, content))
+
+	def send_feishu(self, title: str, content: str):
+		if not self.feishu_webhook:
+			raise ValueError('Feishu Webhook not configured')
+
+		self._post(self._feishu_request(title, content))
+
+	def send_wecom(self, title: str, content: str):
+		if not self.weixin_webhook:
+			raise ValueError('WeChat Work Webhook not configured')
+
+		self._post(self._wecom_request(title, content))
+
+	def send_gotify(self, title: str, content: str):
+		if not self.gotify_url or not self.gotify_token:
+			raise ValueError('Gotify URL or Token not configured')
+
+		self._post(self._gotify_request(title, content))
+
+	def send_telegram(self, title: str, content: str):
+		if not self.telegram_bot_token or not self.telegram_chat_id:
+			raise ValueError('Telegram Bot Token or Chat ID not configured')
+
+		self._post(self._telegram_request(title, content))
+
+	def send_bark(self, title: str, content: str):
+		if not self.bark_key:
+			raise ValueError('Bark Key not configured')
+
+		self._post(self._bark_request(title, content))
+
+	def configured_channels(self) -> list[str]:
+		"""返回已配置的通知渠道名称"""
+		checks = [
+			('Email', self.email_user and self.email_pass and self.email_to),
+			('PushPlus', self.pushplus_token),
+			('Server Push', self.server_push_key),
+			('DingTalk', self.dingding_webhook),
+			('Feishu', self.feishu_webhook),
+			('WeChat Work', self.weixin_webhook),
+			('Gotify', self.gotify_url and self.gotify_token),
+			('Telegram', self.telegram_bot_token and self.telegram_chat_id),
+			('Bark', self.bark_key),
+		]
+		return [name for name, configured in checks if configured]
+
+	async def apush_message(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
+		"""
+		异步并发推送到所有已配置的渠道
+
+		Webhook 类渠道共用一个 AsyncClient 并发发送，邮件在线程池中发送，
+		每个渠道单独限时（NOTIFY_TIMEOUT，默认 10 秒），慢渠道不会拖住其他渠道。
+		"""
+		channels = self.configured_channels()
+		if not channels:
+			print('[Notify]: No notification channel configured, skipping')
+			return
+
+		builders = {
+			'PushPlus': self._pushplus_request,
+			'Server Push': self._server_push_request,
+			'DingTalk': self._dingtalk_request,
+			'Feishu': self._feishu_request,
+			'WeChat Work': self._wecom_request,
+			'Gotify': self._gotify_request,
+			'Telegram': self._telegram_request,
+			'Bark': self._bark_request,
+		}
+		loop = asyncio.get_running_loop()
+
+		async with httpx.AsyncClient(timeout=self.timeout) as client:
+
+			async def send(name: str):
+				if name == 'Email':
+					coro = loop.run_in_executor(None, self.send_email, title, content, msg_type)
+				else:
+					url, data = builders[name](title, content)
+					coro = client.post(url, json=data)
+				await asyncio.wait_for(coro, timeout=self.timeout)
+
+			results = await asyncio.gather(*(send(name) for name in channels), return_exceptions=True)
+
+		for name, result in zip(channels, results):
+			if isinstance(result, BaseException):
+				reason = 'timed out' if isinstance(result, asyncio.TimeoutError) else str(result)
+				print(f'[{name}]: Message push failed! Reason: {reason}')
+			else:
+				print(f'[{name}]: Message push successful!')
+
 	def push_message(self, title: str, content: str, msg_type: Literal['text', 'html'] = 'text'):
 		notifications = [
 			('Email', lambda: self.send_email(title, content, msg_type)),
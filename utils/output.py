@@ -0,0 +1,69 @@
+"""
+账号日志分组输出
+
+并发执行多个账号时，各账号的 print() 输出会相互交错。
+本模块把 sys.stdout 替换为一个按 asyncio 上下文分流的代理：
+在 grouped() 包裹的协程内打印的内容先写入该账号自己的缓冲区，
+协程结束后整段一次性输出，保证每个账号的日志连续成块。
+"""
+
+import sys
+from contextvars import ContextVar
+from typing import Awaitable, TypeVar
+
+T = TypeVar('T')
+
+
+class _Buffer:
+	"""单个账号的输出缓冲区"""
+
+	def __init__(self):
+		self.parts: list[str] = []
+		self.closed = False
+
+
+_current: ContextVar[_Buffer | None] = ContextVar('checkin_output_buffer', default=None)
+
+
+class _GroupedStdout:
+	"""按当前上下文把写入分流到账号缓冲区或真实 stdout"""
+
+	def __init__(self, stream):
+		self._stream = stream
+
+	def write(self, text: str) -> int:
+		buffer = _current.get()
+		# 账号结束后仍在运行的后台任务（继承了上下文）直接输出，避免日志丢失
+		if buffer is None or buffer.closed:
+			return self._stream.write(text)
+		buffer.parts.append(text)
+		return len(text)
+
+	def flush(self):
+		if _current.get() is None:
+			self._stream.flush()
+
+	def __getattr__(self, name):
+		return getattr(self._stream, name)
+
+
+def install():
+	"""安装 stdout 代理（可重复调用）"""
+	if not isinstance(sys.stdout, _GroupedStdout):
+		sys.stdout = _GroupedStdout(sys.stdout)
+
+
+async def grouped(awaitable: Awaitable[T]) -> T:
+	"""执行协程并把其间的输出合并为一段连续日志"""
+	install()
+	buffer = _Buffer()
+	token = _current.set(buffer)
+	try:
+		return await awaitable
+	finally:
+		_current.reset(token)
+		buffer.closed = True
+		text = ''.join(buffer.parts)
+		if text:
+			sys.stdout.write(text)
+			sys.stdout.flush()
@@ -0,0 +1,157 @@
+"""
+按站点限速
+
+多个账号并发时，同一域名的请求先经过该域名的限速器：
+- 令牌桶: 每秒最多 rate 个请求，允许 burst 个突发
+- 并发上限（AIMD）: 响应正常时每轮增加 increase，遇到 429、503 或意外的 WAF 挑战页时减半，
+  在 min_concurrency 与 max_concurrency 之间自动找到站点能承受的并发
+
+每个 provider 可在 PROVIDERS 中通过 rate_limit 字段单独配置，例如
+{"anyrouter": {"domain": "https://anyrouter.top", "rate_limit": {"rate": 2, "max_concurrency": 4}}}
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
+
+from utils.classify import NETWORK, RATE_LIMIT, SERVER_ERROR, WAF_CHALLENGE, Classification
+
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+	"""单个站点的限速配置"""
+
+	rate: float = 10.0  # 每秒请求数，0 为不限
+	burst: int = 10
+	initial_concurrency: int = 4
+	min_concurrency: int = 1
+	max_concurrency: int = 16
+	increase: float = 1.0  # 每轮（约 limit 个）正常响应后并发上限的增加量
+
+	@classmethod
+	def from_dict(cls, data: dict | None) -> 'RateLimitConfig':
+		names = {f.name for f in fields(cls)}
+		return cls(**{k: v for k, v in (data or {}).items() if k in names})
+
+
+class DomainLimiter:
+	"""单个域名的令牌桶与自适应并发上限"""
+
+	def __init__(self, domain: str, config: RateLimitConfig):
+		self.domain = domain
+		self.config = config
+		self.limit = float(max(config.min_concurrency, min(config.initial_concurrency, config.max_concurrency)))
+		self.in_flight = 0
+		self.tokens = float(config.burst)
+		self.updated = time.monotonic()
+		self.last_decrease = 0.0
+		self._waiters: deque[asyncio.Future] = deque()
+		self.stats = {'requests': 0, 'decreases': 0, 'peak': 0, 'waited': 0.0}
+
+	@asynccontextmanager
+	async def slot(self):
+		"""占用一个并发名额与一个令牌，产出请求发出的时间（供 record 使用）"""
+		started = time.monotonic()
+		await self._acquire()
+		try:
+			await self._take_token()
+			sent_at = time.monotonic()
+			self.stats['waited'] += sent_at - started
+			self.stats['requests'] += 1
+			yield sent_at
+		finally:
+			self.in_flight -= 1
+			self._wake()
+
+	def record(self, sent_at: float, result: Classification, challenge_expected: bool = False):
+		"""
+		根据响应调整并发上限
+
+		Args:
+			sent_at: slot() 产出的请求发出时间
+			result: 响应分类
+			challenge_expected: 还没有带 WAF cookies，挑战页属于正常升级流程而非限流信号
+		"""
+		congested = (
+			result.kind == RATE_LIMIT
+			or result.status_code == 503
+			or (result.kind == WAF_CHALLENGE and not challenge_expected)
+		)
+		if congested:
+			# 减半后才发出的请求再拥塞才会继续减半，同一轮的多个 429 只算一次
+			if sent_at >= self.last_decrease:
+				self.limit = max(float(self.config.min_concurrency), self.limit / 2)
+				self.last_decrease = time.monotonic()
+				self.stats['decreases'] += 1
+				print(f'[RATE] {self.domain}: {result.kind}，并发上限降为 {int(self.limit)}')
+		elif result.kind not in (NETWORK, SERVER_ERROR, WAF_CHALLENGE):
+			self.limit = min(float(self.config.max_concurrency), self.limit + self.config.increase / self.limit)
+			self._wake()
+
+	async def _acquire(self):
+		while self.in_flight >= int(self.limit):
+			waiter = asyncio.get_running_loop().create_future()
+			self._waiters.append(waiter)
+			try:
+				await waiter
+			finally:
+				if waiter in self._waiters:
+					self._waiters.remove(waiter)
+		self.in_flight += 1
+		self.stats['peak'] = max(self.stats['peak'], self.in_flight)
+
+	def _wake(self):
+		for _ in range(max(0, int(self.limit) - self.in_flight)):
+			if not self._waiters:
+				break
+			waiter = self._waiters.popleft()
+			if not waiter.done():
+				waiter.set_result(None)
+
+	async def _take_token(self):
+		rate = self.config.rate
+		if not rate:
+			return
+		while True:
+			now = time.monotonic()
+			self.tokens = min(float(self.config.burst), self.tokens + (now - self.updated) * rate)
+			self.updated = now
+			if self.tokens >= 1:
+				self.tokens -= 1
+				return
+			await asyncio.sleep((1 - self.tokens) / rate)
+
+
+class RateLimiters:
+	"""按域名管理限速器（事件循环变化时重建）"""
+
+	def __init__(self):
+		self.limiters: dict[str, DomainLimiter] = {}
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	def get(self, provider_config) -> DomainLimiter:
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self.limiters.clear()
+			self._loop = loop
+		domain = provider_config.domain
+		if domain not in self.limiters:
+			self.limiters[domain] = DomainLimiter(domain, RateLimitConfig.from_dict(provider_config.rate_limit))
+		return self.limiters[domain]
+
+	def report(self):
+		"""输出各域名的请求数、并发峰值、最终并发上限与排队耗时"""
+		for limiter in self.limiters.values():
+			stats = limiter.stats
+			if not stats['requests']:
+				continue
+			print(
+				f"[RATE] {limiter.domain}: {stats['requests']} 个请求, 并发峰值 {stats['peak']}, "
+				f"最终并发上限 {int(limiter.limit)}, 减半 {stats['decreases']} 次, 排队 {stats['waited']:.1f}s"
+			)
+
+
+# 全局实例
+rate_limiters = RateLimiters()
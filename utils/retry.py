@@ -0,0 +1,140 @@
+"""
+按阶段重试
+
+每个阶段（harvest 采集 WAF cookies / solve 求解 token / user_info 查询余额 / sign_in 签到）声明自己
+对各错误类别（见 utils.classify）的重试次数；失败时只重试该阶段，不从头处理整个账号。
+
+- 退避: 首次等待 backoff 秒，之后每次翻倍（不超过 max_backoff），并随机缩短最多 jitter 比例，
+  避免并发账号同时重试；响应带 Retry-After 时以其为准
+- 截止时间: 每个账号有一个总截止时间，每次尝试与重试前的准备（例如换新 token）都受它限制，
+  到期时中止正在进行的尝试；剩余时间不足以等待下一次重试时直接放弃
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import TypeVar
+
+from utils.classify import BUSINESS, NETWORK, RATE_LIMIT, SERVER_ERROR, Classification
+from utils.trace import tracer
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class StagePolicy:
+	"""一个阶段的重试策略"""
+
+	budgets: dict[str, int]  # 错误类别 -> 最多重试次数（未列出的类别不重试）
+	backoff: float = 1.0  # 首次重试前的等待秒数
+	max_backoff: float = 30.0
+
+
+STAGES = {
+	# 页面访问失败时重新打开一次页面
+	'harvest': StagePolicy({NETWORK: 1}, backoff=2.0),
+	# 求解服务与浏览器都拿不到 token 时再求解一次
+	'solve': StagePolicy({SERVER_ERROR: 1}, backoff=1.0),
+	'user_info': StagePolicy({RATE_LIMIT: 2, SERVER_ERROR: 2, NETWORK: 2}, backoff=2.0),
+	# 带 token 的签到被拒时换新 token 重试一次（token 只能使用一次）
+	'sign_in': StagePolicy({RATE_LIMIT: 2, SERVER_ERROR: 2, NETWORK: 2, BUSINESS: 1}, backoff=2.0),
+}
+
+
+class Deadline:
+	"""一个账号的总截止时间"""
+
+	def __init__(self, seconds: float | None):
+		self.expires = time.monotonic() + seconds if seconds else None
+
+	def remaining(self) -> float | None:
+		return None if self.expires is None else self.expires - time.monotonic()
+
+	def allows(self, delay: float) -> bool:
+		"""等待 delay 秒后是否仍在截止时间之前"""
+		remaining = self.remaining()
+		return remaining is None or remaining > delay
+
+	async def bound(self, call: Callable[[], Awaitable[T]]) -> T:
+		"""在截止时间内执行 call，到期时取消并抛出 TimeoutError"""
+		async with asyncio.timeout(self.remaining()):
+			return await call()
+
+
+class RetryEngine:
+	"""按阶段策略执行重试"""
+
+	def __init__(self, stages: dict[str, StagePolicy] | None = None, account_deadline: float | None = 240.0, jitter: float = 0.5):
+		self.stages = dict(STAGES if stages is None else stages)
+		self.account_deadline = account_deadline
+		self.jitter = jitter
+
+	@classmethod
+	def from_env(cls) -> 'RetryEngine':
+		"""从环境变量创建（RETRY_ACCOUNT_DEADLINE，0 表示不限制）"""
+		return cls(account_deadline=float(os.getenv('RETRY_ACCOUNT_DEADLINE', '240')) or None)
+
+	def deadline(self) -> Deadline:
+		return Deadline(self.account_deadline)
+
+	def delay(self, policy: StagePolicy, result: Classification, attempt: int) -> float:
+		"""第 attempt 次（从 0 开始）重试前的等待秒数"""
+		if result.retry_after is not None:
+			return min(result.retry_after, policy.max_backoff)
+		delay = min(policy.backoff * 2**attempt, policy.max_backoff)
+		return delay * (1 - self.jitter * random.random())
+
+	async def run(
+		self,
+		stage: str,
+		attempt: Callable[[], Awaitable[Classification]],
+		deadline: Deadline | None = None,
+		before_retry: Callable[[Classification], Awaitable[bool]] | None = None,
+	) -> Classification:
+		"""
+		执行一个阶段，按策略重试
+
+		Args:
+			stage: 阶段名（STAGES 的键）
+			attempt: 执行一次该阶段并返回分类结果
+			deadline: 账号的总截止时间
+			before_retry: 重试前调用（例如换新 token），返回 False 时放弃重试
+
+		Returns:
+			最后一次的分类结果
+		"""
+		policy = self.stages.get(stage)
+		used: dict[str, int] = {}
+		deadline = deadline or Deadline(None)
+		while True:
+			try:
+				result = await deadline.bound(attempt)
+			except TimeoutError:
+				print(f'   ⏱️ [{stage}] 超出账号截止时间，中止')
+				return Classification(NETWORK, '超出账号截止时间')
+			if result.ok or not policy:
+				return result
+			count = used.get(result.kind, 0)
+			if count >= policy.budgets.get(result.kind, 0):
+				return result
+			delay = self.delay(policy, result, count)
+			if not deadline.allows(delay):
+				print(f'   ⏱️ [{stage}] 剩余时间不足，不再重试')
+				return result
+			try:
+				if before_retry and not await deadline.bound(lambda: before_retry(result)):
+					return result
+			except TimeoutError:
+				print(f'   ⏱️ [{stage}] 超出账号截止时间，不再重试')
+				return result
+			used[result.kind] = count + 1
+			print(f'   ⏳ [{stage}] {result.message} ({result.kind})，{delay:.1f}s 后重试 ({count + 1}/{policy.budgets[result.kind]})')
+			with tracer.span(f'retry.{stage}', kind=result.kind):
+				await asyncio.sleep(delay)
+
+
+# 全局实例
+retry_engine = RetryEngine.from_env()
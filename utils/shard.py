@@ -0,0 +1,105 @@
+"""
+账号分片
+
+--shard i/n 时每个进程（或 GitHub Actions matrix 中的每个 job）只处理自己那一片账号：
+账号按 provider:api_user 的哈希稳定分配，增删账号不会打乱其他账号所在的分片。
+各分片把结果写入部分结果文件，最后用 --merge 合并为一次通知与一次运行历史写入。
+"""
+
+import hashlib
+import json
+from dataclasses import asdict
+
+from utils.history import AccountResult
+from utils.trace import Span
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+	"""解析 "i/n"（i 从 1 开始）"""
+	try:
+		index, count = (int(part) for part in text.split('/'))
+	except ValueError:
+		raise ValueError(f'分片格式应为 i/n: {text}') from None
+	if count < 1 or not 1 <= index <= count:
+		raise ValueError(f'分片序号超出范围: {text}')
+	return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+	"""账号所在的分片（1..count）"""
+	digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+	return int(digest[:16], 16) % count + 1
+
+
+def default_output(shard: tuple[int, int]) -> str:
+	return f'checkin_shard_{shard[0]}of{shard[1]}.json'
+
+
+def write_partial(
+	path: str,
+	shard: tuple[int, int],
+	started_at: float,
+	entries: list[tuple[int, AccountResult, str]],
+	spans: list[Span],
+	config_errors: list[tuple[str, str]] = (),
+):
+	"""
+	写入部分结果文件
+
+	Args:
+		entries: (账号在全部有效账号中的序号, 结果, 通知内容)
+		spans: 本分片的 span，account 标签（分片内序号）换成账号标识，合并后仍能归属到账号
+		config_errors: 读取账号时跳过的无效记录（每个分片读到的相同，合并时去重）
+	"""
+	local_keys = [result.account for _, result, _ in entries]
+	rows = []
+	for span in spans:
+		row = asdict(span)
+		index = row['tags'].get('account')
+		if isinstance(index, int) and 0 <= index < len(local_keys):
+			row['tags']['account'] = local_keys[index]
+		rows.append(row)
+	data = {
+		'shard': list(shard),
+		'started_at': started_at,
+		'accounts': [{'index': index, 'result': asdict(result), 'notify': line} for index, result, line in entries],
+		'spans': rows,
+		'config_errors': [list(error) for error in config_errors],
+	}
+	with open(path, 'w', encoding='utf-8') as f:
+		json.dump(data, f, ensure_ascii=False)
+
+
+def load_partials(paths: list[str]) -> tuple[float, list[AccountResult], list[str], list[Span], list[tuple[str, str]]]:
+	"""
+	读取并合并部分结果文件
+
+	Returns:
+		(最早的开始时间, 按原始顺序排列的结果, 通知内容, span, 无效的账号记录)
+	"""
+	started_at, entries, spans, shards, config_errors = None, [], [], {}, []
+	for path in paths:
+		with open(path, encoding='utf-8') as f:
+			data = json.load(f)
+		index, count = data['shard']
+		if index in shards.get(count, set()):
+			print(f'[WARN] 分片 {index}/{count} 重复，忽略 {path}')
+			continue
+		shards.setdefault(count, set()).add(index)
+		started_at = data['started_at'] if started_at is None else min(started_at, data['started_at'])
+		entries.extend(data['accounts'])
+		spans.extend(Span(**row) for row in data['spans'])
+		for error in data.get('config_errors', []):
+			if tuple(error) not in config_errors:
+				config_errors.append(tuple(error))
+
+	for count, indices in shards.items():
+		missing = sorted(set(range(1, count + 1)) - indices)
+		if missing:
+			print(f'[WARN] 缺少分片: {", ".join(f"{i}/{count}" for i in missing)}')
+	if len(shards) > 1:
+		print(f'[WARN] 部分结果文件的分片总数不一致: {sorted(shards)}')
+
+	entries.sort(key=lambda entry: entry['index'])
+	results = [AccountResult(**entry['result']) for entry in entries]
+	return started_at, results, [entry['notify'] for entry in entries], spans, config_errors
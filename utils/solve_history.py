@@ -0,0 +1,114 @@
+"""
+Turnstile 求解耗时历史与自适应轮询
+
+记录每种求解方式的 token 就绪时间（按相邻两次轮询的中点估计，跨运行保存），
+据此安排 getTaskResult / result 的轮询时间点：
+首次轮询放在历史中位数附近，之后按分布的分位数逐步加密，
+超出历史范围后指数退避，直到硬性截止时间。
+"""
+
+import json
+import os
+
+# 历史样本不足时使用的默认计划：与原实现一致，先等 5 秒再每 2 秒轮询
+DEFAULT_INITIAL_WAIT = 5.0
+DEFAULT_INTERVAL = 2.0
+MIN_SAMPLES = 5
+MAX_SAMPLES = 200
+QUANTILES = (0.5, 0.65, 0.8, 0.9, 0.95, 0.99)
+
+
+def _quantile(sorted_values: list[float], q: float) -> float:
+	index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+	return sorted_values[index]
+
+
+class SolveTimeHistory:
+	"""按求解方式保存最近的求解耗时"""
+
+	def __init__(self, path: str | None = None, deadline: float = 65.0, min_gap: float = 0.5, max_backoff: float = 8.0):
+		self.path = path
+		self.deadline = deadline
+		self.min_gap = min_gap
+		self.max_backoff = max_backoff
+		self.samples: dict[str, list[float]] = {}
+		self._loaded = False
+
+	@classmethod
+	def from_env(cls) -> 'SolveTimeHistory':
+		"""从环境变量创建（TURNSTILE_HISTORY_FILE / TURNSTILE_POLL_DEADLINE）"""
+		return cls(
+			path=os.getenv('TURNSTILE_HISTORY_FILE', 'turnstile_history.json') or None,
+			deadline=float(os.getenv('TURNSTILE_POLL_DEADLINE', '65') or 65),
+		)
+
+	def load(self):
+		"""加载历史（只加载一次）"""
+		if self._loaded:
+			return
+		self._loaded = True
+		if not self.path or not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			for backend, values in data.items():
+				self.samples[backend] = [float(v) for v in values][-MAX_SAMPLES:]
+		except Exception as e:
+			print(f'[WARN] Turnstile 求解历史加载失败: {e}')
+
+	def save(self):
+		if not self.path or not self.samples:
+			return
+		try:
+			with open(self.path, 'w', encoding='utf-8') as f:
+				json.dump(self.samples, f)
+		except Exception as e:
+			print(f'[WARN] Turnstile 求解历史保存失败: {e}')
+
+	def record(self, backend: str, seconds: float, pending: float = 0.0):
+		"""
+		记录一次成功求解的耗时
+
+		Args:
+			seconds: 看到 token 的那次轮询的时间
+			pending: 上一次仍在处理中的轮询的时间（没有则为 0）
+
+		token 在 (pending, seconds] 之间就绪，记录区间中点而不是 seconds：
+		只记录轮询时间的话历史永远学不到早于首次轮询的耗时，轮询点也就无法提前。
+		"""
+		self.load()
+		values = self.samples.setdefault(backend, [])
+		values.append(round((pending + seconds) / 2, 3))
+		del values[:-MAX_SAMPLES]
+
+	def schedule(self, backend: str) -> list[float]:
+		"""
+		计算轮询时间点（相对任务创建时刻的秒数，递增）
+
+		样本不足时返回默认的固定间隔计划。
+		"""
+		self.load()
+		values = sorted(self.samples.get(backend, []))
+
+		points: list[float] = []
+		if len(values) < MIN_SAMPLES:
+			t = DEFAULT_INITIAL_WAIT
+			while t <= self.deadline:
+				points.append(t)
+				t += DEFAULT_INTERVAL
+			return points
+
+		for q in QUANTILES:
+			t = _quantile(values, q)
+			if t <= self.deadline and (not points or t - points[-1] >= self.min_gap):
+				points.append(t)
+
+		# 超出历史分布后指数退避
+		t = points[-1] if points else 0.0
+		step = max(self.min_gap, 1.0)
+		while t + step <= self.deadline:
+			t += step
+			points.append(t)
+			step = min(step * 2, self.max_backoff)
+		return points
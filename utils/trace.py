@@ -0,0 +1,152 @@
+"""
+运行阶段计时
+
+用 tracer.span('stage') 记录各阶段的耗时（浏览器启动、goto、sitekey、求解、
+用户信息请求、签到请求、通知等），span 自动带上当前账号的标签
+（账号序号、provider、求解方式）。运行结束时输出各阶段 p50/p95 汇总表，
+设置 CHECKIN_PROFILE 时把全部 span 写入 JSON（.json）或 JSONL（其他扩展名）文件。
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+
+_tags: ContextVar[dict] = ContextVar('checkin_trace_tags', default={})
+
+
+@dataclass
+class Span:
+	"""一次阶段耗时记录"""
+
+	stage: str
+	start: float
+	duration: float
+	ok: bool = True
+	error: str | None = None
+	tags: dict = field(default_factory=dict)
+
+
+def percentile(values: list[float], q: float) -> float:
+	"""最近秩百分位数（values 需已排序）"""
+	if not values:
+		return 0.0
+	index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+	return values[index]
+
+
+class Tracer:
+	"""收集 span 并生成运行概况"""
+
+	def __init__(self, path: str | None = None):
+		self.path = path
+		self.spans: list[Span] = []
+		self.started_at = time.time()
+
+	@classmethod
+	def from_env(cls) -> 'Tracer':
+		return cls(path=os.getenv('CHECKIN_PROFILE') or None)
+
+	@contextmanager
+	def tagged(self, **tags):
+		"""在当前上下文（通常是一个账号的任务）内为所有 span 附加标签"""
+		token = _tags.set({**_tags.get(), **tags})
+		try:
+			yield
+		finally:
+			_tags.reset(token)
+
+	@contextmanager
+	def span(self, stage: str, **tags):
+		"""
+		记录一个阶段的耗时
+
+		yield 出的字典可以在阶段内补充标签（例如实际使用的求解方式）；
+		阶段内抛出异常时 span 记为失败并保留异常类型。
+		"""
+		extra = dict(tags)
+		start_wall, start = time.time(), time.perf_counter()
+		ok, error = True, None
+		try:
+			yield extra
+		except BaseException as e:
+			ok, error = False, type(e).__name__
+			raise
+		finally:
+			self.spans.append(
+				Span(
+					stage=stage,
+					start=start_wall,
+					duration=time.perf_counter() - start,
+					ok=ok,
+					error=error,
+					tags={**_tags.get(), **extra},
+				)
+			)
+
+	def spans_for(self, **tags) -> list[Span]:
+		"""筛选带有指定标签的 span"""
+		return [s for s in self.spans if all(s.tags.get(k) == v for k, v in tags.items())]
+
+	def summary(self) -> dict[str, dict]:
+		"""按阶段汇总：次数、失败数、p50、p95、最大值、总耗时"""
+		by_stage: dict[str, list[Span]] = {}
+		for span in self.spans:
+			by_stage.setdefault(span.stage, []).append(span)
+
+		result = {}
+		for stage, spans in by_stage.items():
+			durations = sorted(s.duration for s in spans)
+			result[stage] = {
+				'count': len(spans),
+				'errors': sum(1 for s in spans if not s.ok),
+				'p50': percentile(durations, 0.5),
+				'p95': percentile(durations, 0.95),
+				'max': durations[-1],
+				'total': sum(durations),
+			}
+		return result
+
+	def report(self):
+		"""输出各阶段耗时汇总表"""
+		summary = self.summary()
+		if not summary:
+			return
+		print(f'\n[TRACE] {"阶段":<18}{"次数":>6}{"失败":>6}{"p50":>9}{"p95":>9}{"最大":>9}{"合计":>10}')
+		for stage, row in sorted(summary.items(), key=lambda x: -x[1]['total']):
+			print(
+				f"[TRACE] {stage:<20}{row['count']:>6}{row['errors']:>6}"
+				f"{row['p50']:>8.2f}s{row['p95']:>8.2f}s{row['max']:>8.2f}s{row['total']:>9.2f}s"
+			)
+
+	def write(self):
+		"""把 span 写入运行概况文件"""
+		if not self.path:
+			return
+		try:
+			with open(self.path, 'w', encoding='utf-8') as f:
+				if self.path.endswith('.json'):
+					json.dump(
+						{
+							'started_at': self.started_at,
+							'duration': time.time() - self.started_at,
+							'summary': self.summary(),
+							'spans': [asdict(s) for s in self.spans],
+						},
+						f,
+						ensure_ascii=False,
+						indent=2,
+					)
+				else:
+					for span in self.spans:
+						f.write(json.dumps(asdict(span), ensure_ascii=False) + '\n')
+			print(f'[TRACE] 运行概况已写入 {self.path}')
+		except Exception as e:
+			print(f'[WARN] 运行概况写入失败: {e}')
+
+
+# 全局实例
+tracer = Tracer.from_env()
@@ -8,11 +8,46 @@ Turnstile 验证服务类
 import os
 import time
 import asyncio
-import httpx
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
 from dotenv import load_dotenv
 
+from utils.http_pool import http_clients
+from utils.solve_history import SolveTimeHistory
+from utils.trace import tracer
+
 load_dotenv()
 
+# 通过 HTTP 接口求解的方式（浏览器方式由主脚本处理）
+SOLVER_METHODS = ('yescaptcha', 'local_solver')
+
+# Turnstile token 有效期为 300 秒，预留余量避免提交时恰好过期
+TOKEN_MAX_AGE = 270
+
+# 当前账号登记的 token 需求（见 TurnstileService.claim）
+_claim: contextvars.ContextVar[dict | None] = contextvars.ContextVar('turnstile_claim', default=None)
+
+
+class _TokenPool:
+    """单个 (siteurl, sitekey) 的预取 token 池"""
+
+    def __init__(self):
+        self.tokens: deque[tuple[str, float]] = deque()
+        self.inflight: set[asyncio.Task] = set()
+        self.waiting = 0
+        self.failures = 0
+
+    def take(self, max_age: float) -> str | None:
+        """取出一个仍在有效期内的 token，过期的直接丢弃"""
+        now = time.monotonic()
+        while self.tokens:
+            token, created = self.tokens.popleft()
+            if now - created < max_age:
+                return token
+        return None
+
 
 class TurnstileService:
     """Turnstile 验证服务类"""
@@ -21,31 +56,155 @@ class TurnstileService:
         """初始化 Turnstile 服务"""
         self.yescaptcha_key = os.getenv('YESCAPTCHA_KEY', '').strip()
         self.solver_url = os.getenv('TURNSTILE_SOLVER_URL', 'http://127.0.0.1:5072')
-        self.yescaptcha_api = "https://api.yescaptcha.com"
-
-        # 判断使用哪种方式
-        if self.yescaptcha_key:
-            self.method = 'yescaptcha'
-            print('[Turnstile] 使用 YesCaptcha API')
-        elif self._check_solver_available():
-            self.method = 'local_solver'
-            print('[Turnstile] 使用本地 Turnstile Solver')
-        else:
-            self.method = 'browser'
-            print('[Turnstile] 使用浏览器自动化（成功率较低）')
+        self.yescaptcha_api = os.getenv('YESCAPTCHA_API', 'https://api.yescaptcha.com').rstrip('/')
+
+        # 预取：同时在后台求解的 token 数量上限（0 表示关闭）
+        self.prefetch_limit = int(os.getenv('TURNSTILE_PREFETCH_LIMIT', '2') or 0)
+        self.token_max_age = float(os.getenv('TURNSTILE_TOKEN_MAX_AGE', str(TOKEN_MAX_AGE)) or TOKEN_MAX_AGE)
+        self._demand: dict[str, int] = {}
+        self._pools: dict[tuple[str, str], _TokenPool] = {}
+
+        # 对冲：主求解方式超过 hedge_delay 秒未返回时，并行启动备用方式（负数表示关闭）
+        self.hedge_delay = float(os.getenv('TURNSTILE_HEDGE_DELAY', '-1') or -1)
+        self.hedge_backend = os.getenv('TURNSTILE_HEDGE_BACKEND', '').strip()
+        self.hedge_ratio = min(1.0, max(0.0, float(os.getenv('TURNSTILE_HEDGE_RATIO', '1') or 1)))
+        self._hedge_counter = 0
+        self.history = SolveTimeHistory.from_env()
+        self.backends = {}
+        self.stats: dict[str, dict] = {}
+
+        # 求解方式在首次需要时才确定（见 resolve_method），导入本模块不产生任何网络请求
+        self.method: str | None = None
+        self.health_ttl = float(os.getenv('TURNSTILE_HEALTH_TTL', '300') or 300)
+        self._solver_health: tuple[bool, float] | None = None
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def check_solver_available(self) -> bool:
+        """检查本地 Solver 是否可用（结果缓存 health_ttl 秒）"""
+        if self._solver_health and time.monotonic() - self._solver_health[1] < self.health_ttl:
+            return self._solver_health[0]
+
+        start = time.monotonic()
+        try:
+            client = http_clients.get(self.solver_url)
+            response = await client.get(f"{self.solver_url}/health", timeout=2)
+            available = response.status_code == 200
+        except Exception:
+            available = False
+        print(f'[Turnstile] 本地 Solver 健康检查: {"可用" if available else "不可用"} ({time.monotonic() - start:.2f}s)')
+
+        self._solver_health = (available, time.monotonic())
+        return available
+
+    async def resolve_method(self) -> str:
+        """确定求解方式（首次调用时检测，之后直接返回）"""
+        if self.method:
+            return self.method
+
+        async with self._get_lock():
+            if self.method:
+                return self.method
+
+            # 判断使用哪种方式
+            if self.yescaptcha_key:
+                self.backends.setdefault('yescaptcha', self._solve_with_yescaptcha)
+            if ('yescaptcha' not in self.backends or self.hedge_delay >= 0) and await self.check_solver_available():
+                self.backends.setdefault('local_solver', self._solve_with_local_solver)
+
+            if 'yescaptcha' in self.backends:
+                self.method = 'yescaptcha'
+                print('[Turnstile] 使用 YesCaptcha API')
+            elif 'local_solver' in self.backends:
+                self.method = 'local_solver'
+                print('[Turnstile] 使用本地 Turnstile Solver')
+            else:
+                self.method = 'browser'
+                print('[Turnstile] 使用浏览器自动化（成功率较低）')
+            return self.method
+
+    def expect(self, siteurl: str, count: int):
+        """登记某个站点接下来还需要多少个 token，用于限定预取数量"""
+        self._demand[siteurl] = max(0, count)
+
+    def add_demand(self, siteurl: str):
+        """追加一个账号的需求（多进程时 worker 每分到一个账号登记一次）"""
+        self._demand[siteurl] = self._demand.get(siteurl, 0) + 1
+
+    def release(self, siteurl: str):
+        """退还一个账号登记的需求（账号没有用到 token 就结束了）"""
+        self._demand[siteurl] = max(0, self._demand.get(siteurl, 0) - 1)
+
+    @contextmanager
+    def claim(self, siteurl: str):
+        """
+        处理一个已由 expect() 登记需求的账号
 
-    def _check_solver_available(self):
-        """检查本地 Solver 是否可用"""
+        账号结束时还没求解过 token（无 token 签到成功、session 失效、WAF 拦截等）就退还它的需求，
+        预取不再为它求解；同一账号多次求解只扣减一次需求。
+        """
+        state = {'siteurl': siteurl, 'used': False}
+        reset = _claim.set(state)
         try:
-            response = httpx.get(f"{self.solver_url}/health", timeout=2)
-            return response.status_code == 200
-        except:
-            return False
+            yield
+        finally:
+            _claim.reset(reset)
+            if not state['used']:
+                self.release(siteurl)
+
+    def prefetch(self, siteurl: str, sitekey: str):
+        """
+        在后台为后续账号预先求解 token
+
+        得知 sitekey 后即可调用；并发数受 prefetch_limit 限制，
+        总数不超过 expect() 登记的剩余需求。
+        """
+        if self.prefetch_limit <= 0 or self.method not in SOLVER_METHODS:
+            return
+
+        pool = self._pools.setdefault((siteurl, sitekey), _TokenPool())
+        # 连续失败时停止预取，避免在不可用的求解服务上持续花费
+        if pool.failures >= 2:
+            return
+
+        wanted = self._demand.get(siteurl, 0) + pool.waiting - len(pool.tokens) - len(pool.inflight)
+        slots = self.prefetch_limit - len(pool.inflight)
+        for _ in range(max(0, min(wanted, slots))):
+            # 使用空的上下文，预取日志不归属于触发它的账号
+            task = asyncio.create_task(self._prefetch_one(siteurl, sitekey, pool), context=contextvars.Context())
+            pool.inflight.add(task)
+
+    async def _prefetch_one(self, siteurl: str, sitekey: str, pool: _TokenPool):
+        try:
+            token = await self._solve_direct(siteurl, sitekey, '[预取]')
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            token = None
+        finally:
+            pool.inflight.discard(asyncio.current_task())
+
+        if token:
+            pool.failures = 0
+            pool.tokens.append((token, time.monotonic()))
+        else:
+            pool.failures += 1
+        self.prefetch(siteurl, sitekey)
 
     async def solve_turnstile(self, siteurl: str, sitekey: str, account_name: str = "") -> str:
         """
         求解 Turnstile 验证
 
+        开启预取时优先使用池中的 token，其次等待正在进行的预取任务，
+        都没有时再直接求解。
+
         Args:
             siteurl: 网站 URL
             sitekey: Turnstile site key
@@ -54,79 +213,225 @@ class TurnstileService:
         Returns:
             Turnstile token 或 None
         """
-        if self.method == 'yescaptcha':
-            return await self._solve_with_yescaptcha(siteurl, sitekey, account_name)
-        elif self.method == 'local_solver':
-            return await self._solve_with_local_solver(siteurl, sitekey, account_name)
+        await self.resolve_method()
+        if self.prefetch_limit <= 0 or self.method not in SOLVER_METHODS:
+            return await self._solve_direct(siteurl, sitekey, account_name)
+
+        pool = self._pools.setdefault((siteurl, sitekey), _TokenPool())
+        state = _claim.get()
+        if state is None or state['siteurl'] != siteurl:
+            self.release(siteurl)
+        elif not state['used']:
+            state['used'] = True
+            self.release(siteurl)
+        pool.waiting += 1
+        try:
+            self.prefetch(siteurl, sitekey)
+            while True:
+                token = pool.take(self.token_max_age)
+                if token:
+                    print(f'[Turnstile] {account_name}: 使用预取的 token')
+                    return token
+                if not pool.inflight:
+                    break
+                await asyncio.wait(list(pool.inflight), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pool.waiting -= 1
+
+        return await self._solve_direct(siteurl, sitekey, account_name)
+
+    def register_backend(self, name: str, solver):
+        """
+        注册额外的求解方式（例如主脚本提供的浏览器求解），可作为对冲备用
+
+        Args:
+            name: 求解方式名称
+            solver: async (siteurl, sitekey, account_name) -> token | None
+        """
+        self.backends[name] = solver
+
+    def _pick_hedge_backend(self) -> str | None:
+        """选择对冲用的备用求解方式，未开启或本次不对冲时返回 None"""
+        if self.hedge_delay < 0:
+            return None
+
+        # 按比例均匀地挑选一部分求解进行对冲
+        n = self._hedge_counter
+        self._hedge_counter += 1
+        if int((n + 1) * self.hedge_ratio) == int(n * self.hedge_ratio):
+            return None
+
+        if self.hedge_backend:
+            return self.hedge_backend if self.hedge_backend in self.backends and self.hedge_backend != self.method else None
+        # 优先使用另一个求解服务，浏览器（慢且成功率低）只在没有其他方式时使用
+        candidates = [name for name in self.backends if name != self.method]
+        candidates.sort(key=lambda name: name not in SOLVER_METHODS)
+        return candidates[0] if candidates else None
+
+    def _backend_stats(self, name: str) -> dict:
+        return self.stats.setdefault(
+            name, {'attempts': 0, 'wins': 0, 'failures': 0, 'cancelled': 0, 'polls': 0, 'latencies': []}
+        )
+
+    async def _poll_points(self, backend: str, created: float):
+        """按求解耗时历史安排的时间点等待，每到一个轮询点产出已耗时秒数"""
+        for point in self.history.schedule(backend):
+            delay = point - (time.monotonic() - created)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._backend_stats(backend)['polls'] += 1
+            yield time.monotonic() - created
+
+    async def _run_backend(self, name: str, siteurl: str, sitekey: str, account_name: str) -> str | None:
+        """执行单个求解方式并记录耗时与结果"""
+        stats = self._backend_stats(name)
+        stats['attempts'] += 1
+        start = time.monotonic()
+        try:
+            with tracer.span('solver.solve', backend=name):
+                token = await self.backends[name](siteurl, sitekey, account_name)
+        except asyncio.CancelledError:
+            stats['cancelled'] += 1
+            raise
+        except Exception as e:
+            print(f'[Turnstile] {account_name}: {name} 异常: {e}')
+            token = None
+
+        if token:
+            stats['latencies'].append(time.monotonic() - start)
         else:
+            stats['failures'] += 1
+        return token
+
+    async def _solve_direct(self, siteurl: str, sitekey: str, account_name: str = "") -> str:
+        """直接调用当前求解服务（开启对冲时与备用方式竞速）"""
+        if self.method not in SOLVER_METHODS:
             # 浏览器自动化方式在主脚本中处理
             return None
 
+        hedge = self._pick_hedge_backend()
+        primary = asyncio.create_task(self._run_backend(self.method, siteurl, sitekey, account_name))
+        if not hedge:
+            token = await primary
+            if token:
+                self.stats[self.method]['wins'] += 1
+            return token
+
+        tasks = {primary: self.method}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+            if done and primary.result():
+                self.stats[self.method]['wins'] += 1
+                return primary.result()
+
+            print(f'[Turnstile] {account_name}: 启动对冲求解 ({hedge})')
+            tasks[asyncio.create_task(self._run_backend(hedge, siteurl, sitekey, account_name))] = hedge
+
+            # 第一个有效 token 胜出，其余任务取消
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result():
+                        self.stats[tasks[task]]['wins'] += 1
+                        return task.result()
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report_stats(self):
+        """输出各求解方式的胜出次数与耗时，用于调整对冲延迟"""
+        for name, stats in self.stats.items():
+            latencies = sorted(stats['latencies'])
+            median = f'{latencies[len(latencies) // 2]:.1f}s' if latencies else '-'
+            print(
+                f"[Turnstile] {name}: 尝试 {stats['attempts']} 次, 胜出 {stats['wins']} 次, "
+                f"失败 {stats['failures']} 次, 被取消 {stats['cancelled']} 次, 中位耗时 {median}, "
+                f"结果轮询 {stats['polls']} 次"
+            )
+
+    async def close(self):
+        """取消尚未完成的预取任务（运行结束时调用）"""
+        tasks = [task for pool in self._pools.values() for task in pool.inflight]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._pools.clear()
+        self._demand.clear()
+        self.history.save()
+
     async def _solve_with_yescaptcha(self, siteurl: str, sitekey: str, account_name: str) -> str:
         """使用 YesCaptcha API 求解"""
         try:
             print(f'[YesCaptcha] {account_name}: 创建任务...')
 
             # 创建任务
-            async with httpx.AsyncClient(timeout=30) as client:
-                create_url = f"{self.yescaptcha_api}/createTask"
-                payload = {
-                    "clientKey": self.yescaptcha_key,
-                    "task": {
-                        "type": "TurnstileTaskProxyless",
-                        "websiteURL": siteurl,
-                        "websiteKey": sitekey
-                    }
+            client = http_clients.get(self.yescaptcha_api)
+            create_url = f"{self.yescaptcha_api}/createTask"
+            payload = {
+                "clientKey": self.yescaptcha_key,
+                "task": {
+                    "type": "TurnstileTaskProxyless",
+                    "websiteURL": siteurl,
+                    "websiteKey": sitekey
                 }
+            }
 
+            with tracer.span('solver.create', backend='yescaptcha'):
                 response = await client.post(create_url, json=payload)
-                response.raise_for_status()
-                data = response.json()
-
-                if data.get('errorId') != 0:
-                    print(f'[YesCaptcha] {account_name}: 创建任务失败: {data.get("errorDescription")}')
-                    return None
+            response.raise_for_status()
+            data = response.json()
 
-                task_id = data['taskId']
-                print(f'[YesCaptcha] {account_name}: 任务已创建 (ID: {task_id})')
+            if data.get('errorId') != 0:
+                print(f'[YesCaptcha] {account_name}: 创建任务失败: {data.get("errorDescription")}')
+                return None
 
-                # 等待结果
-                await asyncio.sleep(5)  # 初始等待
+            task_id = data['taskId']
+            created = time.monotonic()
+            print(f'[YesCaptcha] {account_name}: 任务已创建 (ID: {task_id})')
 
-                for attempt in range(30):  # 最多等待 60 秒
-                    result_url = f"{self.yescaptcha_api}/getTaskResult"
-                    result_payload = {
-                        "clientKey": self.yescaptcha_key,
-                        "taskId": task_id
-                    }
+            # 按自适应计划轮询结果
+            attempt, pending = 0, 0.0
+            async for elapsed in self._poll_points('yescaptcha', created):
+                result_url = f"{self.yescaptcha_api}/getTaskResult"
+                result_payload = {
+                    "clientKey": self.yescaptcha_key,
+                    "taskId": task_id
+                }
 
+                with tracer.span('solver.poll', backend='yescaptcha'):
                     response = await client.post(result_url, json=result_payload)
-                    response.raise_for_status()
-                    data = response.json()
+                response.raise_for_status()
+                data = response.json()
 
-                    if data.get('errorId') != 0:
-                        print(f'[YesCaptcha] {account_name}: 获取结果失败: {data.get("errorDescription")}')
-                        return None
+                if data.get('errorId') != 0:
+                    print(f'[YesCaptcha] {account_name}: 获取结果失败: {data.get("errorDescription")}')
+                    return None
 
-                    status = data.get('status')
-                    if status == 'ready':
-                        token = data.get('solution', {}).get('token')
-                        if token:
-                            print(f'[YesCaptcha] {account_name}: ✅ 成功获取 token')
-                            return token
-                        else:
-                            print(f'[YesCaptcha] {account_name}: 返回结果中没有 token')
-                            return None
-                    elif status == 'processing':
-                        if attempt % 5 == 0:
-                            print(f'[YesCaptcha] {account_name}: 处理中... ({attempt * 2}s)')
-                        await asyncio.sleep(2)
+                status = data.get('status')
+                if status == 'ready':
+                    token = data.get('solution', {}).get('token')
+                    if token:
+                        self.history.record('yescaptcha', elapsed, pending)
+                        print(f'[YesCaptcha] {account_name}: ✅ 成功获取 token ({elapsed:.1f}s)')
+                        return token
                     else:
-                        print(f'[YesCaptcha] {account_name}: 未知状态: {status}')
-                        await asyncio.sleep(2)
-
-                print(f'[YesCaptcha] {account_name}: ⚠️ 超时未获取到 token')
-                return None
+                        print(f'[YesCaptcha] {account_name}: 返回结果中没有 token')
+                        return None
+                elif status == 'processing':
+                    pending = elapsed
+                    if attempt % 5 == 0:
+                        print(f'[YesCaptcha] {account_name}: 处理中... ({elapsed:.0f}s)')
+                else:
+                    print(f'[YesCaptcha] {account_name}: 未知状态: {status}')
+                attempt += 1
+
+            print(f'[YesCaptcha] {account_name}: ⚠️ 超时未获取到 token')
+            return None
 
         except Exception as e:
             print(f'[YesCaptcha] {account_name}: 异常: {e}')
@@ -137,47 +442,51 @@ class TurnstileService:
         try:
             print(f'[LocalSolver] {account_name}: 创建任务...')
 
-            async with httpx.AsyncClient(timeout=30) as client:
-                # 创建任务
-                create_url = f"{self.solver_url}/turnstile?url={siteurl}&sitekey={sitekey}"
+            client = http_clients.get(self.solver_url)
+            # 创建任务
+            create_url = f"{self.solver_url}/turnstile?url={siteurl}&sitekey={sitekey}"
+            with tracer.span('solver.create', backend='local_solver'):
                 response = await client.get(create_url)
+            response.raise_for_status()
+            data = response.json()
+            task_id = data['taskId']
+            created = time.monotonic()
+
+            print(f'[LocalSolver] {account_name}: 任务已创建 (ID: {task_id})')
+
+            # 按自适应计划轮询结果
+            attempt, pending = 0, 0.0
+            async for elapsed in self._poll_points('local_solver', created):
+                result_url = f"{self.solver_url}/result?id={task_id}"
+                with tracer.span('solver.poll', backend='local_solver'):
+                    response = await client.get(result_url)
                 response.raise_for_status()
                 data = response.json()
-                task_id = data['taskId']
-
-                print(f'[LocalSolver] {account_name}: 任务已创建 (ID: {task_id})')
 
-                # 等待结果
-                await asyncio.sleep(5)
-
-                for attempt in range(30):
-                    result_url = f"{self.solver_url}/result?id={task_id}"
-                    response = await client.get(result_url)
-                    response.raise_for_status()
-                    data = response.json()
-
-                    token = data.get('solution', {}).get('token')
-                    if token:
-                        if token != "CAPTCHA_FAIL":
-                            print(f'[LocalSolver] {account_name}: ✅ 成功获取 token')
-                            return token
-                        else:
-                            print(f'[LocalSolver] {account_name}: 验证失败')
-                            return None
+                token = data.get('solution', {}).get('token')
+                if token:
+                    if token != "CAPTCHA_FAIL":
+                        self.history.record('local_solver', elapsed, pending)
+                        print(f'[LocalSolver] {account_name}: ✅ 成功获取 token ({elapsed:.1f}s)')
+                        return token
                     else:
-                        if attempt % 5 == 0:
-                            print(f'[LocalSolver] {account_name}: 等待中... ({attempt * 2}s)')
-                        await asyncio.sleep(2)
+                        print(f'[LocalSolver] {account_name}: 验证失败')
+                        return None
+                else:
+                    pending = elapsed
+                    if attempt % 5 == 0:
+                        print(f'[LocalSolver] {account_name}: 等待中... ({elapsed:.0f}s)')
+                attempt += 1
 
-                print(f'[LocalSolver] {account_name}: ⚠️ 超时未获取到 token')
-                return None
+            print(f'[LocalSolver] {account_name}: ⚠️ 超时未获取到 token')
+            return None
 
         except Exception as e:
             print(f'[LocalSolver] {account_name}: 异常: {e}')
             return None
 
-    def get_method(self) -> str:
-        """获取当前使用的求解方式"""
+    def get_method(self) -> str | None:
+        """获取当前使用的求解方式（尚未确定时为 None，需要时请使用 resolve_method）"""
         return self.method
 
 
@@ -0,0 +1,195 @@
+"""
+WAF cookie 缓存
+acw_tc / cdn_sec_tc / acw_sc__v2 等 WAF cookie 作用于域名而非账号，
+同一 provider 的多个账号可以共用一次浏览器采集的结果。
+
+- 按 provider 域名缓存 cookies（以及页面上的 Turnstile sitekey）
+- 按 cookie 自身的过期时间失效，并受最大 TTL 限制
+- 同一域名的并发请求合并为一次采集（single-flight）
+- 可选持久化到文件，跨运行复用
+- 复用旧条目前用一次轻量 HTTP 请求验证其仍然有效
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable
+
+
+@dataclass
+class WafCacheEntry:
+	"""单个域名的 WAF 缓存条目"""
+
+	cookies: dict[str, str]
+	expires_at: float
+	sitekey: str | None = None
+	harvested_at: float = field(default_factory=time.time)
+	verified_at: float = field(default_factory=time.time)
+
+	def is_expired(self, now: float | None = None) -> bool:
+		return (now or time.time()) >= self.expires_at
+
+
+@dataclass
+class WafHarvest:
+	"""一次浏览器采集的结果（cookies 为 Playwright 格式列表）"""
+
+	cookies: list[dict]
+	sitekey: str | None = None
+
+
+class WafCookieCache:
+	"""按域名缓存 WAF cookies"""
+
+	def __init__(self, max_ttl: float = 1800, probe_interval: float = 60, path: str | None = None):
+		self.max_ttl = max_ttl
+		self.probe_interval = probe_interval
+		self.path = path
+		self.entries: dict[str, WafCacheEntry] = {}
+		self.stats = {'hits': 0, 'misses': 0, 'harvests': 0, 'probe_failures': 0}
+		self._locks: dict[str, asyncio.Lock] = {}
+		self._loop: asyncio.AbstractEventLoop | None = None
+
+	@classmethod
+	def from_env(cls) -> 'WafCookieCache':
+		"""从环境变量创建（WAF_COOKIE_TTL / WAF_COOKIE_PROBE_INTERVAL / WAF_COOKIE_CACHE_FILE）"""
+		return cls(
+			max_ttl=float(os.getenv('WAF_COOKIE_TTL', '1800') or 1800),
+			probe_interval=float(os.getenv('WAF_COOKIE_PROBE_INTERVAL', '60') or 60),
+			path=os.getenv('WAF_COOKIE_CACHE_FILE') or None,
+		)
+
+	def _lock(self, domain: str) -> asyncio.Lock:
+		loop = asyncio.get_running_loop()
+		if self._loop is not loop:
+			self._loop = loop
+			self._locks = {}
+		if domain not in self._locks:
+			self._locks[domain] = asyncio.Lock()
+		return self._locks[domain]
+
+	def get(self, domain: str) -> WafCacheEntry | None:
+		"""获取未过期的缓存条目"""
+		entry = self.entries.get(domain)
+		if entry and entry.is_expired():
+			del self.entries[domain]
+			return None
+		return entry
+
+	def put(self, domain: str, harvest: WafHarvest) -> WafCacheEntry | None:
+		"""
+		写入一次采集结果，返回新条目（没有 cookie 时不缓存）
+
+		只刷新 cookies 的采集（浏览器降级、仅刷新余额）不带 sitekey，此时沿用已知的 sitekey，
+		否则后续账号会因为找不到 sitekey 而跳过求解服务、直接使用浏览器。
+		"""
+		if not harvest.cookies:
+			return None
+		previous = self.entries.get(domain)
+
+		now = time.time()
+		expires_at = now + self.max_ttl
+		for cookie in harvest.cookies:
+			# expires 为 -1 表示会话 cookie，只受最大 TTL 限制
+			expires = cookie.get('expires', -1)
+			if expires and expires > 0:
+				expires_at = min(expires_at, expires)
+
+		entry = WafCacheEntry(
+			cookies={c['name']: c['value'] for c in harvest.cookies},
+			expires_at=expires_at,
+			sitekey=harvest.sitekey or (previous.sitekey if previous else None),
+			harvested_at=now,
+			verified_at=now,
+		)
+		self.entries[domain] = entry
+		return entry
+
+	def invalidate(self, domain: str):
+		self.entries.pop(domain, None)
+
+	async def get_or_harvest(
+		self,
+		domain: str,
+		harvest: Callable[[], Awaitable[WafHarvest | None]],
+		probe: Callable[[WafCacheEntry], Awaitable[bool]] | None = None,
+	) -> WafCacheEntry | None:
+		"""
+		获取域名的 WAF 条目，必要时采集
+
+		同一域名同时只有一个调用者在验证或采集，其余调用者等待后直接复用结果。
+
+		Args:
+			domain: provider 域名
+			harvest: 缓存未命中时执行的采集函数
+			probe: 验证旧条目是否仍然有效的探测函数
+		"""
+		async with self._lock(domain):
+			entry = self.get(domain)
+			if entry and probe and time.time() - entry.verified_at > self.probe_interval:
+				if await probe(entry):
+					entry.verified_at = time.time()
+				else:
+					print(f'[WAF Cache] {domain}: 缓存的 cookies 已失效，重新采集')
+					self.stats['probe_failures'] += 1
+					self.invalidate(domain)
+					entry = None
+
+			if entry:
+				self.stats['hits'] += 1
+				return entry
+
+			self.stats['misses'] += 1
+			self.stats['harvests'] += 1
+			result = await harvest()
+			return self.put(domain, result) if result else None
+
+	def load(self):
+		"""从文件加载未过期的条目"""
+		if not self.path or not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			now = time.time()
+			for domain, raw in data.items():
+				entry = WafCacheEntry(**raw)
+				# 跨运行的条目一律先验证再使用
+				entry.verified_at = 0
+				if not entry.is_expired(now):
+					self.entries[domain] = entry
+			if self.entries:
+				print(f'[WAF Cache] 从 {self.path} 加载了 {len(self.entries)} 个域名的 cookies')
+		except Exception as e:
+			print(f'[WARN] WAF cookie 缓存加载失败: {e}')
+
+	def save(self):
+		"""把未过期的条目写入文件"""
+		if not self.path:
+			return
+		try:
+			now = time.time()
+			data = {domain: asdict(entry) for domain, entry in self.entries.items() if not entry.is_expired(now)}
+			with open(self.path, 'w', encoding='utf-8') as f:
+				json.dump(data, f, ensure_ascii=False)
+		except Exception as e:
+			print(f'[WARN] WAF cookie 缓存保存失败: {e}')
+
+
+WAF_CHALLENGE_MARKERS = ('acw_sc__v2', 'var arg1=', 'cdn_sec_tc', 'Just a moment', 'cf-chl', 'challenge-platform')
+
+
+def looks_like_waf_challenge(status_code: int, content_type: str, body: str) -> bool:
+	"""判断一个本应返回 JSON 的响应是否是 WAF 挑战页"""
+	if 'json' in (content_type or '').lower():
+		return False
+	if any(marker in body for marker in WAF_CHALLENGE_MARKERS):
+		return True
+	# 接口返回了 HTML 页面，通常也是被 WAF 拦截
+	return status_code in (200, 403, 503) and body.lstrip().startswith('<')
+
+
+# 全局实例
+waf_cookie_cache = WafCookieCache.from_env()
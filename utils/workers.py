@@ -0,0 +1,180 @@
+"""
+多进程 worker 池
+
+单个进程驱动大量浏览器页面时会受限于一个事件循环与一条 Playwright 驱动连接，且一个浏览器崩溃会拖垮整次运行。
+--workers N 时由主进程作为协调者，把账号任务分给 N 个 worker 进程（spawn 启动，各自拥有事件循环与浏览器）：
+- 每个 worker 有自己的任务队列，协调者始终知道每个任务在哪个 worker 上
+- worker 进程退出（崩溃）时重启它，其未完成的任务重新分配；同一任务最多尝试 max_attempts 次
+- 重启次数有上限，worker 持续无法启动时剩余任务直接判为失败，不会无限等待
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import threading
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class JobError:
+	"""任务在 worker 内抛出了异常（worker 进程本身正常）"""
+
+	message: str
+
+
+async def serve(worker_id: int, inbox, outbox, handle: Callable[[object], Awaitable[object]], concurrency: int = 1):
+	"""
+	worker 进程内：从 inbox 取任务交给 handle 处理，把结果放入 outbox，收到 None 时退出
+
+	Args:
+		handle: 处理一个任务的协程函数，抛出异常时结果记为 JobError
+		concurrency: 同时处理的任务数
+	"""
+	loop = asyncio.get_running_loop()
+	items: asyncio.Queue = asyncio.Queue()
+
+	def read():
+		# 用一个专用线程读取 inbox：空闲的 consumer 不占用默认线程池（httpx 的 DNS 解析等需要它）
+		while True:
+			item = inbox.get()
+			loop.call_soon_threadsafe(items.put_nowait, item)
+			if item is None:
+				return
+
+	threading.Thread(target=read, name=f'checkin-worker-{worker_id}-inbox', daemon=True).start()
+
+	async def consume():
+		while True:
+			item = await items.get()
+			if item is None:
+				# 通知其余 consumer 退出
+				items.put_nowait(None)
+				return
+			key, payload = item
+			try:
+				result = await handle(payload)
+			except Exception as e:
+				print(f'[WORKER {worker_id}] 任务 {key} 异常: {e}')
+				result = JobError(f'{type(e).__name__}: {e}')
+			outbox.put((worker_id, key, result))
+
+	await asyncio.gather(*(consume() for _ in range(max(1, concurrency))))
+
+
+class WorkerPool:
+	"""协调者一侧：启动 worker、分配任务、收集结果并重启崩溃的 worker"""
+
+	def __init__(self, size: int, target: Callable, args: tuple = (), concurrency: int = 1, max_attempts: int = 2):
+		"""
+		Args:
+			size: worker 进程数
+			target: worker 进程入口，调用方式为 target(worker_id, inbox, outbox, *args)，需可被 spawn 导入
+			concurrency: 每个 worker 同时持有的任务数（应与 target 内 serve 的 concurrency 一致）
+			max_attempts: 同一任务最多尝试的次数（worker 崩溃时重试）
+		"""
+		self.size = max(1, size)
+		self.target = target
+		self.args = args
+		self.concurrency = max(1, concurrency)
+		self.max_attempts = max_attempts
+		self.max_restarts = self.size * 3
+		self.context = multiprocessing.get_context('spawn')
+		self.outbox = self.context.Queue()
+		self.workers: dict[int, tuple] = {}
+		self.stats = {'started': 0, 'restarts': 0, 'crashed_jobs': 0}
+
+	def _spawn(self, worker_id: int):
+		inbox = self.context.Queue()
+		process = self.context.Process(
+			target=self.target, args=(worker_id, inbox, self.outbox, *self.args), name=f'checkin-worker-{worker_id}', daemon=True
+		)
+		process.start()
+		self.workers[worker_id] = (process, inbox)
+		self.stats['started'] += 1
+
+	def _receive(self):
+		try:
+			return self.outbox.get(timeout=0.5)
+		except queue.Empty:
+			return None
+
+	async def run(self, jobs: dict) -> dict:
+		"""
+		执行全部任务
+
+		Args:
+			jobs: 任务标识 -> 任务内容（需可 pickle）
+
+		Returns:
+			任务标识 -> 结果；任务抛出异常时为 JobError，多次尝试仍因 worker 崩溃未完成的任务为 None
+		"""
+		pending = list(jobs)
+		attempts = {key: 0 for key in jobs}
+		assigned: dict[int, set] = {}
+		done: dict = {}
+		loop = asyncio.get_running_loop()
+
+		def dispatch():
+			for worker_id, (process, inbox) in self.workers.items():
+				keys = assigned.setdefault(worker_id, set())
+				while pending and len(keys) < self.concurrency:
+					key = pending.pop(0)
+					attempts[key] += 1
+					keys.add(key)
+					inbox.put((key, jobs[key]))
+
+		def fail(key, reason: str):
+			done[key] = None
+			self.stats['crashed_jobs'] += 1
+			print(f'[WORKER] 任务 {key} {reason}')
+
+		def recover():
+			for worker_id, (process, inbox) in list(self.workers.items()):
+				if process.is_alive():
+					continue
+				print(f'[WORKER] worker {worker_id} 已退出 (exitcode {process.exitcode})')
+				for key in assigned.pop(worker_id, set()):
+					if attempts[key] < self.max_attempts:
+						pending.insert(0, key)
+					else:
+						fail(key, f'所在 worker 崩溃 {attempts[key]} 次，放弃')
+				if self.stats['restarts'] < self.max_restarts:
+					self.stats['restarts'] += 1
+					self._spawn(worker_id)
+				else:
+					del self.workers[worker_id]
+			if not self.workers:
+				for key in pending:
+					fail(key, '没有可用的 worker')
+				pending.clear()
+
+		for worker_id in range(self.size):
+			self._spawn(worker_id)
+		try:
+			while len(done) < len(jobs):
+				# 每轮都检查 worker 是否退出，其他 worker 持续返回结果时崩溃的任务也能及时重新分配
+				recover()
+				dispatch()
+				message = await loop.run_in_executor(None, self._receive)
+				if message is None:
+					continue
+				worker_id, key, result = message
+				assigned.get(worker_id, set()).discard(key)
+				if key not in done:
+					done[key] = result
+		finally:
+			await loop.run_in_executor(None, self._shutdown)
+		return done
+
+	def _shutdown(self):
+		for process, inbox in self.workers.values():
+			if process.is_alive():
+				for _ in range(self.concurrency):
+					inbox.put(None)
+		for process, _ in self.workers.values():
+			process.join(timeout=30)
+			if process.is_alive():
+				process.terminate()
+				process.join(timeout=5)
+		self.workers.clear()